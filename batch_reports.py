@@ -0,0 +1,125 @@
+"""
+Batch generation of weekly PDF reports for the whole fleet.
+
+The week's totals of every selected driver are read in one query and each
+driver's PDF is rendered in a process pool, since reportlab is CPU-bound and
+holds the GIL. The reports are written to a single ZIP file.
+"""
+import multiprocessing
+import os
+import re
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+
+import database as db
+import report_generator
+import utils
+
+def weekly_report_data(driver, week_number, year):
+    """
+    Build generate_pdf_report data from a get_weekly_sales_for_all_drivers row.
+
+    Args:
+        driver: A (driver_id, name, oil_card_number, weekly_target, total_uber,
+            total_bolt, total_zettel, total_other, total_oil, total_zettel_fee) tuple
+        week_number: The week number of the totals
+        year: The ISO year of the week
+
+    Returns:
+        A report data dict in the format of the weekly summary export
+    """
+    _, name, oil_card, target, uber, bolt, zettel, other, oil, zettel_fee = driver
+    week_start_date, week_end_date = utils.get_week_dates(year, week_number)
+    total_net_sales = (uber or 0) + (bolt or 0) + (zettel or 0) + (other or 0)
+    return {
+        'driver_name': name,
+        'oil_card': oil_card,
+        'target': target,
+        'date': utils.get_current_date(),
+        'week_number': week_number,
+        'week_start_date': week_start_date,
+        'week_end_date': week_end_date,
+        'sales_breakdown': {
+            'uber_sales': uber or 0,
+            'bolt_sales': bolt or 0,
+            'zettel_sales': (zettel or 0) + (zettel_fee or 0),
+            'zettel_fee': zettel_fee or 0,
+            'other_sales': other or 0,
+            'other_sales_type': "Multiple",  # For weekly summary
+            'oil_expense': oil or 0
+        },
+        'total_sales': total_net_sales,
+        'target_achieved': total_net_sales >= target
+    }
+
+def report_file_name(name, week_number, year):
+    """Return the ZIP member name of a driver's weekly report."""
+    safe_name = re.sub(r'[^\w.-]+', '_', name).strip('_') or 'driver'
+    return f"{safe_name}_{year}_week_{week_number}_summary.pdf"
+
+def _render_report(report_data):
+    # Runs in a worker process, so return bytes rather than the BytesIO
+    return report_generator.generate_pdf_report(report_data).getvalue()
+
+def generate_batch_reports(file, week_number, year=None, driver_ids=None,
+                           max_workers=None, progress=None):
+    """
+    Render the weekly report of every driver with sales in a week into a ZIP.
+
+    Args:
+        file: A path or a binary file object to write the ZIP to
+        week_number: The week number to report
+        year: The ISO year of the week (defaults to the current year)
+        driver_ids: Driver IDs to include (defaults to all drivers)
+        max_workers: Number of worker processes (defaults to the CPU count);
+            1 renders in the calling process
+        progress: Optional callable called with (done, total) after each report
+
+    Returns:
+        The number of reports written
+    """
+    if year is None:
+        year = date.today().isocalendar()[0]
+    drivers = db.get_weekly_sales_for_all_drivers(
+        week_number, year, tuple(driver_ids) if driver_ids is not None else None
+    )
+    reports = [weekly_report_data(driver, week_number, year) for driver in drivers]
+
+    # Drivers may share a name, so later duplicates get their ID appended
+    file_names = []
+    for driver, report_data in zip(drivers, reports):
+        file_name = report_file_name(report_data['driver_name'], week_number, year)
+        if file_name in file_names:
+            file_name = file_name.replace('_summary.pdf', f"_{driver[0]}_summary.pdf")
+        file_names.append(file_name)
+
+    if max_workers is None:
+        max_workers = min(os.cpu_count() or 1, len(reports))
+
+    with zipfile.ZipFile(file, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        if max_workers <= 1:
+            pdfs = map(_render_report, reports)
+            _write_reports(archive, file_names, pdfs, progress)
+        else:
+            # Jobs run this in a worker thread, and forking a process that has
+            # other threads running can deadlock the child, so workers are spawned
+            executor = ProcessPoolExecutor(
+                max_workers=max_workers, mp_context=multiprocessing.get_context('spawn')
+            )
+            try:
+                pdfs = executor.map(_render_report, reports)
+                _write_reports(archive, file_names, pdfs, progress)
+            except BaseException:
+                # A cancelled job must not wait for the remaining reports to render
+                executor.shutdown(wait=False, cancel_futures=True)
+                raise
+            executor.shutdown()
+    return len(reports)
+
+def _write_reports(archive, file_names, pdfs, progress):
+    # pdfs yields in driver order, so the ZIP is written while workers render
+    for done, (file_name, pdf) in enumerate(zip(file_names, pdfs), start=1):
+        archive.writestr(file_name, pdf)
+        if progress is not None:
+            progress(done, len(file_names))
@@ -0,0 +1,895 @@
+"""
+Performance benchmarks for the driver management database.
+
+Usage:
+    python benchmark.py indexes [--rows 10000 100000 1000000]
+    python benchmark.py export [--rows 1000000 3000000]
+    python benchmark.py history [--weeks 52 520 2600]
+    python benchmark.py reports [--rows 10 100 1000]
+    python benchmark.py startup [--budget-ms 600]
+    python benchmark.py rerun [--rows 100000]
+    python benchmark.py targets [--drivers 1000] [--budget-ms 200]
+    python benchmark.py totals
+    python benchmark.py suite [--drivers 10] [--scales 1 10 100] [--output FILE] [--baseline FILE]
+"""
+import argparse
+import ast
+import functools
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+import pandas as pd
+
+import batch_reports
+import database as db
+import fleet_generator
+import report_cache
+import report_generator
+import sales_export
+import trends
+import utils
+
+OTHER_SALES_TYPES = ["Cash", "Card", "Swish", "Transfer", "Other"]
+
+def populate_sales(conn, num_rows, num_drivers=200, seed=42):
+    """Fill an empty database with num_rows random daily sales records."""
+    rng = random.Random(seed)
+    cursor = conn.cursor()
+    cursor.executemany(
+        'INSERT INTO drivers (name, oil_card_number, weekly_target) VALUES (?, ?, ?)',
+        [(f"Driver {i}", f"CARD{i:06d}", 20000.0) for i in range(1, num_drivers + 1)]
+    )
+
+    # Spread the rows over enough days to give every driver one record a day
+    num_days = max(1, num_rows // num_drivers)
+    start = date.today() - timedelta(days=num_days)
+
+    def rows():
+        for i in range(num_rows):
+            day = start + timedelta(days=i // num_drivers)
+            yield (
+                i % num_drivers + 1,
+                day.isoformat(),
+                round(rng.uniform(0, 3000), 2),
+                round(rng.uniform(0, 2000), 2),
+                round(rng.uniform(0, 800), 2),
+                round(rng.uniform(0, 20), 2),
+                round(rng.uniform(0, 300), 2),
+                rng.choice(OTHER_SALES_TYPES),
+                round(rng.uniform(0, 400), 2),
+                day.isocalendar()[1],
+                db.get_year_week(day.isoformat()),
+            )
+
+    cursor.executemany('''
+        INSERT INTO sales (
+            driver_id, date, uber_sales, bolt_sales, zettel_sales, zettel_fee,
+            other_sales, other_sales_type, oil_expense, week_number, year_week
+        )
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', rows())
+    conn.commit()
+    return num_drivers
+
+def time_call(func, args_list):
+    """Return the median wall time of func over args_list in milliseconds."""
+    timings = []
+    for args in args_list:
+        start = time.perf_counter()
+        func(*args)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+def time_reset_weekly_sales(conn, args_list):
+    """Time the reset_weekly_sales DELETE without keeping its changes."""
+    timings = []
+    for driver_id, week_number, year in args_list:
+        start = time.perf_counter()
+        conn.execute('DELETE FROM sales WHERE driver_id = ? AND year_week = ?',
+                     (driver_id, db.make_year_week(year, week_number)))
+        timings.append((time.perf_counter() - start) * 1000)
+        conn.rollback()
+    return statistics.median(timings)
+
+def sample_week_args(conn, repeat):
+    """Pick random (driver_id, week_number, year) triples that have sales."""
+    rows = conn.execute(
+        'SELECT driver_id, year_week FROM sales ORDER BY random() LIMIT ?', (repeat,)
+    ).fetchall()
+    return [(driver_id, *reversed(db.split_year_week(year_week))) for driver_id, year_week in rows]
+
+def sample_day_args(conn, repeat):
+    """Pick random (driver_id, date) pairs that have sales."""
+    return conn.execute(
+        'SELECT driver_id, date FROM sales ORDER BY random() LIMIT ?', (repeat,)
+    ).fetchall()
+
+# The weekly totals query that weekly_totals replaced, summing the raw rows
+WEEKLY_SUM_SQL = f'''
+    SELECT {', '.join(f"SUM({expr.format(row='sales')})" for _, expr in db.WEEKLY_TOTALS_COLUMNS)}
+    FROM sales
+    WHERE driver_id = ? AND year_week = ?
+'''
+
+def sum_weekly_sales(conn, driver_id, week_number, year):
+    return conn.execute(WEEKLY_SUM_SQL, (driver_id, db.make_year_week(year, week_number))).fetchone()
+
+def run_query_suite(conn, week_args, day_args):
+    # Only queries that still read the sales table; weekly and historical
+    # totals are read from weekly_totals, which the sales indexes do not affect
+    return {
+        'get_weekly_sales_records': time_call(db.get_weekly_sales_records.__wrapped__, week_args),
+        'get_driver_sales': time_call(db.get_driver_sales.__wrapped__, day_args),
+        'weekly SUM over sales': time_call(functools.partial(sum_weekly_sales, conn), week_args),
+        'reset_weekly_sales': time_reset_weekly_sales(conn, week_args),
+    }
+
+def bench_indexes(row_counts, repeat):
+    """
+    Compare the latency of the sales queries without and with the sales
+    indexes, and of the weekly_totals lookup against summing indexed sales.
+    """
+    print(f"{'rows':>10}  {'query':<26}{'before ms':>12}{'after ms':>12}{'speedup':>10}")
+    for num_rows in row_counts:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            db.configure(os.path.join(tmpdir, 'benchmark.db'))
+            with db.get_db_connection() as conn:
+                db.migrate(conn)
+                # Set the indexes aside and populate the bare tables
+                indexes = conn.execute(
+                    "SELECT name, sql FROM sqlite_master "
+                    "WHERE type = 'index' AND tbl_name = 'sales' AND sql IS NOT NULL"
+                ).fetchall()
+                for name, _ in indexes:
+                    conn.execute(f'DROP INDEX {name}')
+                populate_sales(conn, num_rows)
+                week_args = sample_week_args(conn, repeat)
+                day_args = sample_day_args(conn, repeat)
+                before = run_query_suite(conn, week_args, day_args)
+                for _, sql in indexes:
+                    conn.execute(sql)
+                conn.commit()
+                after = run_query_suite(conn, week_args, day_args)
+                totals_ms = time_call(db.get_weekly_sales.__wrapped__, week_args)
+            db.close_all_connections()
+
+        for name in before:
+            speedup = before[name] / after[name] if after[name] else float('inf')
+            print(f"{num_rows:>10}  {name:<26}{before[name]:>12.3f}{after[name]:>12.3f}{speedup:>9.1f}x")
+        sum_ms = after['weekly SUM over sales']
+        print(f"{num_rows:>10}  {'get_weekly_sales':<26}{sum_ms:>12.3f}{totals_ms:>12.3f}"
+              f"{sum_ms / totals_ms if totals_ms else float('inf'):>9.1f}x  (indexed SUM vs weekly_totals)")
+
+def bench_export(row_counts, batch_size):
+    """Measure streaming export throughput and peak Python heap use."""
+    print(f"{'rows':>10}  {'format':<8}{'seconds':>10}{'rows/s':>12}{'MB written':>12}{'peak heap MB':>14}")
+    for num_rows in row_counts:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            db.configure(os.path.join(tmpdir, 'benchmark.db'))
+            with db.get_db_connection() as conn:
+                db.migrate(conn)
+                populate_sales(conn, num_rows)
+
+            for file_format in sales_export.FORMATS:
+                path = os.path.join(tmpdir, f'export.{file_format}')
+                start = time.perf_counter()
+                rows = sales_export.export_sales(path, file_format, batch_size=batch_size)
+                elapsed = time.perf_counter() - start
+                size_mb = os.path.getsize(path) / 1024 / 1024
+
+                # Measure memory in a second run, since tracing slows the export.
+                # RSS is not used because SQLite's memory-mapped pages count towards it.
+                tracemalloc.start()
+                sales_export.export_sales(path, file_format, batch_size=batch_size)
+                peak_mb = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+                tracemalloc.stop()
+
+                print(f"{rows:>10}  {file_format:<8}{elapsed:>10.2f}{rows / elapsed:>12.0f}"
+                      f"{size_mb:>12.1f}{peak_mb:>14.1f}")
+            db.close_all_connections()
+
+def synthetic_history(num_weeks, seed=3):
+    """Return num_weeks of get_historical_sales rows ending this week, newest first."""
+    rng = random.Random(seed)
+    rows = []
+    day = date.today()
+    for _ in range(num_weeks):
+        year, week, _ = day.isocalendar()
+        rows.append((year, week, *(round(rng.uniform(0, 20000), 2) for _ in range(6))))
+        day -= timedelta(weeks=1)
+    return rows
+
+def build_historical_frame_loop(historical_sales):
+    """The per-row construction the history view used before build_historical_frame."""
+    historical_df = pd.DataFrame(historical_sales, columns=utils.HISTORICAL_COLUMNS)
+    date_ranges = []
+    for year, week in zip(historical_df['Year'], historical_df['Week']):
+        start_date, end_date = utils.get_week_dates(int(year), int(week))
+        date_ranges.append(f"{start_date} to {end_date}")
+    historical_df.insert(2, 'Date Range', date_ranges)
+    total_net_sales = []
+    for _, row in historical_df.iterrows():
+        total_net_sales.append(utils.calculate_total_sales(
+            float(row['Uber']), float(row['Bolt']), float(row['Zettel']), float(row['Other'])
+        ))
+    historical_df['Total Net Sales'] = total_net_sales
+    return historical_df
+
+def bench_history(week_counts, repeat):
+    """Compare the vectorized historical table build with the per-row loop."""
+    print(f"{'weeks':>8}  {'loop ms':>10}{'vectorized ms':>15}{'speedup':>10}")
+    for num_weeks in week_counts:
+        args = [(synthetic_history(num_weeks),)] * repeat
+        loop_ms = time_call(build_historical_frame_loop, args)
+        vectorized_ms = time_call(utils.build_historical_frame, args)
+        print(f"{num_weeks:>8}  {loop_ms:>10.2f}{vectorized_ms:>15.2f}{loop_ms / vectorized_ms:>9.1f}x")
+
+def sample_report_payloads(num_rows, seed=5):
+    """Return (name, generator, data) for every PDF report with num_rows table rows."""
+    rng = random.Random(seed)
+    week_start, week_end = utils.get_week_dates(*date.today().isocalendar()[:2])
+
+    def amounts():
+        return {name: round(rng.uniform(0, 20000), 2)
+                for name in ['uber', 'bolt', 'zettel', 'other', 'oil', 'zettel_fee']}
+
+    weekly = {
+        'driver_name': "Driver 1",
+        'oil_card': "CARD000001",
+        'target': 20000.0,
+        'week_number': 1,
+        'week_start_date': week_start,
+        'week_end_date': week_end,
+        'sales_breakdown': {
+            'uber_sales': 9000.0, 'bolt_sales': 6000.0, 'zettel_sales': 2000.0, 'zettel_fee': 40.0,
+            'other_sales': 500.0, 'other_sales_type': "Cash", 'oil_expense': 1200.0
+        }
+    }
+    historical = utils.prepare_historical_report_data(
+        "Driver 1", utils.build_historical_frame(synthetic_history(num_rows))
+    )
+    comparison = utils.prepare_comparison_data(utils.build_comparison_frame([
+        (i, f"Driver {i}", f"CARD{i:06d}", 20000.0, 1, *amounts().values())
+        for i in range(1, num_rows + 1)
+    ]))
+    summary = {
+        'date': utils.get_current_date(),
+        'week_number': 1,
+        'week_start_date': week_start,
+        'week_end_date': week_end,
+        'drivers': [dict(name=f"Driver {i}", oil_card=f"CARD{i:06d}", target=20000.0, **amounts())
+                    for i in range(1, num_rows + 1)]
+    }
+    return [
+        ('generate_pdf_report', report_generator.generate_pdf_report, weekly),
+        ('generate_historical_report', report_generator.generate_historical_report, historical),
+        ('generate_comparison_report', report_generator.generate_comparison_report, comparison),
+        ('generate_summary_report', report_generator.generate_summary_report, summary),
+    ]
+
+def bench_reports(row_counts, repeat):
+    """Measure the render time of each PDF report, uncached and from the report cache."""
+    print(f"{'rows':>8}  {'report':<28}{'render ms':>12}{'cached ms':>12}")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        report_cache.configure(cache_dir=tmpdir)
+        for num_rows in row_counts:
+            for name, generate, data in sample_report_payloads(num_rows):
+                render_ms = time_call(generate.__wrapped__, [(data,)] * repeat)
+                generate(data)
+                cached_ms = time_call(generate, [(data,)] * repeat)
+                print(f"{num_rows:>8}  {name:<28}{render_ms:>12.2f}{cached_ms:>12.2f}")
+
+def startup_modules(script='main.py'):
+    """Return the modules a script imports at the top level."""
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), script)) as f:
+        tree = ast.parse(f.read())
+    modules = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            modules.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.level == 0:
+            modules.append(node.module)
+    return modules
+
+def measure_import_time(modules):
+    """Import modules in a fresh interpreter and return {top-level module: cumulative ms}."""
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f"import {', '.join(modules)}"],
+        capture_output=True, text=True, check=True,
+        cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    timings = {}
+    for line in completed.stderr.splitlines():
+        # "import time: self [us] | cumulative | imported package"; nested
+        # imports are indented, so only top-level entries are summed
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if not name.startswith('  '):
+            timings[name.strip()] = int(cumulative) / 1000
+    return timings
+
+def bench_startup(repeat, budget_ms):
+    """Measure the import time of main.py's top-level imports against a budget."""
+    modules = startup_modules()
+    # Interpreter start-up modules such as site are not part of the budget
+    runs = [{name: elapsed for name, elapsed in measure_import_time(modules).items()
+             if name.split('.')[0] in modules}
+            for _ in range(repeat)]
+    total_ms = statistics.median(sum(run.values()) for run in runs)
+
+    print(f"{'module':<40}{'ms':>10}")
+    slowest = max(runs, key=lambda run: sum(run.values()))
+    for name, elapsed in sorted(slowest.items(), key=lambda item: -item[1]):
+        print(f"{name:<40}{elapsed:>10.1f}")
+    print(f"median startup import time {total_ms:.1f} ms, budget {budget_ms} ms")
+    if total_ms > budget_ms:
+        print("startup import time is over budget")
+        return False
+    return True
+
+def time_rerun(app):
+    """Return the wall time of re-running a Streamlit AppTest in milliseconds."""
+    start = time.perf_counter()
+    app.run()
+    elapsed = (time.perf_counter() - start) * 1000
+    if app.exception:
+        raise RuntimeError(app.exception[0].value)
+    return elapsed
+
+def bench_rerun(row_counts, repeat):
+    """Compare Streamlit rerun latency with and without the per-rerun schema check."""
+    from streamlit.testing.v1 import AppTest
+
+    print(f"{'rows':>10}  {'init_db ms':>12}{'rerun before ms':>18}{'rerun after ms':>16}")
+    init_db = db.init_db
+    # Before: every rerun checks the schema version, as init_db used to
+    forced_init_db = functools.partial(init_db, force=True)
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'main.py')
+    for num_rows in row_counts:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            db.configure(os.path.join(tmpdir, 'benchmark.db'))
+            with db.get_db_connection() as conn:
+                db.migrate(conn)
+                populate_sales(conn, num_rows)
+            app = AppTest.from_file(script, default_timeout=60)
+            app.run()
+
+            init_ms = time_call(forced_init_db, [()] * repeat)
+            # Alternate the two variants so that drift affects both alike
+            before, after = [], []
+            try:
+                for _ in range(repeat):
+                    db.init_db = forced_init_db
+                    before.append(time_rerun(app))
+                    db.init_db = init_db
+                    after.append(time_rerun(app))
+            finally:
+                db.init_db = init_db
+            db.close_all_connections()
+        print(f"{num_rows:>10}  {init_ms:>12.3f}"
+              f"{statistics.median(before):>18.1f}{statistics.median(after):>16.1f}")
+
+def bench_targets(num_drivers, repeat, budget_ms):
+    """Time the fleet target view for a synthetic fleet against a budget."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db.configure(os.path.join(tmpdir, 'benchmark.db'))
+        db.init_db()
+        fleet_generator.generate_fleet(num_drivers)
+        year, week, _ = (date.today() - timedelta(weeks=1)).isocalendar()
+
+        def target_view(min_shortfall=None):
+            return utils.build_target_status_frame(
+                db.get_fleet_target_status.__wrapped__(week, year, min_shortfall)
+            )
+
+        query_ms = time_call(db.get_fleet_target_status.__wrapped__, [(week, year)] * repeat)
+        view_ms = time_call(target_view, [()] * repeat)
+        filtered_ms = time_call(target_view, [(5000.0,)] * repeat)
+        target_df = target_view()
+        pdf_ms = time_call(report_generator.generate_target_status_report.__wrapped__, [({
+            'date': utils.get_current_date(),
+            'week_number': week,
+            'week_start_date': '',
+            'week_end_date': '',
+            'targets': target_df,
+        },)] * min(repeat, 3))
+        db.close_all_connections()
+
+    print(f"{num_drivers} drivers, week {week} of {year}")
+    print(f"{'query':<32}{query_ms:>10.2f} ms")
+    print(f"{'query and table':<32}{view_ms:>10.2f} ms")
+    print(f"{'query and table, filtered':<32}{filtered_ms:>10.2f} ms")
+    print(f"{'PDF export':<32}{pdf_ms:>10.2f} ms")
+    print(f"budget {budget_ms} ms")
+    if max(view_ms, filtered_ms) > budget_ms:
+        print("fleet target view is over budget")
+        return False
+    return True
+
+def check_totals_triggers():
+    """
+    Exercise the weekly_totals triggers and check_weekly_totals on a
+    throwaway database.
+
+    Every kind of sales write is applied in turn, and check_weekly_totals()
+    must find no drift after each one. Then weekly_totals is damaged on
+    purpose and the checker must report and repair it.
+
+    Returns:
+        True if every check passed
+    """
+    failures = []
+
+    def expect_no_drift(step):
+        drift = db.check_weekly_totals()
+        status = "ok" if not drift else f"{len(drift)} drifted value(s), first {drift[0]}"
+        print(f"{step:<44}{status}")
+        if drift:
+            failures.append(step)
+
+    def execute(sql, params=()):
+        with db.get_db_connection() as conn:
+            conn.execute(sql, params)
+            conn.commit()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db.configure(os.path.join(tmpdir, 'benchmark.db'))
+        db.init_db()
+        db.add_driver("Driver A", "CARD-A", 20000.0)
+        db.add_driver("Driver B", "CARD-B", 15000.0)
+        (driver_a, *_), (driver_b, *_) = sorted(db.get_all_drivers())
+
+        db.add_sales_record(driver_a, '2025-03-04', 1000.0, 500.0, 200.0, 4.0, 50.0, "Cash", 300.0, 10, 2025)
+        db.add_sales_record(driver_a, '2025-03-05', 900.0, 400.0, 100.0, 2.0, -20.0, "Card", 0.0, 10, 2025)
+        # Entered in January for the last week of the previous year
+        db.add_sales_record(driver_b, '2025-01-02', 700.0, 0.0, 0.0, 0.0, 0.0, "Cash", 0.0, 52)
+        expect_no_drift("insert")
+
+        db.add_sales_records([[
+            (driver_b, f'2025-03-{day:02d}', 100.0 * day, 50.0, 30.0, 1.0, 0.0, "Swish", 10.0, 10, 202510)
+            for day in range(3, 10)
+        ]])
+        expect_no_drift("bulk insert")
+
+        with db.get_db_connection() as conn:
+            record_ids = [row[0] for row in conn.execute('SELECT id FROM sales ORDER BY id')]
+        db.update_sales_record(record_ids[0], 1500.0, 0.0, 250.0, 5.0, 0.0, "Cash", 100.0)
+        expect_no_drift("update amounts")
+
+        execute('UPDATE sales SET week_number = 11, year_week = 202511 WHERE id = ?', (record_ids[1],))
+        expect_no_drift("move to another week")
+
+        execute('UPDATE sales SET driver_id = ? WHERE id = ?', (driver_b, record_ids[1]))
+        expect_no_drift("move to another driver")
+
+        execute('UPDATE sales SET year_week = NULL WHERE id = ?', (record_ids[2],))
+        expect_no_drift("clear year_week")
+        execute('UPDATE sales SET year_week = 202452 WHERE id = ?', (record_ids[2],))
+        expect_no_drift("restore year_week")
+
+        week_records = db.get_weekly_sales_records.__wrapped__(driver_b, 10, 2025)
+        db.apply_week_edits(
+            driver_b, 10, 2025,
+            inserts=[('2025-03-08', 10.0, 20.0, 30.0, 1.0, 5.0, "Cash", 0.0)],
+            updates=[(week_records[0][0], week_records[0][1], 1.0, 2.0, 3.0, 0.5, 4.0, "Card", 5.0)],
+            deletes=[week_records[1][0]]
+        )
+        expect_no_drift("week editor")
+
+        execute('DELETE FROM sales WHERE id = ?', (record_ids[0],))
+        expect_no_drift("delete one record")
+
+        db.reset_weekly_sales(driver_b, 10, 2025)
+        expect_no_drift("reset week")
+
+        db.reset_all_sales(driver_a)
+        expect_no_drift("reset driver")
+
+        # Damage weekly_totals: a wrong amount, a missing week and a surplus week
+        execute('UPDATE weekly_totals SET total_uber = total_uber + 1 WHERE year_week = 202452')
+        execute('DELETE FROM weekly_totals WHERE year_week = 202511')
+        execute('INSERT INTO weekly_totals (driver_id, year_week, record_count) VALUES (?, 202001, 1)',
+                (driver_a,))
+        drift = db.check_weekly_totals()
+        detected = sorted((year_week, column) for _, year_week, column, _, _ in drift)
+        expected = [(202001, 'record_count'), (202452, 'total_uber'), (202511, 'record_count')]
+        print(f"{'detect damage':<44}{'ok' if detected == expected else f'found {detected}'}")
+        if detected != expected:
+            failures.append("detect damage")
+        db.check_weekly_totals(repair=True)
+        expect_no_drift("repair")
+        db.close_all_connections()
+
+    if failures:
+        print(f"weekly_totals checks failed: {', '.join(failures)}")
+        return False
+    return True
+
+def time_samples(func, args_list):
+    """Return the wall times of func over args_list in milliseconds."""
+    timings = []
+    for args in args_list:
+        start = time.perf_counter()
+        func(*args)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+def consume(iterator):
+    """Exhaust an iterator, e.g. to time a generator function."""
+    for _ in iterator:
+        pass
+
+def suite_cases(repeat, seed=7):
+    """
+    Return (name, func, args_list) for every benchmarked function.
+
+    Reads run uncached and PDF generators bypass the report cache. The write
+    cases add scratch drivers and remove them again, so the fleet is left as
+    it was. They must run in the order returned.
+    """
+    rng = random.Random(seed)
+    with db.get_db_connection() as conn:
+        samples = conn.execute(
+            'SELECT driver_id, date, week_number, year_week FROM sales ORDER BY random() LIMIT ?',
+            (repeat,)
+        ).fetchall()
+        record_ids = [row[0] for row in conn.execute(
+            'SELECT id FROM sales ORDER BY random() LIMIT ?', (repeat,)
+        )]
+    driver_days = [(driver_id, day) for driver_id, day, _, _ in samples]
+    driver_weeks = [(driver_id, week, db.split_year_week(year_week)[0])
+                    for driver_id, _, week, year_week in samples]
+    drivers = [(driver_id,) for driver_id, _ in driver_days]
+
+    # Reports for the last full week
+    year, week, _ = (date.today() - timedelta(weeks=1)).isocalendar()
+    week_drivers = db.get_weekly_sales_for_all_drivers.__wrapped__(week, year)
+    driver_names = {row[0]: row[1] for row in db.get_all_drivers.__wrapped__()}
+    histories = [utils.build_historical_frame(db.get_historical_sales.__wrapped__(driver_id))
+                 for driver_id, in drivers]
+    historical_payloads = [utils.prepare_historical_report_data(driver_names[driver_id], history)
+                           for (driver_id,), history in zip(drivers, histories)]
+    weekly_payloads = [batch_reports.weekly_report_data(driver, week, year)
+                       for driver in week_drivers[:repeat]] or [batch_reports.weekly_report_data(
+                           (0, "Driver", "CARD", 20000.0, 0, 0, 0, 0, 0, 0), week, year)]
+    # Comparisons cover the whole fleet over a quarter
+    (first_year, first_week), _ = utils.get_week_range(year, week, 13)
+    quarter = (None, db.make_year_week(first_year, first_week), db.make_year_week(year, week))
+    comparison_totals = db.get_comparison_totals.__wrapped__(*quarter)
+    comparison_df = utils.build_comparison_frame(comparison_totals, 13)
+    comparison = utils.prepare_comparison_data(comparison_df)
+    comparison['highlights'] = utils.prepare_comparison_highlights({
+        metric: next(iter(db.get_leaderboard.__wrapped__(metric, *quarter[1:], 13, limit=1)), None)
+        for _, metric in utils.COMPARISON_HIGHLIGHTS
+    })
+    # Trends cover half a year plus the weeks the long rolling average needs
+    (trend_year, trend_week), _ = utils.get_week_range(year, week, 26 + trends.LONG_WINDOW - 1)
+    trend_range = (db.make_year_week(trend_year, trend_week), db.make_year_week(year, week))
+    weekly_totals = db.get_fleet_weekly_totals.__wrapped__(*trend_range)
+    fleet_trends = trends.compute_trends(weekly_totals)['fleet']
+    week_start, week_end = utils.get_week_dates(year, week)
+    target_status = db.get_fleet_target_status.__wrapped__(week, year)
+    target_report = {
+        'date': utils.get_current_date(),
+        'week_number': week,
+        'week_start_date': week_start,
+        'week_end_date': week_end,
+        'targets': utils.build_target_status_frame(target_status),
+    }
+    summary = {
+        'date': utils.get_current_date(),
+        'week_number': week,
+        'week_start_date': week_start,
+        'week_end_date': week_end,
+        'drivers': [{'name': name, 'oil_card': card, 'target': target, 'uber': uber, 'bolt': bolt,
+                     'zettel': zettel, 'other': other, 'oil': oil, 'zettel_fee': fee}
+                    for _, name, card, target, uber, bolt, zettel, other, oil, fee in week_drivers]
+    }
+    sales_data = [payload['sales_breakdown'] for payload in weekly_payloads]
+
+    # Scratch drivers for the write functions, created by the add_driver case
+    scratch = [f"Benchmark driver {i}" for i in range(repeat)]
+    scratch_ids = []
+
+    def add_driver(name):
+        db.add_driver(name, "BENCHMARK", 20000.0)
+        with db.get_db_connection() as conn:
+            scratch_ids.append(conn.execute('SELECT max(id) FROM drivers').fetchone()[0])
+
+    def scratch_args(build):
+        # Built lazily, once add_driver has run
+        return lambda: [build(driver_id) for driver_id in scratch_ids]
+
+    day = date.today().isoformat()
+    year_week = db.get_year_week(day)
+    this_year, this_week = db.split_year_week(year_week)
+    record = (day, 1000.0, 500.0, 200.0, 4.0, 0.0, "Cash", 600.0)
+
+    def week_batch(driver_id, size=100):
+        return [[(driver_id, *record, this_week, year_week)] * size]
+
+    def update_last_record(driver_id):
+        with db.get_db_connection() as conn:
+            record_id = conn.execute(
+                'SELECT max(id) FROM sales WHERE driver_id = ?', (driver_id,)
+            ).fetchone()[0]
+        db.update_sales_record(record_id, 1100.0, 550.0, 220.0, 4.4, 10.0, "Swish", 650.0)
+
+    def week_edits(driver_id):
+        # A week's worth of corrections saved as one diff
+        records = db.get_weekly_sales_records.__wrapped__(driver_id, this_week, this_year)[:7]
+        updates = [(record_id, record_day, 1100.0, 550.0, 220.0, 4.4, 10.0, "Swish", 650.0)
+                   for record_id, record_day, *_ in records]
+        return (driver_id, this_week, this_year, [record], updates, [])
+
+    return [
+        ('database.get_year_week', db.get_year_week, [(day,) for _, day in driver_days]),
+        ('database.get_driver', db.get_driver.__wrapped__, drivers),
+        ('database.get_all_drivers', db.get_all_drivers.__wrapped__, [()] * repeat),
+        ('database.get_driver_sales', db.get_driver_sales.__wrapped__, driver_days),
+        ('database.get_weekly_sales', db.get_weekly_sales.__wrapped__, driver_weeks),
+        ('database.get_weekly_sales_for_all_drivers', db.get_weekly_sales_for_all_drivers.__wrapped__,
+         [(week, year) for _, week, year in driver_weeks]),
+        ('database.get_comparison_totals (fleet, 13 weeks)', db.get_comparison_totals.__wrapped__,
+         [quarter] * repeat),
+        ('database.get_fleet_weekly_totals (37 weeks)', db.get_fleet_weekly_totals.__wrapped__,
+         [trend_range] * repeat),
+        ('database.get_leaderboard (fleet, 13 weeks, page of 25)',
+         lambda metric: db.get_leaderboard.__wrapped__(metric, *quarter[1:], 13, limit=25),
+         [(metric,) for metric in db.LEADERBOARD_METRICS]),
+        ('database.count_leaderboard_drivers', db.count_leaderboard_drivers.__wrapped__,
+         [quarter[1:]] * repeat),
+        ('database.get_fleet_target_status', db.get_fleet_target_status.__wrapped__,
+         [(week, year)] * repeat),
+        ('database.get_historical_sales', db.get_historical_sales.__wrapped__, drivers),
+        ('database.get_historical_sales (page of 25)',
+         lambda driver_id: db.get_historical_sales.__wrapped__(driver_id, limit=25), drivers),
+        ('database.count_historical_weeks', db.count_historical_weeks.__wrapped__, drivers),
+        ('database.get_weekly_sales_records', db.get_weekly_sales_records.__wrapped__, driver_weeks),
+        ('database.iter_sales_batches', lambda: consume(db.iter_sales_batches()), [()] * repeat),
+        ('database.check_weekly_totals', db.check_weekly_totals, [()] * repeat),
+        ('database.init_db', functools.partial(db.init_db, force=True), [()] * repeat),
+        ('database.add_driver', add_driver, [(name,) for name in scratch]),
+        ('database.update_driver', db.update_driver,
+         scratch_args(lambda driver_id: (driver_id, f"Benchmark driver {driver_id}", "BENCHMARK", 25000.0))),
+        ('database.add_sales_record', db.add_sales_record,
+         scratch_args(lambda driver_id: (driver_id, *record, this_week, this_year))),
+        ('database.add_sales_records (100 records)', db.add_sales_records, scratch_args(lambda driver_id: (week_batch(driver_id),))),
+        ('database.update_sales_record', update_last_record, scratch_args(lambda driver_id: (driver_id,))),
+        ('database.apply_week_edits (1 insert, 7 updates)', db.apply_week_edits, scratch_args(week_edits)),
+        ('database.reset_weekly_sales', db.reset_weekly_sales,
+         scratch_args(lambda driver_id: (driver_id, this_week, this_year))),
+        ('database.reset_all_sales', db.reset_all_sales, scratch_args(lambda driver_id: (driver_id,))),
+        ('database.delete_driver', db.delete_driver, scratch_args(lambda driver_id: (driver_id,))),
+        ('utils.build_historical_frame', utils.build_historical_frame,
+         [(db.get_historical_sales.__wrapped__(driver_id),) for driver_id, in drivers]),
+        ('utils.prepare_report_data', utils.prepare_report_data,
+         [("Driver", data, 20000.0) for data in sales_data]),
+        ('utils.prepare_historical_report_data', utils.prepare_historical_report_data,
+         [("Driver", history) for history in histories]),
+        ('utils.build_comparison_frame', utils.build_comparison_frame,
+         [(comparison_totals, 13)] * repeat),
+        ('utils.build_target_status_frame', utils.build_target_status_frame,
+         [(target_status,)] * repeat),
+        ('utils.prepare_comparison_data', utils.prepare_comparison_data, [(comparison_df,)] * repeat),
+        ('trends.compute_trends (37 weeks)', trends.compute_trends, [(weekly_totals,)] * repeat),
+        ('report_generator.create_sales_figure', report_generator.create_sales_figure,
+         [(payload,) for payload in weekly_payloads]),
+        ('report_generator.create_sales_chart', report_generator.create_sales_chart,
+         [(payload,) for payload in weekly_payloads]),
+        ('report_generator.create_comparison_chart', report_generator.create_comparison_chart,
+         [(comparison,)] * repeat),
+        ('report_generator.create_trend_figure', report_generator.create_trend_figure,
+         [(fleet_trends, "Fleet")] * repeat),
+        ('report_generator.generate_pdf_report', report_generator.generate_pdf_report.__wrapped__,
+         [(payload,) for payload in weekly_payloads]),
+        ('report_generator.generate_historical_report',
+         report_generator.generate_historical_report.__wrapped__,
+         [(payload,) for payload in historical_payloads]),
+        ('report_generator.generate_comparison_report',
+         report_generator.generate_comparison_report.__wrapped__, [(comparison,)] * repeat),
+        ('report_generator.generate_target_status_report',
+         report_generator.generate_target_status_report.__wrapped__, [(target_report,)] * repeat),
+        ('report_generator.generate_summary_report',
+         report_generator.generate_summary_report.__wrapped__, [(summary,)] * repeat),
+    ]
+
+def git_commit():
+    """Return the checked out commit of the repository, or None outside git."""
+    try:
+        completed = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return completed.stdout.strip()
+
+def run_suite(base_drivers, scales, years, repeat, seed=42):
+    """
+    Benchmark every case of suite_cases() on synthetic fleets of each scale.
+
+    Returns:
+        A JSON-serialisable dict with the environment and the timings
+    """
+    results = {
+        'commit': git_commit(),
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'base_drivers': base_drivers,
+        'years': years,
+        'repeat': repeat,
+        'seed': seed,
+        'scales': [],
+    }
+    for scale in scales:
+        num_drivers = base_drivers * scale
+        with tempfile.TemporaryDirectory() as tmpdir:
+            db.configure(os.path.join(tmpdir, 'benchmark.db'))
+            db.init_db()
+            start = time.perf_counter()
+            _, sales_records = fleet_generator.generate_fleet(num_drivers, years=years, seed=seed)
+            generate_seconds = time.perf_counter() - start
+            print(f"{scale}x: {num_drivers} drivers, {sales_records} sales records "
+                  f"generated in {generate_seconds:.1f} s", file=sys.stderr)
+
+            timings = {}
+            for name, func, args_list in suite_cases(repeat):
+                samples = time_samples(func, args_list() if callable(args_list) else args_list)
+                timings[name] = {
+                    'median_ms': round(statistics.median(samples), 4),
+                    'min_ms': round(min(samples), 4),
+                    'max_ms': round(max(samples), 4),
+                    'calls': len(samples),
+                }
+                print(f"  {name:<52}{timings[name]['median_ms']:>12.3f} ms", file=sys.stderr)
+            db.close_all_connections()
+
+        results['scales'].append({
+            'scale': scale,
+            'drivers': num_drivers,
+            'sales_records': sales_records,
+            'generate_seconds': round(generate_seconds, 3),
+            'timings': timings,
+        })
+    return results
+
+def compare_results(baseline, current, threshold, min_delta_ms):
+    """
+    Print the median time of every case against a baseline run.
+
+    Args:
+        baseline: Results of an earlier run_suite()
+        current: Results of this run
+        threshold: Ratio of current to baseline median above which a case
+            counts as a regression
+        min_delta_ms: Slowdowns smaller than this are timer noise, whatever
+            their ratio
+
+    Returns:
+        The number of regressions
+    """
+    baseline_scales = {entry['scale']: entry['timings'] for entry in baseline['scales']}
+    print(f"baseline {baseline.get('commit') or 'unknown'}, current {current.get('commit') or 'unknown'}")
+    print(f"{'scale':>6}  {'case':<52}{'baseline ms':>13}{'current ms':>12}{'ratio':>8}")
+    regressions = 0
+    for entry in current['scales']:
+        before = baseline_scales.get(entry['scale'], {})
+        for name, timing in entry['timings'].items():
+            if name not in before:
+                continue
+            ratio = timing['median_ms'] / before[name]['median_ms'] if before[name]['median_ms'] else 1.0
+            flag = ''
+            if ratio > threshold and timing['median_ms'] - before[name]['median_ms'] > min_delta_ms:
+                regressions += 1
+                flag = '  REGRESSION'
+            print(f"{entry['scale']:>5}x  {name:<52}{before[name]['median_ms']:>13.3f}"
+                  f"{timing['median_ms']:>12.3f}{ratio:>7.2f}x{flag}")
+    return regressions
+
+def bench_suite(base_drivers, scales, years, repeat, output, baseline_path, threshold, min_delta_ms):
+    """Run the benchmark suite, save it as JSON and compare it with a baseline."""
+    results = run_suite(base_drivers, scales, years, repeat)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"results written to {output}", file=sys.stderr)
+
+    if baseline_path:
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+        regressions = compare_results(baseline, results, threshold, min_delta_ms)
+        print(f"{regressions} regression(s) above {threshold:.2f}x")
+        return regressions == 0
+    return True
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    indexes_parser = subparsers.add_parser('indexes', help="Sales query latency before and after indexing")
+    indexes_parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    indexes_parser.add_argument('--repeat', type=int, default=20)
+
+    export_parser = subparsers.add_parser('export', help="Streaming CSV and Parquet export throughput")
+    export_parser.add_argument('--rows', type=int, nargs='+', default=[1_000_000, 3_000_000])
+    export_parser.add_argument('--batch-size', type=int, default=10000)
+
+    history_parser = subparsers.add_parser('history', help="Historical table construction time")
+    history_parser.add_argument('--weeks', type=int, nargs='+', default=[52, 520, 2600])
+    history_parser.add_argument('--repeat', type=int, default=10)
+
+    reports_parser = subparsers.add_parser('reports', help="PDF report render time")
+    reports_parser.add_argument('--rows', type=int, nargs='+', default=[10, 100, 1000])
+    reports_parser.add_argument('--repeat', type=int, default=10)
+
+    startup_parser = subparsers.add_parser('startup', help="App import time; fails when over budget")
+    startup_parser.add_argument('--budget-ms', type=float, default=600)
+    startup_parser.add_argument('--repeat', type=int, default=5)
+
+    rerun_parser = subparsers.add_parser('rerun', help="Streamlit rerun latency with and without the schema check")
+    rerun_parser.add_argument('--rows', type=int, nargs='+', default=[100_000])
+    rerun_parser.add_argument('--repeat', type=int, default=20)
+
+    targets_parser = subparsers.add_parser('targets', help="Fleet target view time; fails when over budget")
+    targets_parser.add_argument('--drivers', type=int, default=1000)
+    targets_parser.add_argument('--budget-ms', type=float, default=200)
+    targets_parser.add_argument('--repeat', type=int, default=20)
+
+    subparsers.add_parser('totals', help="Check that the weekly_totals triggers and consistency "
+                                         "check agree with the sales rows; fails on drift")
+
+    suite_parser = subparsers.add_parser('suite', help="Every database, utils and report function "
+                                                      "on synthetic fleets; results saved as JSON")
+    suite_parser.add_argument('--drivers', type=int, default=10, help="Drivers in the 1x fleet")
+    suite_parser.add_argument('--scales', type=int, nargs='+', default=[1, 10, 100])
+    suite_parser.add_argument('--years', type=float, default=1, help="Years of daily sales")
+    suite_parser.add_argument('--repeat', type=int, default=5)
+    suite_parser.add_argument('--output', default='benchmark_results.json')
+    suite_parser.add_argument('--baseline', help="Results of an earlier run to compare with")
+    suite_parser.add_argument('--threshold', type=float, default=1.25,
+                              help="Slowdown ratio reported as a regression (default: 1.25)")
+    suite_parser.add_argument('--min-delta-ms', type=float, default=1.0,
+                              help="Smallest slowdown reported as a regression (default: 1 ms)")
+
+    args = parser.parse_args()
+    if args.command == 'indexes':
+        bench_indexes(args.rows, args.repeat)
+    elif args.command == 'export':
+        bench_export(args.rows, args.batch_size)
+    elif args.command == 'history':
+        bench_history(args.weeks, args.repeat)
+    elif args.command == 'reports':
+        bench_reports(args.rows, args.repeat)
+    elif args.command == 'startup':
+        if not bench_startup(args.repeat, args.budget_ms):
+            sys.exit(1)
+    elif args.command == 'rerun':
+        bench_rerun(args.rows, args.repeat)
+    elif args.command == 'targets':
+        if not bench_targets(args.drivers, args.repeat, args.budget_ms):
+            sys.exit(1)
+    elif args.command == 'totals':
+        if not check_totals_triggers():
+            sys.exit(1)
+    elif args.command == 'suite':
+        if not bench_suite(args.drivers, args.scales, args.years, args.repeat,
+                           args.output, args.baseline, args.threshold, args.min_delta_ms):
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+"""
+Command line tools for the driver management database.
+
+Usage:
+    python cli.py [--db PATH] check-totals [--repair]
+    python cli.py [--db PATH] import FILE [--chunk-size N]
+    python cli.py [--db PATH] export FILE [--format csv|parquet] [--from DATE] [--to DATE]
+                                          [--driver ID ...] [--from-week YYYYWW] [--to-week YYYYWW]
+    python cli.py [--db PATH] reports FILE --week N [--year YYYY] [--driver ID ...] [--workers N]
+    python cli.py [--db PATH] generate-fleet [--drivers N] [--years Y] [--seed S] [--force]
+"""
+import argparse
+import sys
+
+import database as db
+
+def check_totals(args):
+    drift = db.check_weekly_totals(repair=args.repair)
+    if not drift:
+        print("weekly_totals is consistent with the sales records")
+        return 0
+
+    print(f"{'driver':>8}  {'week':>8}  {'column':<18}{'expected':>14}{'actual':>14}")
+    for driver_id, year_week, column, expected, actual in drift:
+        expected = '-' if expected is None else f"{expected:.2f}"
+        actual = '-' if actual is None else f"{actual:.2f}"
+        print(f"{driver_id:>8}  {year_week:>8}  {column:<18}{expected:>14}{actual:>14}")
+    print(f"{len(drift)} drifted value(s)" + (", weekly_totals rebuilt" if args.repair else ""))
+    return 0 if args.repair else 1
+
+def import_file(args):
+    import sales_import
+
+    result = sales_import.import_sales(args.file, chunk_size=args.chunk_size)
+    for line_number, message in result['errors']:
+        print(f"line {line_number}: {message}", file=sys.stderr)
+    if result['failed'] > len(result['errors']):
+        print(f"... {result['failed'] - len(result['errors'])} more error(s)", file=sys.stderr)
+    print(f"Imported {result['imported']} record(s), skipped {result['failed']} invalid row(s)")
+    return 1 if result['failed'] else 0
+
+def export_file(args):
+    import sales_export
+
+    file_format = args.format or ('parquet' if args.file.endswith('.parquet') else 'csv')
+    rows = sales_export.export_sales(
+        args.file,
+        file_format,
+        batch_size=args.batch_size,
+        start_date=args.start_date,
+        end_date=args.end_date,
+        driver_ids=args.driver_ids,
+        from_year_week=args.from_year_week,
+        to_year_week=args.to_year_week,
+    )
+    print(f"Exported {rows} record(s) to {args.file}")
+    return 0
+
+def batch_reports(args):
+    import batch_reports
+
+    def progress(done, total):
+        print(f"\rRendered {done}/{total} report(s)", end='', file=sys.stderr, flush=True)
+
+    count = batch_reports.generate_batch_reports(
+        args.file,
+        args.week,
+        args.year,
+        driver_ids=args.driver_ids,
+        max_workers=args.workers,
+        progress=progress,
+    )
+    if count:
+        print(file=sys.stderr)
+    print(f"Wrote {count} report(s) to {args.file}")
+    return 0
+
+def generate_fleet(args):
+    import fleet_generator
+
+    if db.get_all_drivers() and not args.force:
+        print("The database already has drivers; pass --db with a new file, or --force to add "
+              "the synthetic fleet to them", file=sys.stderr)
+        return 1
+    drivers, sales_records = fleet_generator.generate_fleet(args.drivers, years=args.years, seed=args.seed)
+    print(f"Added {drivers} driver(s) and {sales_records} sales record(s)")
+    return 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', help="Path to the database file (defaults to DRIVER_DB_PATH)")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    check_parser = subparsers.add_parser(
+        'check-totals', help="Compare weekly_totals with totals rebuilt from the sales records"
+    )
+    check_parser.add_argument('--repair', action='store_true',
+                              help="Rebuild weekly_totals when drift is found")
+    check_parser.set_defaults(handler=check_totals)
+
+    import_parser = subparsers.add_parser('import', help="Import daily sales records from a CSV or Excel file")
+    import_parser.add_argument('file', help="CSV or .xlsx file with one daily record per row")
+    import_parser.add_argument('--chunk-size', type=int, default=5000,
+                               help="Rows written per batch (default: 5000)")
+    import_parser.set_defaults(handler=import_file)
+
+    export_parser = subparsers.add_parser('export', help="Export daily sales records to CSV or Parquet")
+    export_parser.add_argument('file', help="Output file")
+    export_parser.add_argument('--format', choices=['csv', 'parquet'],
+                               help="Output format (defaults to the file extension)")
+    export_parser.add_argument('--from', dest='start_date', help="First record date (YYYY-MM-DD)")
+    export_parser.add_argument('--to', dest='end_date', help="Last record date (YYYY-MM-DD)")
+    export_parser.add_argument('--driver', dest='driver_ids', type=int, nargs='+', help="Driver IDs")
+    export_parser.add_argument('--from-week', dest='from_year_week', type=int, help="First week (YYYYWW)")
+    export_parser.add_argument('--to-week', dest='to_year_week', type=int, help="Last week (YYYYWW)")
+    export_parser.add_argument('--batch-size', type=int, default=10000,
+                               help="Rows read and written at a time (default: 10000)")
+    export_parser.set_defaults(handler=export_file)
+
+    reports_parser = subparsers.add_parser('reports', help="Render every driver's weekly PDF report into a ZIP")
+    reports_parser.add_argument('file', help="Output ZIP file")
+    reports_parser.add_argument('--week', type=int, required=True, help="Week number")
+    reports_parser.add_argument('--year', type=int, help="ISO year of the week (defaults to the current year)")
+    reports_parser.add_argument('--driver', dest='driver_ids', type=int, nargs='+', help="Driver IDs")
+    reports_parser.add_argument('--workers', type=int,
+                                help="Worker processes (defaults to the CPU count)")
+    reports_parser.set_defaults(handler=batch_reports)
+
+    fleet_parser = subparsers.add_parser('generate-fleet',
+                                         help="Fill the database with a synthetic fleet for testing")
+    fleet_parser.add_argument('--drivers', type=int, default=50, help="Number of drivers (default: 50)")
+    fleet_parser.add_argument('--years', type=float, default=1,
+                              help="Years of daily sales ending yesterday (default: 1)")
+    fleet_parser.add_argument('--seed', type=int, default=42, help="Random seed (default: 42)")
+    fleet_parser.add_argument('--force', action='store_true',
+                              help="Add the fleet even if the database already has drivers")
+    fleet_parser.set_defaults(handler=generate_fleet)
+
+    args = parser.parse_args(argv)
+    if args.db:
+        db.configure(args.db)
+    db.init_db()
+    return args.handler(args)
+
+if __name__ == '__main__':
+    sys.exit(main())
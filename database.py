@@ -1,64 +1,491 @@
+import functools
+import os
+import queue
 import sqlite3
+import threading
+import time
+from collections import OrderedDict
 from contextlib import contextmanager
 from datetime import datetime, timedelta
 
+import query_profiler
+
+# Location of the SQLite database. Override with the DRIVER_DB_PATH
+# environment variable or at runtime with configure().
+DB_PATH = os.environ.get(
+    'DRIVER_DB_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'driver_management.db')
+)
+
+# Maximum number of idle connections kept open for reuse
+POOL_SIZE = 8
+
+_pool = queue.LifoQueue(maxsize=POOL_SIZE)
+
+# Maximum number of cached read results, and how long an unused one is kept.
+# Writes from this or any other process invalidate the cache before the next
+# lookup, so the TTL only bounds memory, not staleness.
+CACHE_SIZE = 512
+CACHE_TTL = 60
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+_generation = 0
+
+# Connection that only ever runs PRAGMA data_version, which changes whenever
+# another connection, in this process or any other, commits to the database
+_watch = None
+_watch_lock = threading.Lock()
+
+# Database files whose schema init_db() has brought up to date in this
+# process. Streamlit re-runs main.py on every interaction, but the module
+# stays imported, so the schema check is only paid once per file.
+_initialized_paths = set()
+_init_lock = threading.Lock()
+
+# Database calls and cache hits made by each thread, read by the perf module
+_call_counts = threading.local()
+
+def _connect(db_path):
+    # Wait for competing writers instead of failing with "database is locked".
+    # Connections opened while the profiler is on record their queries.
+    factory = query_profiler.ProfilingConnection if query_profiler.enabled else sqlite3.Connection
+    conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False, factory=factory)
+    # WAL lets readers in other sessions proceed while one session writes
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute('PRAGMA cache_size=-65536')  # 64 MiB page cache
+    conn.execute('PRAGMA mmap_size=268435456')  # 256 MiB memory map
+    return conn
+
+def configure(db_path):
+    """
+    Point the database layer at a different SQLite file.
+
+    Args:
+        db_path: Path to the database file
+    """
+    global DB_PATH, _watch
+    close_all_connections()
+    DB_PATH = db_path
+    with _watch_lock:
+        if _watch is not None:
+            _watch[1].close()
+            _watch = None
+    with _init_lock:
+        _initialized_paths.clear()
+    _bump_generation()
+
+def close_all_connections():
+    """Close every idle pooled connection."""
+    while True:
+        try:
+            conn = _pool.get_nowait()
+        except queue.Empty:
+            break
+        conn.close()
+
 @contextmanager
 def get_db_connection():
-    conn = sqlite3.connect('driver_management.db')
+    """
+    Borrow a connection from the pool, opening a new one if none is idle.
+
+    Connections are handed to one thread at a time and returned to the
+    pool afterwards, so the per-connection pragmas are only paid once.
+    """
+    _call_counts.db_calls = getattr(_call_counts, 'db_calls', 0) + 1
+    try:
+        conn = _pool.get_nowait()
+    except queue.Empty:
+        conn = _connect(DB_PATH)
     try:
         yield conn
     finally:
-        conn.close()
+        # Never hand an uncommitted transaction to the next borrower
+        if conn.in_transaction:
+            conn.rollback()
+        try:
+            _pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
 
-def check_table_schema():
-    with get_db_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='sales'")
-        if cursor.fetchone() is not None:
-            # Check if zettel_fee column exists
-            cursor.execute("PRAGMA table_info(sales)")
-            columns = [col[1] for col in cursor.fetchall()]
-            if 'zettel_fee' not in columns or 'week_number' not in columns:
-                # Drop and recreate if columns are missing
-                cursor.execute('DROP TABLE sales')
-                conn.commit()
-                return False
-        return True
+def get_call_counts():
+    """
+    Return how often the current thread has used the database.
 
-def init_db():
-    schema_up_to_date = check_table_schema()
+    Returns:
+        A (db_calls, cache_hits) tuple: connections borrowed from the pool
+        and reads served from the read cache
+    """
+    return getattr(_call_counts, 'db_calls', 0), getattr(_call_counts, 'cache_hits', 0)
 
-    with get_db_connection() as conn:
+def _check_external_writes():
+    # Invalidate the cache if any connection has committed since the last check
+    global _watch
+    with _watch_lock:
+        if _watch is None:
+            conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+            _watch = [DB_PATH, conn, None]
+        data_version = _watch[1].execute('PRAGMA data_version').fetchone()[0]
+        changed = data_version != _watch[2]
+        _watch[2] = data_version
+    if changed:
+        _bump_generation()
+
+def get_generation():
+    """Return a counter that changes whenever the database is written to, by any process."""
+    _check_external_writes()
+    return _generation
+
+def _bump_generation():
+    global _generation
+    with _cache_lock:
+        _generation += 1
+        _cache.clear()
+
+def clear_cache():
+    """Drop every cached read result."""
+    _bump_generation()
+
+def cached_read(func):
+    """
+    Cache the results of a read function until the next write.
+
+    Results are keyed by the function and its arguments, evicted least
+    recently used first and expire after CACHE_TTL seconds. Every lookup
+    first checks PRAGMA data_version, so commits made by other processes (the
+    CLI, another app instance) invalidate the cache too. Every function that
+    writes must still call _bump_generation() after committing, so that the
+    writing process never serves its own stale reads.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        key = (func.__name__, args, tuple(sorted(kwargs.items())))
+        _check_external_writes()
+        now = time.monotonic()
+        with _cache_lock:
+            entry = _cache.get(key)
+            if entry is not None and now - entry[0] < CACHE_TTL:
+                _cache.move_to_end(key)
+                _call_counts.cache_hits = getattr(_call_counts, 'cache_hits', 0) + 1
+                return _copy_result(entry[1])
+            generation = _generation
+
+        result = func(*args, **kwargs)
+
+        with _cache_lock:
+            # A write that landed while the query ran may not be reflected in
+            # its result, so only cache results read at the current generation
+            if generation == _generation:
+                _cache[key] = (now, result)
+                _cache.move_to_end(key)
+                while len(_cache) > CACHE_SIZE:
+                    _cache.popitem(last=False)
+        return _copy_result(result)
+    return wrapper
+
+def _copy_result(result):
+    # Rows are tuples, but fetchall() lists could be mutated by callers, and
+    # so could the DataFrames of trends.get_trends
+    if isinstance(result, list):
+        return list(result)
+    if isinstance(result, dict):
+        return {name: value.copy() for name, value in result.items()}
+    return result
+
+def _create_base_schema(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS drivers (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            oil_card_number TEXT NOT NULL,
+            weekly_target REAL NOT NULL
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sales (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            driver_id INTEGER,
+            date TEXT NOT NULL,
+            uber_sales REAL,
+            bolt_sales REAL,
+            zettel_sales REAL,
+            zettel_fee REAL,
+            other_sales REAL,
+            other_sales_type TEXT,
+            oil_expense REAL,
+            week_number INTEGER,
+            FOREIGN KEY (driver_id) REFERENCES drivers (id)
+        )
+    ''')
+
+    # Older databases may predate the zettel_fee and week_number columns.
+    # Add them in place instead of dropping the table and its sales data.
+    cursor.execute("PRAGMA table_info(sales)")
+    columns = [col[1] for col in cursor.fetchall()]
+    if 'zettel_fee' not in columns:
+        cursor.execute('ALTER TABLE sales ADD COLUMN zettel_fee REAL DEFAULT 0')
+    if 'week_number' not in columns:
+        cursor.execute('ALTER TABLE sales ADD COLUMN week_number INTEGER')
+
+    # Backfill missing week numbers from the record date
+    cursor.execute('SELECT id, date FROM sales WHERE week_number IS NULL')
+    updates = []
+    for record_id, date in cursor.fetchall():
+        try:
+            week_number = datetime.strptime(date, '%Y-%m-%d').isocalendar()[1]
+        except (TypeError, ValueError):
+            continue
+        updates.append((week_number, record_id))
+    cursor.executemany('UPDATE sales SET week_number = ? WHERE id = ?', updates)
+
+def _create_sales_indexes(cursor):
+    cursor.execute(
+        'CREATE INDEX IF NOT EXISTS idx_sales_driver_week ON sales (driver_id, week_number)'
+    )
+    cursor.execute(
+        'CREATE INDEX IF NOT EXISTS idx_sales_driver_date ON sales (driver_id, date)'
+    )
+
+def _add_year_week_key(cursor):
+    cursor.execute("PRAGMA table_info(sales)")
+    columns = [col[1] for col in cursor.fetchall()]
+    if 'year_week' not in columns:
+        cursor.execute('ALTER TABLE sales ADD COLUMN year_week INTEGER')
+
+    # Backfill the key from the record date and the week it was booked to
+    cursor.execute('SELECT id, date, week_number FROM sales WHERE year_week IS NULL')
+    updates = []
+    for record_id, date, week_number in cursor.fetchall():
+        try:
+            updates.append((get_year_week(date, week_number), record_id))
+        except (TypeError, ValueError):
+            continue
+    cursor.executemany('UPDATE sales SET year_week = ? WHERE id = ?', updates)
+
+    # Every aggregation now filters on year_week rather than week_number
+    cursor.execute('DROP INDEX IF EXISTS idx_sales_driver_week')
+    cursor.execute(
+        'CREATE INDEX IF NOT EXISTS idx_sales_driver_year_week ON sales (driver_id, year_week)'
+    )
+    cursor.execute(
+        'CREATE INDEX IF NOT EXISTS idx_sales_year_week ON sales (year_week, driver_id)'
+    )
+
+# Columns of weekly_totals and the sales expression each one sums. The
+# expressions are templates over the row alias ({row}) they are read from.
+WEEKLY_TOTALS_COLUMNS = [
+    ('total_uber', '{row}.uber_sales'),
+    ('total_bolt', '{row}.bolt_sales'),
+    ('total_zettel', '{row}.zettel_sales - {row}.zettel_fee'),
+    ('total_other', '{row}.other_sales'),
+    ('total_oil', '{row}.oil_expense'),
+    ('total_zettel_fee', '{row}.zettel_fee'),
+]
+
+_WEEKLY_TOTALS_NAMES = ', '.join(name for name, _ in WEEKLY_TOTALS_COLUMNS)
+
+def _add_totals_sql(row):
+    values = ', '.join(f'COALESCE({expr.format(row=row)}, 0)' for _, expr in WEEKLY_TOTALS_COLUMNS)
+    updates = ',\n'.join(f'{name} = {name} + excluded.{name}' for name, _ in WEEKLY_TOTALS_COLUMNS)
+    return f'''
+        INSERT INTO weekly_totals (driver_id, year_week, {_WEEKLY_TOTALS_NAMES}, record_count)
+        VALUES ({row}.driver_id, {row}.year_week, {values}, 1)
+        ON CONFLICT (driver_id, year_week) DO UPDATE SET
+        {updates},
+        record_count = record_count + 1;
+    '''
+
+def _subtract_totals_sql(row):
+    updates = ',\n'.join(
+        f'{name} = {name} - COALESCE({expr.format(row=row)}, 0)' for name, expr in WEEKLY_TOTALS_COLUMNS
+    )
+    key = f'driver_id = {row}.driver_id AND year_week = {row}.year_week'
+    return f'''
+        UPDATE weekly_totals SET
+        {updates},
+        record_count = record_count - 1
+        WHERE {key};
+        DELETE FROM weekly_totals WHERE {key} AND record_count <= 0;
+    '''
+
+_WEEKLY_TOTALS_SUMS = ', '.join(
+    f'COALESCE(SUM({expr.format(row="sales")}), 0)' for _, expr in WEEKLY_TOTALS_COLUMNS
+)
+
+_WEEKLY_TOTALS_AGGREGATE_SQL = f'''
+    SELECT driver_id, year_week, {_WEEKLY_TOTALS_SUMS}, COUNT(*)
+    FROM sales
+    WHERE driver_id IS NOT NULL AND year_week IS NOT NULL
+    GROUP BY driver_id, year_week
+'''
+
+def _create_weekly_totals(cursor):
+    amount_columns = ', '.join(f'{name} REAL NOT NULL DEFAULT 0' for name, _ in WEEKLY_TOTALS_COLUMNS)
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS weekly_totals (
+            driver_id INTEGER NOT NULL,
+            year_week INTEGER NOT NULL,
+            {amount_columns},
+            record_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (driver_id, year_week)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute(
+        'CREATE INDEX IF NOT EXISTS idx_weekly_totals_year_week ON weekly_totals (year_week)'
+    )
+
+    # Keep the totals in step with every write to sales, inside the writing
+    # transaction, whichever code path the write comes from
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_sales_insert_weekly_totals
+        AFTER INSERT ON sales
+        WHEN NEW.driver_id IS NOT NULL AND NEW.year_week IS NOT NULL
+        BEGIN
+            {_add_totals_sql('NEW')}
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_sales_delete_weekly_totals
+        AFTER DELETE ON sales
+        WHEN OLD.driver_id IS NOT NULL AND OLD.year_week IS NOT NULL
+        BEGIN
+            {_subtract_totals_sql('OLD')}
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_sales_update_old_weekly_totals
+        AFTER UPDATE ON sales
+        WHEN OLD.driver_id IS NOT NULL AND OLD.year_week IS NOT NULL
+        BEGIN
+            {_subtract_totals_sql('OLD')}
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_sales_update_new_weekly_totals
+        AFTER UPDATE ON sales
+        WHEN NEW.driver_id IS NOT NULL AND NEW.year_week IS NOT NULL
+        BEGIN
+            {_add_totals_sql('NEW')}
+        END
+    ''')
+
+    _rebuild_weekly_totals(cursor)
+
+def _rebuild_weekly_totals(cursor):
+    cursor.execute('DELETE FROM weekly_totals')
+    cursor.execute(f'''
+        INSERT INTO weekly_totals (driver_id, year_week, {_WEEKLY_TOTALS_NAMES}, record_count)
+        {_WEEKLY_TOTALS_AGGREGATE_SQL}
+    ''')
+
+# Schema migrations, applied in order. The position of a migration in this
+# list (starting at 1) is the schema version it upgrades the database to,
+# which is tracked with PRAGMA user_version. Only ever append to this list.
+MIGRATIONS = [
+    _create_base_schema,
+    _create_sales_indexes,
+    _add_year_week_key,
+    _create_weekly_totals,
+]
+
+def make_year_week(year, week_number):
+    """Return the integer key of an ISO week, e.g. 202605 for week 5 of 2026."""
+    return int(year) * 100 + int(week_number)
+
+def split_year_week(year_week):
+    """Return the (year, week_number) pair of an integer year-week key."""
+    return divmod(int(year_week), 100)
+
+def get_year_week(date, week_number=None):
+    """
+    Return the year-week key of a sales record.
+
+    Records are booked to a week number that may differ from the ISO week of
+    their date (e.g. a record for week 52 entered on 2 January), so the year
+    is taken from the date and moved to the neighbouring year when the
+    booked week is more than half a year away from the date's own week.
+
+    Args:
+        date: The record date as 'YYYY-MM-DD'
+        week_number: The week the record is booked to (defaults to the date's week)
+
+    Returns:
+        The integer year-week key
+    """
+    iso_year, iso_week, _ = datetime.strptime(date, '%Y-%m-%d').isocalendar()
+    if week_number is None:
+        week_number = iso_week
+    if week_number - iso_week > 26:
+        iso_year -= 1
+    elif iso_week - week_number > 26:
+        iso_year += 1
+    return make_year_week(iso_year, week_number)
+
+def _resolve_year_week(week_number, year=None):
+    # Weeks without an explicit year belong to the current ISO year
+    if year is None:
+        year = datetime.now().isocalendar()[0]
+    return make_year_week(year, week_number)
+
+def get_schema_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+def migrate(conn, target_version=None):
+    """
+    Apply all pending schema migrations to a database connection.
+
+    Each migration runs in its own transaction together with the
+    user_version bump, so a failed migration leaves the database at the
+    previous version. The version is read again once the write lock is held,
+    so processes starting at the same time never apply a migration twice.
+
+    Args:
+        conn: An open sqlite3 connection
+        target_version: The schema version to migrate to (defaults to latest)
+
+    Returns:
+        The schema version of the database after migrating
+    """
+    if target_version is None:
+        target_version = len(MIGRATIONS)
+
+    version = get_schema_version(conn)
+    while version < target_version:
         cursor = conn.cursor()
+        try:
+            cursor.execute('BEGIN IMMEDIATE')
+            # Another process may have migrated while this one waited for the lock
+            version = get_schema_version(conn)
+            if version < target_version:
+                MIGRATIONS[version](cursor)
+                version += 1
+                cursor.execute(f'PRAGMA user_version = {version}')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return version
 
-        # Create or recreate tables if needed
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS drivers (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                oil_card_number TEXT NOT NULL,
-                weekly_target REAL NOT NULL
-            )
-        ''')
+def init_db(force=False):
+    """
+    Create or migrate the schema of the configured database.
 
-        if not schema_up_to_date:
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS sales (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    driver_id INTEGER,
-                    date TEXT NOT NULL,
-                    uber_sales REAL,
-                    bolt_sales REAL,
-                    zettel_sales REAL,
-                    zettel_fee REAL,
-                    other_sales REAL,
-                    other_sales_type TEXT,
-                    oil_expense REAL,
-                    week_number INTEGER,
-                    FOREIGN KEY (driver_id) REFERENCES drivers (id)
-                )
-            ''')
-        conn.commit()
+    The check runs once per process and database file; later calls return
+    immediately. configure() forgets which files have been initialised.
+
+    Args:
+        force: Check the schema version even if it was already checked
+    """
+    with _init_lock:
+        if DB_PATH in _initialized_paths and not force:
+            return
+        with get_db_connection() as conn:
+            version = get_schema_version(conn)
+            migrated = migrate(conn) != version
+        _initialized_paths.add(DB_PATH)
+    if migrated:
+        _bump_generation()
 
 def add_driver(name, oil_card_number, weekly_target):
     with get_db_connection() as conn:
@@ -68,6 +495,7 @@ def add_driver(name, oil_card_number, weekly_target):
             (name, oil_card_number, weekly_target)
         )
         conn.commit()
+    _bump_generation()
 
 def update_driver(driver_id, name, oil_card_number, weekly_target):
     with get_db_connection() as conn:
@@ -78,13 +506,16 @@ def update_driver(driver_id, name, oil_card_number, weekly_target):
             WHERE id = ?
         ''', (name, oil_card_number, weekly_target, driver_id))
         conn.commit()
+    _bump_generation()
 
+@cached_read
 def get_driver(driver_id):
     with get_db_connection() as conn:
         cursor = conn.cursor()
         cursor.execute('SELECT * FROM drivers WHERE id = ?', (driver_id,))
         return cursor.fetchone()
 
+@cached_read
 def get_all_drivers():
     with get_db_connection() as conn:
         cursor = conn.cursor()
@@ -96,21 +527,76 @@ def delete_driver(driver_id):
         cursor = conn.cursor()
         cursor.execute('DELETE FROM drivers WHERE id = ?', (driver_id,))
         conn.commit()
+    _bump_generation()
 
 def add_sales_record(driver_id, date, uber_sales, bolt_sales, zettel_sales, zettel_fee,
-                     other_sales, other_sales_type, oil_expense, week_number):
+                     other_sales, other_sales_type, oil_expense, week_number, year=None):
+    if year is None:
+        year_week = get_year_week(date, week_number)
+    else:
+        year_week = make_year_week(year, week_number)
+
     with get_db_connection() as conn:
         cursor = conn.cursor()
         cursor.execute('''
             INSERT INTO sales (
                 driver_id, date, uber_sales, bolt_sales, zettel_sales, zettel_fee,
-                other_sales, other_sales_type, oil_expense, week_number
+                other_sales, other_sales_type, oil_expense, week_number, year_week
             )
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         ''', (driver_id, date, uber_sales, bolt_sales, zettel_sales, zettel_fee,
-              other_sales, other_sales_type, oil_expense, week_number))
+              other_sales, other_sales_type, oil_expense, week_number, year_week))
         conn.commit()
+    _bump_generation()
+
+def add_sales_records(batches):
+    """
+    Insert many sales records in a single transaction.
+
+    Batches are consumed one at a time, so a caller can stream records from
+    a file of any size. They are first staged in a temporary table, which
+    takes no lock on the database, so parsing a large file never holds up
+    other writers; the write lock is only held for the final copy into
+    sales. Nothing is written if any batch fails, and records of drivers
+    deleted in the meantime are skipped.
+
+    Args:
+        batches: An iterable of lists of (driver_id, date, uber_sales,
+            bolt_sales, zettel_sales, zettel_fee, other_sales,
+            other_sales_type, oil_expense, week_number, year_week) tuples
 
+    Returns:
+        The number of records inserted
+    """
+    columns = ('driver_id, date, uber_sales, bolt_sales, zettel_sales, zettel_fee, '
+               'other_sales, other_sales_type, oil_expense, week_number, year_week')
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f'CREATE TEMP TABLE IF NOT EXISTS staged_sales ({columns})')
+        try:
+            for batch in batches:
+                cursor.executemany(
+                    f'INSERT INTO temp.staged_sales ({columns}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                    batch
+                )
+            conn.commit()
+
+            cursor.execute('BEGIN IMMEDIATE')
+            cursor.execute(f'''
+                INSERT INTO sales ({columns})
+                SELECT {columns} FROM temp.staged_sales
+                WHERE driver_id IN (SELECT id FROM drivers)
+            ''')
+            inserted = max(cursor.rowcount, 0)
+            conn.commit()
+        finally:
+            conn.rollback()
+            cursor.execute('DROP TABLE IF EXISTS temp.staged_sales')
+            conn.commit()
+    _bump_generation()
+    return inserted
+
+@cached_read
 def get_driver_sales(driver_id, date):
     with get_db_connection() as conn:
         cursor = conn.cursor()
@@ -120,63 +606,406 @@ def get_driver_sales(driver_id, date):
         ''', (driver_id, date))
         return cursor.fetchone()
 
-def get_weekly_sales(driver_id, week_number):
+@cached_read
+def get_weekly_sales(driver_id, week_number, year=None):
     with get_db_connection() as conn:
         cursor = conn.cursor()
         cursor.execute('''
-            SELECT 
-                SUM(uber_sales) as total_uber,
-                SUM(bolt_sales) as total_bolt,
-                SUM(zettel_sales - zettel_fee) as total_zettel,
-                SUM(other_sales) as total_other,
-                SUM(oil_expense) as total_oil,
-                SUM(zettel_fee) as total_zettel_fee
-            FROM sales 
-            WHERE driver_id = ? AND week_number = ?
-        ''', (driver_id, week_number))
-        return cursor.fetchone()
+            SELECT total_uber, total_bolt, total_zettel, total_other, total_oil, total_zettel_fee
+            FROM weekly_totals
+            WHERE driver_id = ? AND year_week = ?
+        ''', (driver_id, _resolve_year_week(week_number, year)))
+        return cursor.fetchone() or (None,) * 6
+
+@cached_read
+def get_weekly_sales_for_all_drivers(week_number, year=None, driver_ids=None):
+    """
+    Get the weekly sales totals of every driver with sales in a week.
+
+    Args:
+        week_number: The week number to summarise
+        year: The ISO year of the week (defaults to the current year)
+        driver_ids: A tuple of driver IDs to include (defaults to all drivers)
+
+    Returns:
+        A list of (driver_id, name, oil_card_number, weekly_target, total_uber,
+        total_bolt, total_zettel, total_other, total_oil, total_zettel_fee)
+        tuples ordered by driver ID
+    """
+    conditions = ['w.year_week = ?']
+    params = [_resolve_year_week(week_number, year)]
+    if driver_ids is not None:
+        if not driver_ids:
+            return []
+        conditions.append(f"d.id IN ({', '.join('?' * len(driver_ids))})")
+        params.extend(driver_ids)
+
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT
+                d.id,
+                d.name,
+                d.oil_card_number,
+                d.weekly_target,
+                w.total_uber,
+                w.total_bolt,
+                w.total_zettel,
+                w.total_other,
+                w.total_oil,
+                w.total_zettel_fee
+            FROM drivers d
+            JOIN weekly_totals w ON w.driver_id = d.id
+            WHERE {' AND '.join(conditions)}
+            ORDER BY d.id
+        ''', params)
+        return cursor.fetchall()
+
+@cached_read
+def get_fleet_target_status(week_number, year=None, min_shortfall=None):
+    """
+    Get every driver's progress towards the weekly target in one query.
+
+    Drivers without sales in the week are included with no sales.
+
+    Args:
+        week_number: The week number to check
+        year: The ISO year of the week (defaults to the current year)
+        min_shortfall: Only include drivers missing more than this amount
 
-def get_historical_sales(driver_id):
+    Returns:
+        A list of (driver_id, name, oil_card_number, weekly_target, net_sales,
+        shortfall) tuples, largest shortfall first, where shortfall is the
+        amount still missing to the target (0 once it is hit)
+    """
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT id, name, oil_card_number, weekly_target, net_sales,
+                   MAX(weekly_target - net_sales, 0.0) AS shortfall
+            FROM (
+                SELECT
+                    d.id,
+                    d.name,
+                    d.oil_card_number,
+                    COALESCE(d.weekly_target, 0.0) AS weekly_target,
+                    COALESCE(w.total_uber + w.total_bolt + w.total_zettel + w.total_other, 0.0) AS net_sales
+                FROM drivers d
+                LEFT JOIN weekly_totals w ON w.driver_id = d.id AND w.year_week = ?
+            )
+            WHERE shortfall > ?
+            ORDER BY shortfall DESC, net_sales DESC, id
+        ''', (_resolve_year_week(week_number, year),
+              min_shortfall if min_shortfall is not None else -1))
+        return cursor.fetchall()
+
+@cached_read
+def get_comparison_totals(driver_ids=None, from_year_week=None, to_year_week=None):
+    """
+    Get the sales totals of many drivers over a range of weeks in one query.
+
+    Args:
+        driver_ids: A tuple of driver IDs to include (defaults to all drivers)
+        from_year_week: First year-week key to include (defaults to the first week)
+        to_year_week: Last year-week key to include (defaults to the last week)
+
+    Returns:
+        A list of (driver_id, name, oil_card_number, weekly_target, weeks,
+        total_uber, total_bolt, total_zettel, total_other, total_oil,
+        total_zettel_fee) tuples ordered by driver ID, where weeks is the
+        number of weeks with sales. Drivers without sales in the range are
+        left out.
+    """
+    conditions = []
+    params = []
+    if driver_ids is not None:
+        if not driver_ids:
+            return []
+        conditions.append(f"w.driver_id IN ({', '.join('?' * len(driver_ids))})")
+        params.extend(driver_ids)
+    if from_year_week is not None:
+        conditions.append('w.year_week >= ?')
+        params.append(from_year_week)
+    if to_year_week is not None:
+        conditions.append('w.year_week <= ?')
+        params.append(to_year_week)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT
+                d.id,
+                d.name,
+                d.oil_card_number,
+                d.weekly_target,
+                COUNT(*),
+                SUM(w.total_uber),
+                SUM(w.total_bolt),
+                SUM(w.total_zettel),
+                SUM(w.total_other),
+                SUM(w.total_oil),
+                SUM(w.total_zettel_fee)
+            FROM weekly_totals w
+            JOIN drivers d ON d.id = w.driver_id
+            {where}
+            GROUP BY d.id
+            ORDER BY d.id
+        ''', params)
+        return cursor.fetchall()
+
+@cached_read
+def get_fleet_weekly_totals(from_year_week=None, to_year_week=None):
+    """
+    Get the weekly sales totals of every driver over a range of weeks.
+
+    Args:
+        from_year_week: First year-week key to include (defaults to the first week)
+        to_year_week: Last year-week key to include (defaults to the last week)
+
+    Returns:
+        A list of (driver_id, name, weekly_target, year_week, total_uber,
+        total_bolt, total_zettel, total_other, total_oil, total_zettel_fee)
+        tuples ordered by driver ID and week
+    """
+    conditions = []
+    params = []
+    if from_year_week is not None:
+        conditions.append('w.year_week >= ?')
+        params.append(from_year_week)
+    if to_year_week is not None:
+        conditions.append('w.year_week <= ?')
+        params.append(to_year_week)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT
+                d.id,
+                d.name,
+                d.weekly_target,
+                w.year_week,
+                w.total_uber,
+                w.total_bolt,
+                w.total_zettel,
+                w.total_other,
+                w.total_oil,
+                w.total_zettel_fee
+            FROM weekly_totals w
+            JOIN drivers d ON d.id = w.driver_id
+            {where}
+            ORDER BY w.driver_id, w.year_week
+        ''', params)
+        return cursor.fetchall()
+
+# Metrics drivers can be ranked on: label, SQL expression over the period
+# totals of a driver (t) and the driver row (d), and whether lower is better.
+# :num_weeks is the number of weeks the period target covers.
+_NET_SALES_SQL = '(t.uber + t.bolt + t.zettel + t.other)'
+LEADERBOARD_METRICS = {
+    'net_sales': ('Net Sales', _NET_SALES_SQL, False),
+    'achievement_rate': (
+        'Achievement Rate', f'{_NET_SALES_SQL} * 100.0 / NULLIF(d.weekly_target * :num_weeks, 0)', False
+    ),
+    'oil_ratio': ('Oil Cost Ratio', f't.oil * 100.0 / NULLIF({_NET_SALES_SQL}, 0)', True),
+    'uber': ('Uber Sales', 't.uber', False),
+    'bolt': ('Bolt Sales', 't.bolt', False),
+    'zettel': ('Zettel Sales (Net)', 't.zettel', False),
+    'other': ('Other Sales', 't.other', False),
+}
+
+def _leaderboard_filter(driver_ids, params):
+    if driver_ids is None:
+        return ''
+    params.update({f'driver_{i}': driver_id for i, driver_id in enumerate(driver_ids)})
+    return f"AND driver_id IN ({', '.join(f':driver_{i}' for i in range(len(driver_ids)))})"
+
+@cached_read
+def get_leaderboard(metric, from_year_week, to_year_week, num_weeks=1, driver_ids=None,
+                    limit=None, offset=0):
+    """
+    Rank drivers on a metric over a range of weeks, best first.
+
+    The ranking is done in SQL with RANK() over the weekly totals, so only
+    the requested page of drivers is returned. Drivers tied on the metric
+    share a rank; drivers whose metric is undefined (e.g. the oil cost ratio
+    without sales) are ranked last.
+
+    Args:
+        metric: A key of LEADERBOARD_METRICS
+        from_year_week: First year-week key to include
+        to_year_week: Last year-week key to include
+        num_weeks: Number of weeks the period target covers
+        driver_ids: A tuple of driver IDs to rank (defaults to all drivers)
+        limit: Maximum number of drivers to return (defaults to all)
+        offset: Number of better-ranked drivers to skip, for paging with limit
+
+    Returns:
+        A list of (rank, driver_id, name, oil_card_number, weekly_target,
+        weeks, net_sales, value) tuples, where weeks is the number of weeks
+        with sales and value is the metric. Drivers without sales in the
+        range are left out.
+    """
+    _, expression, ascending = LEADERBOARD_METRICS[metric]
+    if driver_ids is not None and not driver_ids:
+        return []
+    params = {
+        'from_year_week': from_year_week,
+        'to_year_week': to_year_week,
+        'num_weeks': num_weeks,
+        'limit': limit if limit is not None else -1,
+        'offset': offset,
+    }
+    driver_filter = _leaderboard_filter(driver_ids, params)
+
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            WITH t AS (
+                SELECT
+                    driver_id,
+                    COUNT(*) AS weeks,
+                    SUM(total_uber) AS uber,
+                    SUM(total_bolt) AS bolt,
+                    SUM(total_zettel) AS zettel,
+                    SUM(total_other) AS other,
+                    SUM(total_oil) AS oil
+                FROM weekly_totals
+                WHERE year_week BETWEEN :from_year_week AND :to_year_week {driver_filter}
+                GROUP BY driver_id
+            ),
+            scored AS (
+                SELECT d.id, d.name, d.oil_card_number, d.weekly_target, t.weeks,
+                       {_NET_SALES_SQL} AS net_sales, {expression} AS value
+                FROM t
+                JOIN drivers d ON d.id = t.driver_id
+            )
+            SELECT
+                RANK() OVER (ORDER BY value {'ASC' if ascending else 'DESC'} NULLS LAST) AS rank,
+                id, name, oil_card_number, weekly_target, weeks, net_sales, value
+            FROM scored
+            ORDER BY rank, id
+            LIMIT :limit OFFSET :offset
+        ''', params)
+        return cursor.fetchall()
+
+@cached_read
+def count_leaderboard_drivers(from_year_week, to_year_week, driver_ids=None):
+    """
+    Count the drivers get_leaderboard ranks for the same range.
+
+    Args:
+        from_year_week: First year-week key to include
+        to_year_week: Last year-week key to include
+        driver_ids: A tuple of driver IDs to count (defaults to all drivers)
+
+    Returns:
+        The number of drivers with sales in the range
+    """
+    if driver_ids is not None and not driver_ids:
+        return 0
+    params = {'from_year_week': from_year_week, 'to_year_week': to_year_week}
+    driver_filter = _leaderboard_filter(driver_ids, params)
+
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT COUNT(DISTINCT driver_id)
+            FROM weekly_totals
+            WHERE year_week BETWEEN :from_year_week AND :to_year_week {driver_filter}
+        ''', params)
+        return cursor.fetchone()[0]
+
+@cached_read
+def get_historical_sales(driver_id, from_year_week=None, to_year_week=None, limit=None, offset=0):
+    """
+    Get a driver's weekly sales totals, newest week first.
+
+    Args:
+        driver_id: The driver ID
+        from_year_week: First year-week key to include (defaults to the earliest)
+        to_year_week: Last year-week key to include (defaults to the latest)
+        limit: Maximum number of weeks to return (defaults to all)
+        offset: Number of newer weeks to skip, for paging with limit
+
+    Returns:
+        A list of (year, week_number, total_uber, total_bolt, total_zettel,
+        total_other, total_oil, total_zettel_fee) tuples
+    """
     with get_db_connection() as conn:
         cursor = conn.cursor()
         cursor.execute('''
             SELECT 
-                week_number,
-                SUM(uber_sales) as total_uber,
-                SUM(bolt_sales) as total_bolt,
-                SUM(zettel_sales - zettel_fee) as total_zettel,
-                SUM(other_sales) as total_other,
-                SUM(oil_expense) as total_oil,
-                SUM(zettel_fee) as total_zettel_fee
-            FROM sales 
-            WHERE driver_id = ?
-            GROUP BY week_number
-            ORDER BY week_number DESC
-        ''', (driver_id,))
+                year_week / 100 as year,
+                year_week % 100 as week_number,
+                total_uber,
+                total_bolt,
+                total_zettel,
+                total_other,
+                total_oil,
+                total_zettel_fee
+            FROM weekly_totals 
+            WHERE driver_id = ? AND year_week BETWEEN ? AND ?
+            ORDER BY year_week DESC
+            LIMIT ? OFFSET ?
+        ''', (driver_id,
+              from_year_week if from_year_week is not None else 0,
+              to_year_week if to_year_week is not None else 999999,
+              limit if limit is not None else -1,
+              offset))
         return cursor.fetchall()
 
-def reset_weekly_sales(driver_id, week_number):
+@cached_read
+def count_historical_weeks(driver_id, from_year_week=None, to_year_week=None):
+    """
+    Count the weeks get_historical_sales returns for the same range.
+
+    Args:
+        driver_id: The driver ID
+        from_year_week: First year-week key to include (defaults to the earliest)
+        to_year_week: Last year-week key to include (defaults to the latest)
+
+    Returns:
+        The number of weeks with sales
+    """
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT COUNT(*)
+            FROM weekly_totals
+            WHERE driver_id = ? AND year_week BETWEEN ? AND ?
+        ''', (driver_id,
+              from_year_week if from_year_week is not None else 0,
+              to_year_week if to_year_week is not None else 999999))
+        return cursor.fetchone()[0]
+
+def reset_weekly_sales(driver_id, week_number, year=None):
     with get_db_connection() as conn:
         cursor = conn.cursor()
         cursor.execute('''
             DELETE FROM sales 
-            WHERE driver_id = ? AND week_number = ?
-        ''', (driver_id, week_number))
+            WHERE driver_id = ? AND year_week = ?
+        ''', (driver_id, _resolve_year_week(week_number, year)))
         conn.commit()
+    _bump_generation()
 
 def reset_all_sales(driver_id):
     with get_db_connection() as conn:
         cursor = conn.cursor()
         cursor.execute('DELETE FROM sales WHERE driver_id = ?', (driver_id,))
         conn.commit()
+    _bump_generation()
 
-def get_weekly_sales_records(driver_id, week_number):
+@cached_read
+def get_weekly_sales_records(driver_id, week_number, year=None):
     """
     Get all individual sales records for a specific driver and week.
     
     Args:
         driver_id: The driver ID
         week_number: The week number to retrieve records for
+        year: The ISO year of the week (defaults to the current year)
         
     Returns:
         A list of sales records with all details
@@ -187,11 +1016,76 @@ def get_weekly_sales_records(driver_id, week_number):
             SELECT id, date, uber_sales, bolt_sales, zettel_sales, zettel_fee,
                    other_sales, other_sales_type, oil_expense
             FROM sales 
-            WHERE driver_id = ? AND week_number = ?
+            WHERE driver_id = ? AND year_week = ?
             ORDER BY date ASC
-        ''', (driver_id, week_number))
+        ''', (driver_id, _resolve_year_week(week_number, year)))
         return cursor.fetchall()
 
+# Columns produced by iter_sales_batches, in order
+SALES_EXPORT_COLUMNS = [
+    'id', 'driver_id', 'driver_name', 'date', 'year', 'week_number',
+    'uber_sales', 'bolt_sales', 'zettel_sales', 'zettel_fee',
+    'other_sales', 'other_sales_type', 'oil_expense',
+]
+
+def iter_sales_batches(start_date=None, end_date=None, driver_ids=None,
+                       from_year_week=None, to_year_week=None, batch_size=10000):
+    """
+    Stream sales records in batches, in the order they were recorded.
+
+    Rows are read with fetchmany, so only one batch is held in memory no
+    matter how many rows match. All filters are optional and combined.
+
+    Args:
+        start_date: First record date to include as 'YYYY-MM-DD'
+        end_date: Last record date to include as 'YYYY-MM-DD'
+        driver_ids: Driver IDs to include
+        from_year_week: First year-week key to include
+        to_year_week: Last year-week key to include
+        batch_size: Number of rows per batch
+
+    Returns:
+        An iterator of lists of tuples in SALES_EXPORT_COLUMNS order
+    """
+    conditions = []
+    params = []
+    if start_date is not None:
+        conditions.append('s.date >= ?')
+        params.append(start_date)
+    if end_date is not None:
+        conditions.append('s.date <= ?')
+        params.append(end_date)
+    if driver_ids is not None:
+        driver_ids = list(driver_ids)
+        if not driver_ids:
+            return
+        conditions.append(f"s.driver_id IN ({', '.join('?' * len(driver_ids))})")
+        params.extend(driver_ids)
+    if from_year_week is not None:
+        conditions.append('s.year_week >= ?')
+        params.append(from_year_week)
+    if to_year_week is not None:
+        conditions.append('s.year_week <= ?')
+        params.append(to_year_week)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT s.id, s.driver_id, d.name, s.date, s.year_week / 100, s.week_number,
+                   s.uber_sales, s.bolt_sales, s.zettel_sales, s.zettel_fee,
+                   s.other_sales, s.other_sales_type, s.oil_expense
+            FROM sales s
+            LEFT JOIN drivers d ON d.id = s.driver_id
+            {where}
+            ORDER BY s.id
+        ''', params)
+        while True:
+            batch = cursor.fetchmany(batch_size)
+            if not batch:
+                break
+            yield batch
+
 def update_sales_record(record_id, uber_sales, bolt_sales, zettel_sales, zettel_fee,
                       other_sales, other_sales_type, oil_expense):
     """
@@ -216,4 +1110,118 @@ def update_sales_record(record_id, uber_sales, bolt_sales, zettel_sales, zettel_
             WHERE id = ?
         ''', (uber_sales, bolt_sales, zettel_sales, zettel_fee,
               other_sales, other_sales_type, oil_expense, record_id))
-        conn.commit()
\ No newline at end of file
+        conn.commit()
+    _bump_generation()
+
+def apply_week_edits(driver_id, week_number, year=None, inserts=(), updates=(), deletes=()):
+    """
+    Apply all changes made to a driver's week in a single transaction.
+
+    Updates and deletes only touch records of the driver booked to the week,
+    and nothing is written if any statement fails.
+
+    Args:
+        driver_id: The driver ID
+        week_number: The week the records are booked to
+        year: The ISO year of the week (defaults to the current year)
+        inserts: (date, uber_sales, bolt_sales, zettel_sales, zettel_fee,
+            other_sales, other_sales_type, oil_expense) tuples of new records
+        updates: (record_id, date, uber_sales, bolt_sales, zettel_sales,
+            zettel_fee, other_sales, other_sales_type, oil_expense) tuples
+        deletes: IDs of the records to delete
+
+    Returns:
+        A (inserted, updated, deleted) tuple with the number of records changed
+
+    Raises:
+        ValueError: If a new record, or an update that changes a record's
+            date, is dated outside the week
+    """
+    year_week = _resolve_year_week(week_number, year)
+
+    def check_date(record_date):
+        if get_year_week(record_date) != year_week:
+            raise ValueError(f"{record_date} is not in week {week_number} of {split_year_week(year_week)[0]}")
+
+    for values in inserts:
+        check_date(values[0])
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('BEGIN IMMEDIATE')
+        # The UPDATE keeps the record's week, so a changed date must stay
+        # inside it. Records entered later for the week keep their own date.
+        if updates:
+            cursor.execute('SELECT id, date FROM sales WHERE driver_id = ? AND year_week = ?',
+                           (driver_id, year_week))
+            stored_dates = dict(cursor.fetchall())
+            for record_id, record_date, *_ in updates:
+                if stored_dates.get(record_id, record_date) != record_date:
+                    check_date(record_date)
+        cursor.executemany(
+            'DELETE FROM sales WHERE id = ? AND driver_id = ? AND year_week = ?',
+            [(record_id, driver_id, year_week) for record_id in deletes]
+        )
+        deleted = max(cursor.rowcount, 0)
+        cursor.executemany('''
+            UPDATE sales
+            SET date = ?, uber_sales = ?, bolt_sales = ?, zettel_sales = ?, zettel_fee = ?,
+                other_sales = ?, other_sales_type = ?, oil_expense = ?
+            WHERE id = ? AND driver_id = ? AND year_week = ?
+        ''', [(*values, record_id, driver_id, year_week) for record_id, *values in updates])
+        updated = max(cursor.rowcount, 0)
+        cursor.executemany('''
+            INSERT INTO sales (
+                driver_id, date, uber_sales, bolt_sales, zettel_sales, zettel_fee,
+                other_sales, other_sales_type, oil_expense, week_number, year_week
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', [(driver_id, *values, week_number, year_week) for values in inserts])
+        inserted = max(cursor.rowcount, 0)
+        conn.commit()
+    _bump_generation()
+    return inserted, updated, deleted
+
+def check_weekly_totals(repair=False, tolerance=0.005):
+    """
+    Compare weekly_totals against totals rebuilt from the raw sales rows.
+
+    Args:
+        repair: Rebuild weekly_totals from the sales rows when drift is found
+        tolerance: Largest absolute difference accepted for an amount
+
+    Returns:
+        A list of (driver_id, year_week, column, expected, actual) tuples, one
+        per drifted value. Missing or surplus weeks are reported with a column
+        of 'record_count' and None for the absent side.
+    """
+    columns = [name for name, _ in WEEKLY_TOTALS_COLUMNS] + ['record_count']
+
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        # Read both sides in one transaction so concurrent writes cannot
+        # show up as drift
+        cursor.execute('BEGIN IMMEDIATE' if repair else 'BEGIN')
+        cursor.execute(_WEEKLY_TOTALS_AGGREGATE_SQL)
+        expected = {row[:2]: row[2:] for row in cursor.fetchall()}
+        cursor.execute(f'''
+            SELECT driver_id, year_week, {_WEEKLY_TOTALS_NAMES}, record_count
+            FROM weekly_totals
+        ''')
+        actual = {row[:2]: row[2:] for row in cursor.fetchall()}
+
+        drift = []
+        for key in sorted(expected.keys() | actual.keys()):
+            if key not in actual:
+                drift.append((*key, 'record_count', expected[key][-1], None))
+            elif key not in expected:
+                drift.append((*key, 'record_count', None, actual[key][-1]))
+            else:
+                for column, want, got in zip(columns, expected[key], actual[key]):
+                    if abs(want - got) > tolerance:
+                        drift.append((*key, column, want, got))
+
+        if drift and repair:
+            _rebuild_weekly_totals(cursor)
+            conn.commit()
+            _bump_generation()
+        return drift
@@ -0,0 +1,138 @@
+"""
+Synthetic fleet data for benchmarks and load testing.
+
+Fills the drivers and sales tables with a fleet whose numbers look like the
+real ones: each driver has a daily revenue level, a personal Uber/Bolt/Zettel
+mix, regular days off and refuels, Friday and Saturday peaks and seasonal
+swings. The same seed always produces the same fleet.
+"""
+import random
+from datetime import date, timedelta
+
+import database as db
+
+FIRST_NAMES = [
+    "Ahmed", "Ali", "Anders", "Erik", "Fatima", "Hassan", "Ibrahim", "Johan",
+    "Karin", "Lars", "Maria", "Mohammed", "Nils", "Omar", "Sara", "Yusuf",
+]
+LAST_NAMES = [
+    "Abdi", "Andersson", "Berg", "Eriksson", "Hussein", "Johansson", "Karlsson",
+    "Khan", "Larsson", "Lindqvist", "Nilsson", "Osman", "Persson", "Svensson",
+]
+
+WEEKLY_TARGETS = [20000.0, 23000.0, 25000.0]
+
+# Revenue by weekday (Monday first) and by month, relative to an average day
+WEEKDAY_FACTORS = [0.85, 0.85, 0.9, 0.95, 1.2, 1.3, 0.95]
+MONTH_FACTORS = [0.9, 0.9, 0.95, 1.0, 1.0, 1.05, 0.9, 0.9, 1.0, 1.05, 1.05, 1.2]
+
+# Other sales are mostly cash
+OTHER_SALES_TYPES = ["Cash", "Swish", "Other"]
+OTHER_SALES_WEIGHTS = [0.9, 0.08, 0.02]
+
+# Zettel card payments carry a processing fee of about this share
+ZETTEL_FEE_RATE = 0.0185
+
+def _driver_profile(rng):
+    # Shares of Uber, Bolt, Zettel and other sales drawn around a fleet-wide
+    # mix of roughly 55/33/9/3 per cent
+    weights = [rng.gammavariate(alpha, 1) for alpha in (11, 6.6, 1.8, 0.6)]
+    total = sum(weights)
+    return {
+        'daily_sales': rng.lognormvariate(8.2, 0.25),  # about 3,600 SEK on a median day
+        'mix': [weight / total for weight in weights],
+        'days_off': rng.choice([(6,), (0,), (6, 0), (2,)]),
+        'sick_rate': rng.uniform(0.01, 0.05),
+        'refuel_every': rng.choice([2, 3, 3, 4]),
+    }
+
+def _daily_records(rng, driver_id, profile, start, end):
+    day = start
+    days_since_refuel = 0
+    while day <= end:
+        weekday = day.weekday()
+        if weekday in profile['days_off'] or rng.random() < profile['sick_rate']:
+            day += timedelta(days=1)
+            continue
+
+        revenue = (profile['daily_sales'] * WEEKDAY_FACTORS[weekday]
+                   * MONTH_FACTORS[day.month - 1] * rng.uniform(0.7, 1.3))
+        uber, bolt, zettel, other = (round(revenue * share * rng.uniform(0.6, 1.4), 2)
+                                     for share in profile['mix'])
+        if rng.random() < 0.7:
+            other = 0.0
+        zettel_fee = round(zettel * ZETTEL_FEE_RATE, 2)
+
+        days_since_refuel += 1
+        oil_expense = 0.0
+        if days_since_refuel >= profile['refuel_every']:
+            oil_expense = round(rng.uniform(450, 900), 2)
+            days_since_refuel = 0
+
+        iso_year, iso_week, _ = day.isocalendar()
+        yield (
+            driver_id, day.isoformat(), uber, bolt, zettel + zettel_fee, zettel_fee, other,
+            rng.choices(OTHER_SALES_TYPES, OTHER_SALES_WEIGHTS)[0], oil_expense,
+            iso_week, db.make_year_week(iso_year, iso_week),
+        )
+        day += timedelta(days=1)
+
+def generate_fleet(num_drivers, years=1, end_date=None, seed=42, batch_size=10000):
+    """
+    Add a synthetic fleet with daily sales records to the configured database.
+
+    A fifth of the drivers join part way through the period.
+
+    Args:
+        num_drivers: Number of drivers to add
+        years: Length of the sales history in years
+        end_date: Last day with sales (defaults to yesterday)
+        seed: Random seed
+        batch_size: Sales records written per batch
+
+    Returns:
+        A (drivers, sales_records) tuple with the number of rows added
+    """
+    rng = random.Random(seed)
+    if end_date is None:
+        end_date = date.today() - timedelta(days=1)
+    start_date = end_date - timedelta(days=round(365.25 * years) - 1)
+
+    drivers = []
+    for _ in range(num_drivers):
+        name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+        oil_card = f"7044740244{rng.randrange(10 ** 8):08d}"
+        drivers.append((name, oil_card, rng.choice(WEEKLY_TARGETS)))
+
+    with db.get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('BEGIN IMMEDIATE')
+        driver_ids = []
+        for driver in drivers:
+            cursor.execute(
+                'INSERT INTO drivers (name, oil_card_number, weekly_target) VALUES (?, ?, ?)', driver
+            )
+            driver_ids.append(cursor.lastrowid)
+        conn.commit()
+    db.clear_cache()
+
+    def records():
+        for driver_id in driver_ids:
+            profile = _driver_profile(rng)
+            start = start_date
+            if rng.random() < 0.2:
+                start += timedelta(days=rng.randrange((end_date - start_date).days + 1))
+            yield from _daily_records(rng, driver_id, profile, start, end_date)
+
+    def batches():
+        batch = []
+        for record in records():
+            batch.append(record)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    sales_records = db.add_sales_records(batches())
+    return num_drivers, sales_records
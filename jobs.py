@@ -0,0 +1,352 @@
+"""
+Background jobs for long-running exports, imports and bulk changes.
+
+Jobs run on a small thread pool in the current process, so the Streamlit
+script can return immediately and poll for progress. Their status is kept in
+a jobs table, which survives reruns and lets any session look a job up by its
+ID; the progress of running jobs is tracked in memory. The table lives in a
+SQLite file of its own, since every write to the sales database invalidates
+the read cache of database.cached_read. Results are
+written to a file per job in RESULT_DIR and the table only holds its path.
+
+A job function is called as func(job, *args, **kwargs). It reports progress
+with job.progress(), which also raises JobCancelled once cancel() has been
+requested. It either writes a file to download to job.result_path and returns
+that path, returns bytes or a BytesIO, or returns a JSON-serialisable value.
+"""
+import io
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import database as db
+
+# Number of jobs that run at the same time; the rest wait in the queue
+JOB_WORKERS = 2
+
+# Finished jobs, and their results, are deleted after this many seconds
+JOB_RETENTION = 24 * 60 * 60
+
+# Location of the jobs database. Override with the JOB_DB_PATH environment
+# variable; by default it is <database>_jobs.db next to the sales database.
+DB_PATH = os.environ.get('JOB_DB_PATH')
+
+# Directory job results are written to. Override with the JOB_RESULT_DIR
+# environment variable.
+RESULT_DIR = os.environ.get(
+    'JOB_RESULT_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '.job_results')
+)
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+ACTIVE_STATUSES = (QUEUED, RUNNING)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+# Futures, cancellation events and latest progress of the jobs submitted by
+# this process. Progress is kept in memory rather than written to the jobs
+# table, since a job may report it from inside its own write transaction.
+_futures = {}
+_cancel_events = {}
+_progress = {}
+_jobs_lock = threading.Lock()
+
+class JobCancelled(Exception):
+    pass
+
+class Job:
+    """Handle passed to a running job function."""
+
+    def __init__(self, job_id):
+        self.id = job_id
+        self.result_path = _result_path(job_id)
+        self._cancel_event = _cancel_events[job_id]
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    def check_cancelled(self):
+        """Raise JobCancelled if the job has been cancelled."""
+        if self._cancel_event.is_set():
+            raise JobCancelled()
+
+    def progress(self, done, total=None, message=None):
+        """
+        Record how far the job has got.
+
+        Args:
+            done: Units of work finished
+            total: Total units of work, if known
+            message: Optional text shown next to the progress bar
+
+        Raises:
+            JobCancelled: If the job has been cancelled
+        """
+        self.check_cancelled()
+        fraction = min(done / total, 1.0) if total else 0.0
+        _progress[self.id] = (fraction, message)
+
+_initialised_paths = set()
+
+def _create_jobs_table(cursor):
+    # Finished rows are deleted by cleanup()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            status TEXT NOT NULL,
+            progress REAL NOT NULL DEFAULT 0,
+            message TEXT,
+            error TEXT,
+            file_name TEXT,
+            result_path TEXT,
+            result_format TEXT,
+            pid INTEGER,
+            created_at REAL NOT NULL,
+            started_at REAL,
+            finished_at REAL
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, finished_at)')
+
+@contextmanager
+def _get_connection():
+    # Jobs are written a few times each and polled about once a second, so a
+    # connection per call is cheap enough and needs no pool
+    path = DB_PATH or os.path.splitext(db.DB_PATH)[0] + '_jobs.db'
+    conn = sqlite3.connect(path, timeout=30)
+    try:
+        if path not in _initialised_paths:
+            conn.execute('PRAGMA journal_mode=WAL')
+            _create_jobs_table(conn.cursor())
+            conn.commit()
+            _initialised_paths.add(path)
+        yield conn
+    finally:
+        conn.close()
+
+def _result_path(job_id):
+    return os.path.join(RESULT_DIR, job_id)
+
+def _remove_result(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+def _update(job_id, **fields):
+    assignments = ', '.join(f'{name} = ?' for name in fields)
+    with _get_connection() as conn:
+        conn.execute(f'UPDATE jobs SET {assignments} WHERE id = ?', (*fields.values(), job_id))
+        conn.commit()
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _recover_interrupted_jobs()
+            _executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix='job')
+        return _executor
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def _recover_interrupted_jobs():
+    # Jobs whose process has exited will never finish
+    with _get_connection() as conn:
+        rows = conn.execute(
+            f"SELECT id, pid FROM jobs WHERE status IN ({', '.join('?' * len(ACTIVE_STATUSES))})",
+            ACTIVE_STATUSES
+        ).fetchall()
+        dead = [(time.time(), job_id) for job_id, pid in rows
+                if pid != os.getpid() and not _pid_alive(pid)]
+        for _, job_id in dead:
+            _remove_result(_result_path(job_id))
+        conn.executemany(
+            f"UPDATE jobs SET status = '{FAILED}', error = 'Interrupted by a restart', "
+            "finished_at = ? WHERE id = ?",
+            dead
+        )
+        conn.commit()
+
+def _run(job_id, func, args, kwargs):
+    job = Job(job_id)
+    try:
+        job.check_cancelled()
+        _update(job_id, status=RUNNING, started_at=time.time())
+        os.makedirs(RESULT_DIR, exist_ok=True)
+        value = func(job, *args, **kwargs)
+        if value == job.result_path:
+            result_format = 'file'
+        elif isinstance(value, (bytes, bytearray, io.BytesIO)):
+            with open(job.result_path, 'wb') as f:
+                f.write(value.getbuffer() if isinstance(value, io.BytesIO) else value)
+            result_format = 'file'
+        else:
+            with open(job.result_path, 'w', encoding='utf-8') as f:
+                json.dump(value, f)
+            result_format = 'json'
+        _update(job_id, status=DONE, progress=1.0, message=_progress.get(job_id, (0, None))[1],
+                result_path=job.result_path, result_format=result_format, finished_at=time.time())
+    except JobCancelled:
+        _remove_result(job.result_path)
+        _update(job_id, status=CANCELLED, finished_at=time.time())
+    except Exception as e:
+        _remove_result(job.result_path)
+        _update(job_id, status=FAILED, error=str(e) or type(e).__name__, finished_at=time.time())
+    finally:
+        with _jobs_lock:
+            _futures.pop(job_id, None)
+            _cancel_events.pop(job_id, None)
+            _progress.pop(job_id, None)
+
+def submit(kind, func, args=(), kwargs=None, file_name=None):
+    """
+    Queue a job on the background worker pool.
+
+    Args:
+        kind: Short description of the job, e.g. 'export'
+        func: Callable run as func(job, *args, **kwargs)
+        args: Positional arguments for func
+        kwargs: Keyword arguments for func
+        file_name: Name under which a file result is offered for download
+
+    Returns:
+        The job ID
+    """
+    cleanup()
+    job_id = uuid.uuid4().hex
+    with _get_connection() as conn:
+        conn.execute('''
+            INSERT INTO jobs (id, kind, status, file_name, pid, created_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (job_id, kind, QUEUED, file_name, os.getpid(), time.time()))
+        conn.commit()
+
+    executor = _get_executor()
+    with _jobs_lock:
+        _cancel_events[job_id] = threading.Event()
+        _futures[job_id] = executor.submit(_run, job_id, func, args, kwargs or {})
+    return job_id
+
+def status(job_id):
+    """
+    Get the state of a job.
+
+    Args:
+        job_id: The job ID
+
+    Returns:
+        A dict with id, kind, status, progress, message, error, file_name,
+        created_at, started_at and finished_at, or None for an unknown job
+    """
+    with _get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT id, kind, status, progress, message, error, file_name,
+                   created_at, started_at, finished_at
+            FROM jobs WHERE id = ?
+        ''', (job_id,))
+        row = cursor.fetchone()
+    if row is None:
+        return None
+    job = dict(zip([column[0] for column in cursor.description], row))
+    if job['status'] == RUNNING and job_id in _progress:
+        job['progress'], job['message'] = _progress[job_id]
+    return job
+
+def result(job_id):
+    """
+    Get the result of a finished job.
+
+    Args:
+        job_id: The job ID
+
+    Returns:
+        The path of the result file, or the decoded JSON value the job
+        returned, or None if the job has not finished successfully or its
+        result has been cleaned up
+    """
+    with _get_connection() as conn:
+        row = conn.execute(
+            'SELECT result_path, result_format FROM jobs WHERE id = ? AND status = ?', (job_id, DONE)
+        ).fetchone()
+    if row is None or not os.path.exists(row[0]):
+        return None
+    path, result_format = row
+    if result_format != 'json':
+        return path
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+def cancel(job_id):
+    """
+    Cancel a queued or running job.
+
+    A queued job never starts. A running job stops at its next progress
+    report; work done inside a database transaction is rolled back.
+
+    Args:
+        job_id: The job ID
+
+    Returns:
+        True if the job was still active in this process
+    """
+    with _jobs_lock:
+        event = _cancel_events.get(job_id)
+        if event is None:
+            return False
+        event.set()
+        future = _futures.get(job_id)
+        never_started = future is not None and future.cancel()
+        if never_started:
+            _futures.pop(job_id, None)
+            _cancel_events.pop(job_id, None)
+    if never_started:
+        _update(job_id, status=CANCELLED, finished_at=time.time())
+    return True
+
+def cleanup(max_age=None):
+    """
+    Delete finished jobs and their results.
+
+    Args:
+        max_age: Age in seconds after which finished jobs are deleted
+            (defaults to JOB_RETENTION)
+
+    Returns:
+        The number of jobs deleted
+    """
+    if max_age is None:
+        max_age = JOB_RETENTION
+    with _get_connection() as conn:
+        rows = conn.execute(
+            f"DELETE FROM jobs WHERE status NOT IN ({', '.join('?' * len(ACTIVE_STATUSES))}) "
+            "AND finished_at < ? RETURNING result_path",
+            (*ACTIVE_STATUSES, time.time() - max_age)
+        ).fetchall()
+        conn.commit()
+    # Files are removed once the rows are gone, so result() never returns a
+    # path that is being deleted
+    for path, in rows:
+        if path:
+            _remove_result(path)
+    return len(rows)
@@ -1,9 +1,157 @@
+import io
+import threading
 import streamlit as st
-import pandas as pd
 from datetime import datetime
 import database as db
 import utils
-import report_generator
+import jobs
+import perf
+import query_profiler
+
+# pandas, the report and chart modules (reportlab, Plotly) and the import and
+# export modules are imported where they are first used, so a cold start only
+# loads what the page needs
+
+# How often the progress of a running background job is refreshed
+JOB_POLL_SECONDS = 1
+
+def prepared_download(slot, data_key, export_label, download_label, file_name, render,
+                      mime="application/pdf", requested=False):
+    """
+    Render a file only when the user asks for it, then offer it for download.
+
+    The rendered bytes are kept in the session under slot for as long as
+    data_key is unchanged, so later reruns neither render the file again nor
+    lose the download button.
+
+    Args:
+        slot: Name of the export, used for widget keys
+        data_key: Hashable identity of the data the file is rendered from
+        export_label: Label of the button that starts rendering
+        download_label: Label of the download button
+        file_name: Name of the downloaded file
+        render: Callable returning the file as bytes or a BytesIO
+        mime: MIME type of the file
+        requested: Render without waiting for the export button
+    """
+    prepared = st.session_state.setdefault('prepared_downloads', {})
+    entry = prepared.get(slot)
+    if entry is None or entry[0] != data_key:
+        if not requested and not st.button(export_label, key=f"prepare_{slot}", type="secondary"):
+            return
+        data = render()
+        entry = (data_key, data.getvalue() if isinstance(data, io.BytesIO) else data)
+        prepared[slot] = entry
+    st.download_button(download_label, data=entry[1], file_name=file_name, mime=mime,
+                       key=f"download_{slot}")
+
+def start_job(slot, kind, func, file_name=None):
+    """Run func(job) in the background and remember the job for show_job()."""
+    st.session_state[f"job_{slot}"] = jobs.submit(kind, func, file_name=file_name)
+
+def show_job(slot, download_label=None, mime=None):
+    """
+    Show the state of the background job started for slot.
+
+    While the job runs, only a small fragment polls its progress; the page is
+    rerun once the job has finished.
+
+    Args:
+        slot: Name passed to start_job()
+        download_label: Label of a download button for a file result
+        mime: MIME type of the download
+
+    Returns:
+        The status dict of the finished job, or None if no job has finished
+    """
+    job_id = st.session_state.get(f"job_{slot}")
+    job = jobs.status(job_id) if job_id else None
+    if job is None:
+        return None
+    if job['status'] in jobs.ACTIVE_STATUSES:
+        poll_job(slot, job_id)
+        return None
+
+    if job['status'] == jobs.FAILED:
+        st.error(f"{job['kind']} failed: {job['error']}")
+    elif job['status'] == jobs.CANCELLED:
+        st.info(f"{job['kind']} was cancelled")
+    elif download_label:
+        result_path = jobs.result(job_id)
+        if result_path is None:
+            st.info(f"The {job['kind'].lower()} result has expired, please run it again")
+        else:
+            with open(result_path, 'rb') as result_file:
+                st.download_button(download_label, data=result_file, file_name=job['file_name'],
+                                   mime=mime, key=f"download_{slot}")
+    return job
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def poll_job(slot, job_id):
+    job = jobs.status(job_id)
+    if job is None or job['status'] not in jobs.ACTIVE_STATUSES:
+        st.rerun()
+    st.progress(job['progress'], text=job['message'] or f"{job['kind']} {job['status']}...")
+    if st.button("Cancel", key=f"cancel_{slot}"):
+        jobs.cancel(job_id)
+
+def show_query_profile(since):
+    """
+    Show the database queries of this script run in the sidebar.
+
+    Args:
+        since: query_profiler.mark() taken at the start of the run
+    """
+    # Each session runs the script in its own thread, so other sessions'
+    # queries and background jobs are left out
+    queries = query_profiler.entries(since, threading.get_ident())
+    with st.sidebar.expander("Query Profile", expanded=True):
+        st.caption(f"{len(queries)} queries, {sum(q['ms'] for q in queries):.1f} ms "
+                   "(cached reads do not reach the database)")
+        groups = query_profiler.summary(queries)
+        for group in groups:
+            if group['full_scan']:
+                st.warning(f"Full scan of {query_profiler.SCAN_TABLE}: {group['sql']}")
+        st.dataframe(
+            [{
+                'SQL': group['sql'],
+                'Calls': group['calls'],
+                'Rows': group['rows'],
+                'Total ms': round(group['total_ms'], 2),
+                'Max ms': round(group['max_ms'], 2),
+                'Flags': ' '.join(flag for flag, raised in
+                                  (("SLOW", group['slow']), ("SCAN", group['full_scan'])) if raised),
+            } for group in groups],
+            hide_index=True
+        )
+        st.download_button("Download Query Log (JSON)", data=query_profiler.to_json(queries),
+                           file_name="query_profile.json", mime="application/json",
+                           key="download_query_profile")
+
+def show_section_timings_panel():
+    """Show the render time of each section of the script in the sidebar."""
+    with st.sidebar.expander("Section Timings", expanded=True):
+        st.caption("Milliseconds over recent runs; calls and elements are from the last run")
+        st.dataframe(
+            [{
+                'Section': entry['section'],
+                'Last ms': round(entry['last_ms'], 1),
+                'p50 ms': round(entry['p50_ms'], 1),
+                'p90 ms': round(entry['p90_ms'], 1),
+                'p99 ms': round(entry['p99_ms'], 1),
+                'DB calls': entry['db_calls'],
+                'Cache hits': entry['cache_hits'],
+                'Elements': entry['elements'],
+            } for entry in perf.stats()],
+            hide_index=True
+        )
+        st.download_button("Download Metrics (Prometheus)", data=perf.prometheus_text(),
+                           file_name="section_metrics.prom", mime="text/plain",
+                           key="download_section_metrics")
+
+# Time the sections of this run; see perf.py
+perf.begin_run()
+perf.section('setup')
 
 # Initialize the database
 db.init_db()
@@ -12,35 +160,48 @@ db.init_db()
 st.set_page_config(page_title="Driver Management System", layout="wide")
 st.title("Driver Management System")
 
+# Debug panels; their output is shown at the end of the run
+with st.sidebar:
+    show_section_timings = st.toggle("Show Section Timings", key="show_section_timings")
+    # Profiling is switched on for the whole process (QUERY_PROFILE=1); the
+    # toggle only decides whether this session's queries are recorded
+    profile_queries = query_profiler.enabled and st.toggle("Profile Database Queries",
+                                                           key="profile_queries")
+    slow_query_ms = None
+    if profile_queries:
+        st.session_state.setdefault('slow_query_ms', query_profiler.SLOW_QUERY_MS)
+        slow_query_ms = st.number_input(
+            "Slow Query Threshold (ms)", min_value=0.0, step=10.0, key="slow_query_ms"
+        )
+query_profiler.record_thread(profile_queries, slow_query_ms)
+profile_mark = query_profiler.mark()
+
 # Week selection
-col1, col2 = st.columns(2)
+col1, col2, col3 = st.columns(3)
 with col1:
-    current_week = utils.get_current_week()
-    current_year = datetime.now().year
-    selected_week = st.number_input("Week Number", min_value=1, max_value=53, value=current_week)
+    current_year, current_week, _ = datetime.now().isocalendar()
+    selected_year = st.number_input("Year", min_value=2000, max_value=2100, value=current_year)
 with col2:
-    st.info(f"Current Week: {current_week}")
+    selected_week = st.number_input("Week Number", min_value=1, max_value=53, value=current_week)
+with col3:
+    st.info(f"Current Week: {current_week} ({current_year})")
 
 # Get week date range
-week_start_date, week_end_date = utils.get_week_dates(current_year, selected_week)
+week_start_date, week_end_date = utils.get_week_dates(selected_year, selected_week)
+
+perf.section('all_drivers_summary')
 
 # Add All Drivers Summary for Selected Week
-st.header(f"Week {selected_week} - All Drivers Summary ({week_start_date} to {week_end_date})")
+st.header(f"Week {selected_week}, {selected_year} - All Drivers Summary ({week_start_date} to {week_end_date})")
 all_drivers = db.get_all_drivers()
 
 if all_drivers:
-    total_uber = 0
-    total_bolt = 0
-    total_zettel = 0
-    total_other = 0
-    total_oil = 0
-    total_zettel_fee = 0
     all_drivers_data = []
 
-    # Calculate totals for all drivers
-    for driver in all_drivers:
-        driver_sales = db.get_weekly_sales(driver[0], selected_week)
-        if driver_sales and any(sales is not None for sales in driver_sales):
+    # Fetch every driver's weekly totals in a single query
+    for driver in db.get_weekly_sales_for_all_drivers(selected_week, selected_year):
+        driver_sales = driver[4:]
+        if any(sales is not None for sales in driver_sales):
             uber, bolt, zettel, other, oil, zettel_fee = driver_sales
             all_drivers_data.append({
                 'name': driver[1],
@@ -53,12 +214,14 @@ if all_drivers:
                 'oil': oil or 0,
                 'zettel_fee': zettel_fee or 0
             })
-            total_uber += uber or 0
-            total_bolt += bolt or 0
-            total_zettel += zettel or 0
-            total_other += other or 0
-            total_oil += oil or 0
-            total_zettel_fee += zettel_fee or 0
+
+    # Calculate totals for all drivers
+    total_uber = sum(d['uber'] for d in all_drivers_data)
+    total_bolt = sum(d['bolt'] for d in all_drivers_data)
+    total_zettel = sum(d['zettel'] for d in all_drivers_data)
+    total_other = sum(d['other'] for d in all_drivers_data)
+    total_oil = sum(d['oil'] for d in all_drivers_data)
+    total_zettel_fee = sum(d['zettel_fee'] for d in all_drivers_data)
 
     # Display overall totals
     col1, col2, col3 = st.columns(3)
@@ -76,6 +239,7 @@ if all_drivers:
     # Create a DataFrame for all drivers
     if all_drivers_data:
         st.subheader("Individual Drivers Breakdown")
+        import pandas as pd
         df = pd.DataFrame(all_drivers_data)
         df['Total'] = df['uber'] + df['bolt'] + df['zettel'] + df['other']
 
@@ -87,7 +251,8 @@ if all_drivers:
         st.dataframe(display_df.set_index('name'))
 
         # Export button for weekly summary
-        if st.button("Export Weekly Summary (All Drivers)"):
+        def render_weekly_summary():
+            import report_generator
             weekly_summary_data = {
                 'date': utils.get_current_date(),
                 'week_number': selected_week,
@@ -105,14 +270,212 @@ if all_drivers:
                 'total_sales': total_net_sales,
                 'drivers': all_drivers_data
             }
-            pdf_buffer = report_generator.generate_summary_report(weekly_summary_data)
-            filename = f"all_drivers_week_{selected_week}_summary.pdf"
-            st.download_button(
-                "Download All Drivers Summary PDF",
-                data=pdf_buffer,
-                file_name=filename,
-                mime="application/pdf"
+            return report_generator.generate_summary_report(weekly_summary_data)
+
+        prepared_download(
+            'all_drivers_summary',
+            (selected_year, selected_week, db.get_generation()),
+            "Export Weekly Summary (All Drivers)",
+            "Download All Drivers Summary PDF",
+            f"all_drivers_{selected_year}_week_{selected_week}_summary.pdf",
+            render_weekly_summary
+        )
+
+        # Every driver's weekly report rendered in worker processes into one ZIP
+        if st.button("Generate Weekly Reports (All Drivers)"):
+            report_week, report_year = selected_week, selected_year
+
+            def run_batch_reports(job):
+                import batch_reports
+                batch_reports.generate_batch_reports(
+                    job.result_path, report_week, report_year,
+                    progress=lambda done, total: job.progress(
+                        done, total, f"Rendered {done} of {total} driver reports"
+                    )
+                )
+                return job.result_path
+
+            start_job('batch_reports', "Weekly reports", run_batch_reports,
+                      file_name=f"all_drivers_{selected_year}_week_{selected_week}_reports.zip")
+
+        show_job('batch_reports', download_label="Download Weekly Reports ZIP", mime="application/zip")
+
+perf.section('trends')
+
+# Rolling trends of every driver and the fleet over the weeks up to the
+# selected week; computed only while the section is switched on
+if all_drivers and st.toggle("Show Fleet Trends", key="show_trends"):
+    import trends
+    st.header("Fleet Trends")
+    trend_weeks = st.number_input("Weeks of History", min_value=2, max_value=104, value=26,
+                                  key="trend_weeks")
+    fleet_trends = trends.get_trends(selected_year, selected_week, trend_weeks)
+
+    if fleet_trends['drivers'].empty:
+        st.warning("No sales data available for these weeks")
+    else:
+        summary_tab, chart_tab = st.tabs(["Summary", "Chart"])
+        with summary_tab:
+            st.caption("Latest week of each driver; streaks count consecutive weeks "
+                       "with the weekly target hit")
+            trend_summary = fleet_trends['drivers'].set_index('Driver').drop(columns='Driver ID')
+            share_columns = [f"{platform} Share" for platform in trends.PLATFORMS]
+            st.dataframe(trend_summary.style.format({
+                'Latest Week': '{:%Y-%m-%d}'.format,
+                'Latest Total': 'SEK {:,.2f}'.format,
+                trends.SHORT_AVERAGE: 'SEK {:,.2f}'.format,
+                trends.LONG_AVERAGE: 'SEK {:,.2f}'.format,
+                'WoW Change': 'SEK {:+,.2f}'.format,
+                'WoW Change %': '{:+.1f}%'.format,
+                'Target': 'SEK {:,.2f}'.format,
+                **{column: '{:.1f}%'.format for column in share_columns},
+            }, na_rep='-'))
+        with chart_tab:
+            # Drivers are picked by ID, as names need not be unique
+            trend_names = {driver[0]: driver[1] for driver in all_drivers}
+            trend_driver_id = st.selectbox(
+                "Trend Of",
+                options=[None] + list(trend_names),
+                format_func=lambda driver_id: trend_names.get(driver_id, trends.FLEET),
+                key="trend_driver_id"
             )
+            if trend_driver_id is None:
+                trend_df = fleet_trends['fleet']
+            else:
+                weekly_trends = fleet_trends['weekly']
+                trend_df = weekly_trends[weekly_trends['Driver ID'] == trend_driver_id]
+
+            if trend_df.empty:
+                st.info("No sales data for this driver in these weeks")
+            else:
+                import report_generator
+                trend_title = trend_names.get(trend_driver_id, trends.FLEET)
+                st.plotly_chart(report_generator.create_trend_figure(trend_df, f"{trend_title} - Weekly Trend"),
+                                use_container_width=True)
+
+perf.section('leaderboard')
+
+# Every driver ranked on one metric over the weeks up to the selected week;
+# the ranking is done in SQL and only the shown page is fetched
+if all_drivers and st.toggle("Show Leaderboard", key="show_leaderboard"):
+    st.header("Fleet Leaderboard")
+    col1, col2, col3 = st.columns([2, 1, 1])
+    with col1:
+        leaderboard_metric = st.selectbox(
+            "Rank By",
+            options=list(db.LEADERBOARD_METRICS),
+            format_func=lambda metric: db.LEADERBOARD_METRICS[metric][0],
+            key="leaderboard_metric"
+        )
+    with col2:
+        leaderboard_weeks = st.number_input("Weeks to Rank", min_value=1, max_value=53, value=1,
+                                            key="leaderboard_weeks")
+    with col3:
+        leaderboard_page_size = st.selectbox("Drivers per Page", options=[10, 25, 50, 100], index=1,
+                                             key="leaderboard_page_size")
+
+    (first_year, first_week), _ = utils.get_week_range(selected_year, selected_week, leaderboard_weeks)
+    leaderboard_range = (db.make_year_week(first_year, first_week),
+                         db.make_year_week(selected_year, selected_week))
+    ranked_drivers = db.count_leaderboard_drivers(*leaderboard_range)
+
+    if ranked_drivers:
+        leaderboard_pages = -(-ranked_drivers // leaderboard_page_size)
+        # Keep the page in range when the page size or the weeks change
+        if st.session_state.get('leaderboard_page', 1) > leaderboard_pages:
+            st.session_state['leaderboard_page'] = leaderboard_pages
+        leaderboard_page = st.number_input(f"Page (of {leaderboard_pages})", min_value=1,
+                                           max_value=leaderboard_pages, value=1, key="leaderboard_page")
+        leaderboard_df = utils.build_leaderboard_frame(db.get_leaderboard(
+            leaderboard_metric, *leaderboard_range, leaderboard_weeks,
+            limit=leaderboard_page_size, offset=(leaderboard_page - 1) * leaderboard_page_size
+        ))
+        st.caption(f"{ranked_drivers} drivers with sales from {first_year}-W{first_week:02d} "
+                   f"to {selected_year}-W{selected_week:02d}")
+        leaderboard_columns = ['Driver', 'Card', 'Weeks', 'Net Sales']
+        if leaderboard_metric != 'net_sales':
+            metric_label = db.LEADERBOARD_METRICS[leaderboard_metric][0]
+            leaderboard_df[metric_label] = [utils.format_leaderboard_value(leaderboard_metric, value)
+                                            for value in leaderboard_df['Value']]
+            leaderboard_columns.append(metric_label)
+        st.dataframe(
+            leaderboard_df.set_index('Rank')[leaderboard_columns].style.format({
+                'Net Sales': 'SEK {:,.2f}'.format,
+            })
+        )
+    else:
+        st.warning("No sales data available for these weeks")
+
+perf.section('fleet_targets')
+
+# Every driver's progress towards the weekly target, largest shortfall first,
+# from a single query
+if all_drivers and st.toggle("Show Fleet Target Status", key="show_fleet_targets"):
+    st.header(f"Fleet Target Status - Week {selected_week}, {selected_year}")
+    min_shortfall = st.number_input("Only Drivers Missing More Than (SEK)", min_value=0.0, value=0.0,
+                                    step=500.0, key="min_shortfall")
+    target_df = utils.build_target_status_frame(
+        db.get_fleet_target_status(selected_week, selected_year, min_shortfall or None)
+    )
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Drivers Shown", len(target_df))
+    with col2:
+        st.metric("Targets Hit", int((target_df['Shortfall'] <= 0).sum()))
+    with col3:
+        st.metric("Total Shortfall", utils.format_currency(target_df['Shortfall'].sum()))
+
+    if target_df.empty:
+        st.info("No drivers match the filter")
+    else:
+        currency_format = st.column_config.NumberColumn(format="SEK %.2f")
+        st.dataframe(
+            target_df[['Driver', 'Card', 'Target', 'Net Sales', 'Progress', 'Shortfall']],
+            column_config={
+                'Target': currency_format,
+                'Net Sales': currency_format,
+                'Progress': st.column_config.ProgressColumn(format="%.0f%%", min_value=0, max_value=100),
+                'Shortfall': st.column_config.NumberColumn("Missing", format="SEK %.2f"),
+            },
+            hide_index=True,
+            use_container_width=True
+        )
+
+        target_key = (selected_year, selected_week, min_shortfall, db.get_generation())
+        col1, col2 = st.columns(2)
+        with col1:
+            prepared_download(
+                'target_status_csv',
+                target_key,
+                "Export Target Status (CSV)",
+                "Download Target Status CSV",
+                f"target_status_{selected_year}_week_{selected_week}.csv",
+                lambda: target_df.drop(columns='Driver ID').to_csv(index=False).encode(),
+                mime="text/csv"
+            )
+        with col2:
+            def render_target_status_report():
+                import report_generator
+                return report_generator.generate_target_status_report({
+                    'date': utils.get_current_date(),
+                    'week_number': selected_week,
+                    'week_start_date': week_start_date,
+                    'week_end_date': week_end_date,
+                    'min_shortfall': min_shortfall,
+                    'targets': target_df,
+                })
+
+            prepared_download(
+                'target_status_pdf',
+                target_key,
+                "Export Target Status (PDF)",
+                "Download Target Status PDF",
+                f"target_status_{selected_year}_week_{selected_week}.pdf",
+                render_target_status_report
+            )
+
+perf.section('sidebar')
 
 # Sidebar for driver management
 with st.sidebar:
@@ -176,6 +539,74 @@ with st.sidebar:
                     st.success("Driver updated successfully!")
                     st.rerun()
 
+    # Bulk import of daily sales records
+    with st.expander("Bulk Import Sales"):
+        # Excel files need openpyxl, which the app does not depend on, so
+        # they are only accepted by cli.py import
+        st.caption("CSV file with one daily record per row and the columns "
+                   "driver or oil_card_number, date, uber, bolt, zettel, zettel_fee, "
+                   "other, other_type and oil. The week defaults to the date's week. "
+                   "Excel files can be imported with `python cli.py import`.")
+        import_file = st.file_uploader("Sales File", type=["csv"], key="import_file")
+        if import_file is not None and st.button("Import Records", key="import_btn"):
+            # The upload is copied, since the job outlives this script run
+            import_data = import_file.getvalue()
+            import_name = import_file.name
+
+            def run_import(job):
+                import sales_import
+                return sales_import.import_sales(
+                    io.BytesIO(import_data),
+                    file_name=import_name,
+                    progress=lambda rows: job.progress(rows, message=f"Read {rows} row(s)")
+                )
+
+            start_job('import', "Import", run_import)
+
+        import_job = show_job('import')
+        if import_job and import_job['status'] == jobs.DONE:
+            import_result = jobs.result(import_job['id'])
+            st.success(f"Imported {import_result['imported']} record(s)")
+            if import_result['failed']:
+                import pandas as pd
+                st.warning(f"Skipped {import_result['failed']} invalid row(s)")
+                st.dataframe(pd.DataFrame(import_result['errors'], columns=['Line', 'Error']),
+                             hide_index=True)
+
+    # Export of raw daily sales records
+    with st.expander("Export Sales Data"):
+        export_from = st.date_input("From Date", value=None, key="export_from")
+        export_to = st.date_input("To Date", value=None, key="export_to")
+        export_drivers = st.multiselect("Drivers (all if empty)", options=list(driver_dict.keys()),
+                                        key="export_drivers")
+        export_format = st.radio("Format", ["CSV", "Parquet"], horizontal=True, key="export_format")
+        if st.button("Export Sales Records", key="export_sales_btn"):
+            export_filters = dict(
+                start_date=export_from.isoformat() if export_from else None,
+                end_date=export_to.isoformat() if export_to else None,
+                driver_ids=[driver_dict[name]['id'] for name in export_drivers] or None
+            )
+            export_file_format = export_format.lower()
+
+            def run_export(job):
+                import sales_export
+                # Streamed to the job's result file rather than held in memory
+                sales_export.export_sales(
+                    job.result_path,
+                    export_file_format,
+                    progress=lambda rows: job.progress(rows, message=f"Exported {rows} record(s)"),
+                    **export_filters
+                )
+                return job.result_path
+
+            start_job('export', "Export", run_export,
+                      file_name=f"sales_export_{utils.get_current_date()}.{export_file_format}")
+
+        show_job('export', download_label="Download Sales Export",
+                 mime="application/octet-stream")
+
+perf.section('sales_entry')
+
 # Main content
 st.header("Sales Entry")
 
@@ -191,7 +622,7 @@ if selected_driver:
         st.info(f"Weekly Target: {utils.format_currency(driver_info['target'])}")
 
     # Weekly sales summary
-    weekly_sales = db.get_weekly_sales(driver_info['id'], selected_week)
+    weekly_sales = db.get_weekly_sales(driver_info['id'], selected_week, selected_year)
 
     if weekly_sales and any(sales is not None for sales in weekly_sales):
         st.subheader(f"Week {selected_week} Sales Summary ({week_start_date} to {week_end_date})")
@@ -212,11 +643,12 @@ if selected_driver:
         col1, col2 = st.columns(2)
         with col1:
             if st.button("Reset Weekly Data"):
-                db.reset_weekly_sales(driver_info['id'], selected_week)
+                db.reset_weekly_sales(driver_info['id'], selected_week, selected_year)
                 st.success(f"Week {selected_week} data has been reset")
                 st.rerun()
         with col2:
-            if st.button("Export Weekly Summary"):
+            def render_weekly_report():
+                import report_generator
                 total_net_sales = (total_uber or 0) + (total_bolt or 0) + (total_zettel or 0) + (total_other or 0)
                 weekly_report_data = {
                     'driver_name': selected_driver,
@@ -238,14 +670,16 @@ if selected_driver:
                     'total_sales': total_net_sales,
                     'target_achieved': total_net_sales >= driver_info['target']
                 }
-                pdf_buffer = report_generator.generate_pdf_report(weekly_report_data)
-                filename = f"{selected_driver}_week_{selected_week}_summary.pdf"
-                st.download_button(
-                    "Download Weekly Summary PDF",
-                    data=pdf_buffer,
-                    file_name=filename,
-                    mime="application/pdf"
-                )
+                return report_generator.generate_pdf_report(weekly_report_data)
+
+            prepared_download(
+                'weekly_summary',
+                (driver_info['id'], selected_year, selected_week, db.get_generation()),
+                "Export Weekly Summary",
+                "Download Weekly Summary PDF",
+                f"{selected_driver}_{selected_year}_week_{selected_week}_summary.pdf",
+                render_weekly_report
+            )
 
     # Initialize lock states if not exists
     if 'uber_locked' not in st.session_state:
@@ -331,7 +765,8 @@ if selected_driver:
                 other_sales,
                 other_type,
                 oil_expense,
-                selected_week
+                selected_week,
+                selected_year
             )
             st.success("Sales record saved successfully!")
             # Clear the form by clearing session state
@@ -344,173 +779,97 @@ if selected_driver:
                     st.session_state[lock_key] = False
             st.rerun()
 
+    perf.section('history')
+
     # Historical Data Section
     st.header("Historical Sales Data")
-    historical_sales = db.get_historical_sales(driver_info['id'])
-    current_year = datetime.now().year
+    history_period = st.radio("History Period", [f"Year {selected_year}", "All Years"], horizontal=True)
+    if history_period == "All Years":
+        history_range = (None, None)
+    else:
+        # Only scan the weeks of the selected year
+        history_range = (db.make_year_week(selected_year, 1), db.make_year_week(selected_year, 53))
+    history_weeks = db.count_historical_weeks(driver_info['id'], *history_range)
 
-    if historical_sales:
-        # Create DataFrame with basic data
-        historical_df = pd.DataFrame(historical_sales,
-                                   columns=['Week', 'Uber', 'Bolt', 'Zettel', 'Other', 'Oil', 'Zettel Fee'])
-        
-        # Add date range column
-        date_ranges = []
-        for week in historical_df['Week']:
-            start_date, end_date = utils.get_week_dates(current_year, int(week))
-            date_ranges.append(f"{start_date} to {end_date}")
-        
-        # Insert date range column after Week column
-        historical_df.insert(1, 'Date Range', date_ranges)
-        
-        # Calculate and add Total Net Sales column
-        total_net_sales = []
-        for i, row in historical_df.iterrows():
-            # Get values from each row
-            uber = float(row['Uber'])
-            bolt = float(row['Bolt'])
-            zettel = float(row['Zettel'])  # This is already net zettel from database query
-            zettel_fee = float(row['Zettel Fee'])
-            other = float(row['Other'])
-            
-            # Calculate total net sales (zettel is already net, so just add all components)
-            net_total = utils.calculate_total_sales(uber, bolt, zettel, other)
-            total_net_sales.append(net_total)
-        
-        # Add Total Net Sales column after Oil column
-        historical_df['Total Net Sales'] = total_net_sales
-        
+    if history_weeks:
         # Add action buttons - we'll use session state to track which button was clicked
         edit_week = st.session_state.get('edit_week', None)
+        edit_year = st.session_state.get('edit_year', selected_year)
         edit_week_mode = st.session_state.get('edit_week_mode', False)
         print_week = st.session_state.get('print_week', None)
-        
-        # Create an integrated table with data and buttons
-        # First create column headers
-        col_headers = st.columns([1, 1.5, 1, 1, 1, 1, 1, 1.5, 1, 1]) 
-        
-        with col_headers[0]:
-            st.write("Week")
-        with col_headers[1]:
-            st.write("Date Range")
-        with col_headers[2]:
-            st.write("Uber")
-        with col_headers[3]:
-            st.write("Bolt")
-        with col_headers[4]:
-            st.write("Zettel")
-        with col_headers[5]:
-            st.write("Other")
-        with col_headers[6]:
-            st.write("Oil")
-        with col_headers[7]:
-            st.write("Total Net Sales")
-        with col_headers[8]:
-            st.write("Edit")
-        with col_headers[9]:
-            st.write("Print")
-        
-        # Style for the entire table and buttons
-        st.markdown("""
-        <style>
-        /* Add more padding to all elements to increase row height */
-        .stButton > button {
-            height: 45px;
-            width: 45px;
-            font-size: 20px;
-            display: flex;
-            align-items: center;
-            justify-content: center;
-            margin-top: 10px;
-        }
-        
-        /* Improve appearance of data rows */
-        div[data-testid="column"] > div > div > div > div > div {
-            padding: 12px 0px;
-            line-height: 2.5;
-            border-bottom: 1px solid #eee;
-            height: 50px;
-            display: flex;
-            align-items: center;
-        }
-        
-        /* Add styling for column headers */
-        div[data-testid="column"] > div > div:first-child {
-            font-weight: bold;
-            border-bottom: 2px solid #2c3e50;
-            padding-bottom: 8px;
-            margin-bottom: 10px;
-            color: #2c3e50;
-        }
-        
-        /* Fix button alignment and spacing */
-        [data-testid="column"]:nth-of-type(9) .stButton, 
-        [data-testid="column"]:nth-of-type(10) .stButton {
-            margin-top: 15px;
-            margin-bottom: 15px;
-            display: flex;
-            justify-content: center;
-            align-items: center;
-            height: 50px;
-        }
-        
-        /* Add consistent spacing between rows */
-        div[data-testid="column"] > div {
-            margin-bottom: 5px;
-        }
-        
-        /* Fix spacing for Historical Data reset/export buttons */
-        .block-container > div:nth-child(1) > div > div:nth-of-type(5) .stButton {
-            margin-top: 15px;
-            margin-left: 0;
-        }
-        </style>
-        """, unsafe_allow_html=True)
-        
-        # For each week in the data, create a row with data and buttons
-        for i, row in historical_df.iterrows():
-            week = row['Week']
-            date_range = row['Date Range']
-            uber = row['Uber']
-            bolt = row['Bolt']
-            zettel = row['Zettel']
-            other = row['Other']
-            oil = row['Oil']
-            
-            cols = st.columns([1, 1.5, 1, 1, 1, 1, 1, 1.5, 1, 1])
-            
-            with cols[0]:
-                st.write(f"{int(week)}")
-            with cols[1]:
-                st.write(f"{date_range}")
-            with cols[2]:
-                st.write(f"{utils.format_currency(uber)}")
-            with cols[3]:
-                st.write(f"{utils.format_currency(bolt)}")
-            with cols[4]:
-                st.write(f"{utils.format_currency(zettel)}")
-            with cols[5]:
-                st.write(f"{utils.format_currency(other)}")
-            with cols[6]:
-                st.write(f"{utils.format_currency(oil)}")
-            with cols[7]:
-                st.write(f"{utils.format_currency(row['Total Net Sales'])}")
-            with cols[8]:
-                if st.button(f"✏️", key=f"edit_week_{week}", help=f"Edit Week {week} data"):
+        print_year = st.session_state.get('print_year', selected_year)
+
+        # Only the visible page of weeks is queried and rendered
+        page_col, size_col = st.columns([3, 1])
+        with size_col:
+            page_size = st.selectbox("Weeks per Page", [10, 25, 50, 100], key="history_page_size")
+        page_count = -(-history_weeks // page_size)
+        if st.session_state.get('history_page', 1) > page_count:
+            st.session_state.history_page = page_count
+        with page_col:
+            page = st.number_input(f"Page (of {page_count})", min_value=1, max_value=page_count,
+                                   step=1, key="history_page")
+        offset = (page - 1) * page_size
+
+        historical_sales = db.get_historical_sales(
+            driver_info['id'], *history_range, limit=page_size, offset=offset
+        )
+        # Build the table with date ranges and Total Net Sales in one pass
+        historical_df = utils.build_historical_frame(historical_sales)
+
+        # One dataframe element for the whole page; selecting a row picks the
+        # week for the Edit and Print actions
+        currency_format = st.column_config.NumberColumn(format="SEK %.2f")
+        history_event = st.dataframe(
+            historical_df.drop(columns=['Zettel Fee']),
+            column_config={
+                'Year': st.column_config.NumberColumn(format="%d"),
+                'Uber': currency_format,
+                'Bolt': currency_format,
+                'Zettel': currency_format,
+                'Other': currency_format,
+                'Oil': currency_format,
+                'Total Net Sales': currency_format,
+            },
+            hide_index=True,
+            use_container_width=True,
+            on_select="rerun",
+            selection_mode="single-row",
+            key="history_table"
+        )
+        st.caption(f"Weeks {offset + 1}-{offset + len(historical_df)} of {history_weeks}")
+
+        selected_rows = [i for i in history_event.selection.rows if i < len(historical_df)]
+        if selected_rows:
+            selected_row = historical_df.iloc[selected_rows[0]]
+            year = int(selected_row['Year'])
+            week = int(selected_row['Week'])
+            col1, col2 = st.columns(2)
+            with col1:
+                if st.button(f"✏️ Edit Week {week}", key="edit_selected_week", help=f"Edit Week {week} data"):
                     st.session_state.edit_week = week
+                    st.session_state.edit_year = year
                     st.session_state.edit_week_mode = True
                     st.session_state.print_week = None  # Clear any print selection
                     st.rerun()
-            with cols[9]:
-                if st.button(f"🖨️", key=f"print_week_{week}", help=f"Print Week {week} data"):
+            with col2:
+                if st.button(f"🖨️ Print Week {week}", key="print_selected_week", help=f"Print Week {week} data"):
                     st.session_state.print_week = week
+                    st.session_state.print_year = year
                     st.rerun()
+        else:
+            st.caption("Select a week in the table to edit or print it.")
+
         
         # Handle print action if a print button was clicked
         if print_week is not None:
             try:
-                # Get the week data - with error handling
-                filtered_df = historical_df[historical_df['Week'] == print_week]
+                # Get the week data - with error handling. The week may be on
+                # another page than the one shown, so it is queried directly
+                print_key = db.make_year_week(print_year, int(print_week))
+                filtered_df = utils.build_historical_frame(
+                    db.get_historical_sales(driver_info['id'], print_key, print_key)
+                )
                 
                 if filtered_df.empty:
                     st.error(f"No data found for week {print_week}. Please select a valid week.")
@@ -519,7 +878,7 @@ if selected_driver:
                         st.rerun()
                 else:
                     week_row = filtered_df.iloc[0]
-                    start_date, end_date = utils.get_week_dates(current_year, int(print_week))
+                    start_date, end_date = utils.get_week_dates(print_year, int(print_week))
                     
                     # Prepare data for the weekly report
                     week_data = {
@@ -551,16 +910,20 @@ if selected_driver:
                     week_data['total_sales'] = total_week_sales
                     week_data['target_achieved'] = total_week_sales >= driver_dict[selected_driver]['target']
                     
-                    # Generate PDF report
-                    pdf_buffer = report_generator.generate_pdf_report(week_data)
-                    filename = f"{selected_driver}_week_{print_week}_report.pdf"
-                    
-                    # Create download button
-                    st.download_button(
+                    def render_week_report():
+                        import report_generator
+                        return report_generator.generate_pdf_report(week_data)
+
+                    # The Print click requested the report, so render it once
+                    # and keep it for the following reruns
+                    prepared_download(
+                        'print_week',
+                        (driver_info['id'], print_year, print_week, db.get_generation()),
+                        None,
                         f"Download Week {print_week} Report",
-                        data=pdf_buffer,
-                        file_name=filename,
-                        mime="application/pdf"
+                        f"{selected_driver}_{print_year}_week_{print_week}_report.pdf",
+                        render_week_report,
+                        requested=True
                     )
                     
                     # Add button to clear the print selection and return to normal view
@@ -576,194 +939,86 @@ if selected_driver:
         
         # Show edit form if a week is selected
         elif edit_week_mode and edit_week:
-            st.subheader(f"Edit Week {edit_week} ({utils.get_week_dates(current_year, int(edit_week))[0]} to {utils.get_week_dates(current_year, int(edit_week))[1]})")
-            
-            # Get daily sales records for the selected week
-            daily_records = db.get_weekly_sales_records(driver_info['id'], edit_week)
-            
-            if daily_records:
-                # Create tabs for each daily record
-                daily_tabs = st.tabs([f"Day {i+1}: {record[1]}" for i, record in enumerate(daily_records)])
-                
-                for i, (tab, record) in enumerate(zip(daily_tabs, daily_records)):
-                    with tab:
-                        record_id = record[0]
-                        record_date = record[1]
-                        
-                        # Create edit form for this record
-                        with st.form(key=f"edit_record_{record_id}"):
-                            st.write(f"Edit Sales for {record_date}")
-                            
-                            # Get current values
-                            current_uber = record[2] or 0
-                            current_bolt = record[3] or 0
-                            current_zettel = record[4] or 0
-                            current_zettel_fee = record[5] or 0
-                            current_other = record[6] or 0
-                            current_other_type = record[7] or ""
-                            current_oil = record[8] or 0
-                            
-                            # Create input fields with current values
-                            col1, col2 = st.columns(2)
-                            with col1:
-                                new_uber = st.number_input("Uber Sales (SEK)", 
-                                                         value=float(current_uber),
-                                                         step=100.0,
-                                                         format="%.2f")
-                                new_bolt = st.number_input("Bolt Sales (SEK)", 
-                                                         value=float(current_bolt),
-                                                         step=100.0,
-                                                         format="%.2f")
-                                new_zettel = st.number_input("Zettel Sales (SEK)", 
-                                                         value=float(current_zettel),
-                                                         step=100.0,
-                                                         format="%.2f")
-                                new_zettel_fee = st.number_input("Zettel Fee (SEK)", 
-                                                             value=float(current_zettel_fee),
-                                                             step=10.0,
-                                                             format="%.2f")
-                            
-                            with col2:
-                                new_other = st.number_input("Other Sales (SEK)", 
-                                                         value=float(current_other),
-                                                         step=100.0,
-                                                         format="%.2f")
-                                new_other_type = st.selectbox("Other Sales Type",
-                                    ["Cash", "Card", "Swish", "Transfer", "Other"],
-                                    index=["Cash", "Card", "Swish", "Transfer", "Other"].index(current_other_type) if current_other_type in ["Cash", "Card", "Swish", "Transfer", "Other"] else 0)
-                                new_oil = st.number_input("Oil Expense (SEK)", 
-                                                       value=float(current_oil),
-                                                       step=50.0,
-                                                       format="%.2f")
-                            
-                            # Calculate the new total
-                            new_total = utils.calculate_total_sales(
-                                new_uber, 
-                                new_bolt, 
-                                new_zettel, 
-                                new_other
-                            )
-                            
-                            st.metric("New Total Sales", utils.format_currency(new_total))
-                            
-                            # Form actions
-                            col1, col2 = st.columns(2)
-                            with col1:
-                                if st.form_submit_button("Update Sales Record"):
-                                    # Update the record in the database
-                                    db.update_sales_record(
-                                        record_id, 
-                                        new_uber, 
-                                        new_bolt, 
-                                        new_zettel, 
-                                        new_zettel_fee,
-                                        new_other, 
-                                        new_other_type, 
-                                        new_oil
-                                    )
-                                    st.success(f"Sales record for {record_date} updated successfully!")
-                                    st.rerun()  # Rerun the app to show updated data
-                            with col2:
-                                if st.form_submit_button("Cancel"):
-                                    st.session_state.edit_week_mode = False
-                                    st.rerun()
-            else:
-                # No existing records found - create a new one
-                st.info(f"No daily records found for Week {edit_week}")
-                
-                # Extract the values from the weekly summary if available
-                filtered_rows = historical_df[historical_df['Week'] == edit_week]
-                if len(filtered_rows) > 0:
-                    week_row = filtered_rows.iloc[0]
-                    uber_val = float(week_row['Uber'])
-                    bolt_val = float(week_row['Bolt'])
-                    zettel_val = float(week_row['Zettel'])
-                    other_val = float(week_row['Other'])
-                    oil_val = float(week_row['Oil'])
-                    zettel_fee_val = float(week_row.get('Zettel Fee', 0))
-                else:
-                    # Set default values if no data is available
-                    uber_val = 0.0
-                    bolt_val = 0.0
-                    zettel_val = 0.0
-                    other_val = 0.0
-                    oil_val = 0.0
-                    zettel_fee_val = 0.0
-                
-                # Create new record form
-                with st.form(key=f"create_record_{edit_week}"):
-                    st.write(f"Create New Record for Week {edit_week}")
-                    
-                    start_date, _ = utils.get_week_dates(current_year, int(edit_week))
-                    record_date = st.date_input("Record Date", 
-                                              value=datetime.strptime(start_date, "%Y-%m-%d").date(),
-                                              format="YYYY-MM-DD")
-                    
-                    col1, col2 = st.columns(2)
-                    with col1:
-                        new_uber = st.number_input("Uber Sales (SEK)", 
-                                                 value=uber_val,
-                                                 step=100.0,
-                                                 format="%.2f")
-                        new_bolt = st.number_input("Bolt Sales (SEK)", 
-                                                 value=bolt_val,
-                                                 step=100.0,
-                                                 format="%.2f")
-                        new_zettel = st.number_input("Zettel Sales (SEK)", 
-                                                   value=zettel_val + zettel_fee_val,
-                                                   step=100.0,
-                                                   format="%.2f")
-                        new_zettel_fee = st.number_input("Zettel Fee (SEK)", 
-                                                       value=zettel_fee_val,
-                                                       step=10.0,
-                                                       format="%.2f")
-                    
-                    with col2:
-                        new_other = st.number_input("Other Sales (SEK)", 
-                                                  value=other_val,
-                                                  step=100.0,
-                                                  format="%.2f")
-                        new_other_type = st.text_input("Other Sales Type", value="Other")
-                        new_oil = st.number_input("Oil Expense (SEK)", 
-                                                value=oil_val,
-                                                step=50.0,
-                                                format="%.2f")
-                    
-                    # Calculate the new total
-                    new_total = utils.calculate_total_sales(
-                        new_uber, 
-                        new_bolt, 
-                        new_zettel, 
-                        new_other
-                    )
-                    
-                    st.metric("Total Sales", utils.format_currency(new_total))
-                    
-                    # Form actions
-                    col1, col2 = st.columns(2)
-                    with col1:
-                        if st.form_submit_button("Create Record"):
-                            # Add a record with these values
-                            db.add_sales_record(
-                                driver_info['id'],
-                                record_date.strftime("%Y-%m-%d"),
-                                new_uber,
-                                new_bolt,
-                                new_zettel,  # This is the gross amount
-                                new_zettel_fee,
-                                new_other,
-                                new_other_type,
-                                new_oil,
-                                edit_week
-                            )
-                            
-                            st.success(f"Created new record for Week {edit_week}")
-                            st.session_state.edit_week_mode = False
-                            st.rerun()  # Rerun the app to show the new record
-                    with col2:
-                        if st.form_submit_button("Cancel"):
-                            st.session_state.edit_week_mode = False
-                            st.rerun()
+            edit_start_date, edit_end_date = utils.get_week_dates(edit_year, int(edit_week))
+            st.subheader(f"Edit Week {edit_week}, {edit_year} ({edit_start_date} to {edit_end_date})")
+            st.caption("Edit the daily records in the table, add rows for new days or select rows "
+                       "and delete them; all changes are saved together")
+
+            # The whole week is edited in one table and saved as one diff in a
+            # single transaction
+            edit_df = utils.build_week_editor_frame(
+                db.get_weekly_sales_records(driver_info['id'], edit_week, edit_year)
+            )
+            other_types = ["Cash", "Card", "Swish", "Transfer", "Other"]
+            other_types += sorted(set(edit_df['Other Type']) - set(other_types) - {""})
+            editor_key = f"week_editor_{driver_info['id']}_{edit_year}_{edit_week}"
+
+            def amount_column(label, step, min_value=0.0):
+                return st.column_config.NumberColumn(label, min_value=min_value, step=step,
+                                                     format="%.2f", default=0.0)
+
+            # Records entered later for the week are dated outside it, so the
+            # date range also covers the stored dates
+            edit_start = datetime.strptime(edit_start_date, "%Y-%m-%d").date()
+            edit_end = datetime.strptime(edit_end_date, "%Y-%m-%d").date()
+            stored_dates = list(edit_df['Date'].dropna())
+            date_min = min([edit_start, *stored_dates])
+            date_max = max([edit_end, *stored_dates])
+
+            edited_df = st.data_editor(
+                edit_df,
+                column_config={
+                    'ID': None,
+                    'Date': st.column_config.DateColumn(
+                        "Date", format="YYYY-MM-DD", required=True, default=edit_start,
+                        min_value=date_min, max_value=date_max
+                    ),
+                    'Uber': amount_column("Uber Sales (SEK)", 100.0),
+                    'Bolt': amount_column("Bolt Sales (SEK)", 100.0),
+                    'Zettel': amount_column("Zettel Sales (SEK)", 100.0),
+                    'Zettel Fee': amount_column("Zettel Fee (SEK)", 10.0),
+                    # Other sales may be negative, e.g. for corrections
+                    'Other': amount_column("Other Sales (SEK)", 100.0, min_value=None),
+                    'Other Type': st.column_config.SelectboxColumn(
+                        "Other Sales Type", options=other_types, default="Cash"
+                    ),
+                    'Oil': amount_column("Oil Expense (SEK)", 50.0),
+                },
+                num_rows="dynamic",
+                hide_index=True,
+                use_container_width=True,
+                key=editor_key
+            )
+
+            new_total = utils.calculate_total_sales(
+                edited_df['Uber'].fillna(0).sum(),
+                edited_df['Bolt'].fillna(0).sum(),
+                edited_df['Zettel'].fillna(0).sum(),
+                edited_df['Other'].fillna(0).sum()
+            )
+            st.metric("New Total Sales", utils.format_currency(new_total))
+
+            col1, col2 = st.columns(2)
+            with col1:
+                if st.button("Save Changes", key="save_week_edits", type="primary"):
+                    try:
+                        inserts, updates, deletes = utils.build_week_edits(
+                            edit_df, st.session_state[editor_key], (edit_start_date, edit_end_date)
+                        )
+                    except ValueError as e:
+                        st.error(str(e))
+                    else:
+                        inserted, updated, deleted = db.apply_week_edits(
+                            driver_info['id'], edit_week, edit_year, inserts, updates, deletes
+                        )
+                        st.success(f"Week {edit_week} saved: {inserted} added, {updated} updated, "
+                                   f"{deleted} deleted")
+                        st.session_state.edit_week_mode = False
+                        st.rerun()
+            with col2:
+                if st.button("Cancel", key="cancel_week_edits"):
+                    st.session_state.edit_week_mode = False
+                    st.rerun()
 
         # Add extra space before buttons
         st.write("")
@@ -788,67 +1043,93 @@ if selected_driver:
         col1, col2 = st.columns(2)
         with col1:
             if st.button("Reset All Historical Data", key="reset_btn", type="secondary"):
-                db.reset_all_sales(driver_info['id'])
+                reset_driver_id = driver_info['id']
+                start_job('reset', "Reset", lambda job: db.reset_all_sales(reset_driver_id))
+            reset_job = show_job('reset')
+            if reset_job and reset_job['status'] == jobs.DONE:
                 st.success("All historical data has been reset")
-                st.rerun()
         with col2:
             if st.button("Export Historical Data", key="export_btn", type="secondary"):
-                historical_report_data = utils.prepare_historical_report_data(
-                    selected_driver,
-                    historical_df
-                )
-                pdf_buffer = report_generator.generate_historical_report(historical_report_data)
-                filename = f"{selected_driver}_historical_sales_summary.pdf"
-                st.download_button(
-                    "Download Historical Summary PDF",
-                    data=pdf_buffer,
-                    file_name=filename,
-                    mime="application/pdf"
-                )
+                report_driver, report_driver_id, report_range = selected_driver, driver_info['id'], history_range
+
+                def run_historical_report(job):
+                    import report_generator
+                    # The summary covers the whole period, not just the visible page
+                    historical_report_data = utils.prepare_historical_report_data(
+                        report_driver,
+                        utils.build_historical_frame(db.get_historical_sales(report_driver_id, *report_range))
+                    )
+                    return report_generator.generate_historical_report(historical_report_data)
+
+                start_job('historical_summary', "Historical export", run_historical_report,
+                          file_name=f"{selected_driver}_historical_sales_summary.pdf")
+
+            show_job('historical_summary', download_label="Download Historical Summary PDF",
+                     mime="application/pdf")
+
+    perf.section('comparison')
 
     # Driver Performance Comparison
     st.header("Driver Performance Comparison")
 
-    # Get all drivers and their data
-    comparison_drivers = st.multiselect(
-        "Select Drivers to Compare",
-        options=[d[1] for d in all_drivers],
-        default=[selected_driver] if selected_driver else None
-    )
-
-    if comparison_drivers:
-        drivers_data = []
-        for driver_name in comparison_drivers:
-            driver_id = driver_dict[driver_name]['id']
-            target = driver_dict[driver_name]['target']
-            oil_card = driver_dict[driver_name]['oil_card']
-            weekly_sales = db.get_weekly_sales(driver_id, selected_week)
-            drivers_data.append((driver_name, weekly_sales, target, oil_card))
+    # Compare any set of drivers, or the whole fleet, over a run of weeks
+    # ending with the selected week; the totals come from a single query
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        compare_all_drivers = st.checkbox("Compare All Drivers", key="compare_all_drivers")
+        comparison_drivers = st.multiselect(
+            "Select Drivers to Compare",
+            options=[d[1] for d in all_drivers],
+            default=[selected_driver] if selected_driver else None,
+            disabled=compare_all_drivers
+        )
+    with col2:
+        comparison_weeks = st.number_input("Weeks to Compare", min_value=1, max_value=53, value=1,
+                                           key="comparison_weeks")
 
-        comparison_data = utils.prepare_comparison_data(drivers_data)
-        comparison_fig = report_generator.create_comparison_chart(comparison_data)
+    if compare_all_drivers or comparison_drivers:
+        (first_year, first_week), _ = utils.get_week_range(selected_year, selected_week,
+                                                           comparison_weeks)
+        comparison_driver_ids = None if compare_all_drivers else tuple(
+            driver_dict[driver_name]['id'] for driver_name in comparison_drivers
+        )
+        comparison_totals = db.get_comparison_totals(
+            comparison_driver_ids,
+            db.make_year_week(first_year, first_week),
+            db.make_year_week(selected_year, selected_week)
+        )
+        comparison_df = utils.build_comparison_frame(comparison_totals, comparison_weeks)
+        comparison_data = utils.prepare_comparison_data(comparison_df)
+        if comparison_weeks > 1:
+            comparison_period = f"Weeks {first_year}-W{first_week:02d} to {selected_year}-W{selected_week:02d}"
+            comparison_start_date = utils.get_week_dates(first_year, first_week)[0]
+        else:
+            comparison_period = None
+            comparison_start_date = week_start_date
 
-        if comparison_fig:
-            st.plotly_chart(comparison_fig, use_container_width=True)
+        if comparison_data['drivers']:
+            # The Plotly figure is only built when the chart is switched on
+            if st.toggle("Show Comparison Chart", key="show_comparison_chart"):
+                import report_generator
+                st.plotly_chart(report_generator.create_comparison_chart(comparison_data),
+                                use_container_width=True)
 
             # Add a table with numerical comparison
             st.subheader("Numerical Comparison")
-            comparison_df = pd.DataFrame(
-                comparison_data['values'],
-                columns=comparison_data['metrics'],
-                index=comparison_data['drivers']
+            if comparison_period:
+                st.caption(f"{comparison_period}; targets are the weekly target times {comparison_weeks}")
+            comparison_table = comparison_df[utils.COMPARISON_METRICS + ['Period Target']].rename(
+                columns={'Period Target': 'Target'}
             )
-            comparison_df['Target'] = comparison_data['targets']
-            comparison_df['Achievement Rate'] = [
-                f"{rate:.1f}%" for rate in comparison_data['achievement_rates']
-            ]
+            comparison_table['Achievement Rate'] = comparison_df['Achievement Rate'].map('{:.1f}%'.format)
 
             # Add driver info to the DataFrame index
-            driver_info = [f"{name}\nCard: {info['card']}\nTarget: {utils.format_currency(info['target'])}"
-                          for name, info in zip(comparison_data['drivers'], comparison_data['driver_info'])]
-            comparison_df.index = driver_info
+            comparison_table.index = (
+                comparison_df['Driver'] + "\nCard: " + comparison_df['Card'].astype(str)
+                + "\nTarget: " + comparison_df['Target'].map(utils.format_currency)
+            )
 
-            st.dataframe(comparison_df.style.format({
+            st.dataframe(comparison_table.style.format({
                 'Uber': 'SEK {:,.2f}'.format,
                 'Bolt': 'SEK {:,.2f}'.format,
                 'Zettel': 'SEK {:,.2f}'.format,
@@ -857,25 +1138,39 @@ if selected_driver:
             }))
 
             # Add export button for comparison report
-            if st.button("Export Comparison Report", key="export_comparison_btn", type="secondary"):
+            def render_comparison_report():
+                import report_generator
                 # Add week dates to comparison data
                 comparison_data['week_number'] = selected_week
-                comparison_data['week_start_date'] = week_start_date
+                comparison_data['week_start_date'] = comparison_start_date
                 comparison_data['week_end_date'] = week_end_date
-                
-                pdf_buffer = report_generator.generate_comparison_report(comparison_data)
-                current_date = utils.get_current_date()
-                filename = f"driver_comparison_week_{selected_week}_{current_date}.pdf"
-                st.download_button(
-                    "Download Comparison Report PDF",
-                    data=pdf_buffer,
-                    file_name=filename,
-                    mime="application/pdf"
-                )
+                if comparison_period:
+                    comparison_data['period'] = comparison_period
+                comparison_data['highlights'] = utils.prepare_comparison_highlights({
+                    metric: next(iter(db.get_leaderboard(
+                        metric, db.make_year_week(first_year, first_week),
+                        db.make_year_week(selected_year, selected_week), comparison_weeks,
+                        comparison_driver_ids, limit=1
+                    )), None)
+                    for _, metric in utils.COMPARISON_HIGHLIGHTS
+                })
+                return report_generator.generate_comparison_report(comparison_data)
+
+            prepared_download(
+                'comparison_report',
+                (comparison_driver_ids, selected_year, selected_week, comparison_weeks,
+                 db.get_generation()),
+                "Export Comparison Report",
+                "Download Comparison Report PDF",
+                f"driver_comparison_week_{selected_week}_{utils.get_current_date()}.pdf",
+                render_comparison_report
+            )
 
         else:
             st.warning("No data available for comparison")
 
+    perf.section('target_status')
+
     # Target achievement check
     st.header("Target Achievement Status")
     if selected_driver and driver_info:
@@ -893,11 +1188,13 @@ if selected_driver:
             st.error("⚠️ Target Not Achieved")
             st.info(f"Missing: {utils.format_currency(target - total_sales)}")
 
+    perf.section('daily_report')
+
     # Daily report generation (Renamed to Daily Report for clarity)
     st.header("Generate Daily Report")
 
-    # Get week dates for report - reuse the current_year variable from the top of the file
-    week_start, week_end = utils.get_week_dates(current_year, selected_week)
+    # Get week dates for report - reuse the selected_year variable from the top of the file
+    week_start, week_end = utils.get_week_dates(selected_year, selected_week)
 
     # Use actual weekly sales data if available, otherwise use form data
     if weekly_sales and any(sales is not None for sales in weekly_sales):
@@ -946,19 +1243,32 @@ if selected_driver:
             'target_achieved': total_sales >= driver_dict[selected_driver]['target']
         }
 
-    # Display the chart in the Streamlit interface
-    fig = report_generator.create_sales_figure(report_data)
-    st.plotly_chart(fig)
-
-    if st.button("Export Daily Report", key="export_daily_btn", type="secondary"):
-        pdf_buffer = report_generator.generate_pdf_report(report_data)
-        current_date = utils.get_current_date()
-        filename = f"{selected_driver}_daily_report_{current_date}.pdf"
-        st.download_button(
-            "Download Daily Report PDF",
-            data=pdf_buffer,
-            file_name=filename,
-            mime="application/pdf"
-        )
+    # Display the chart in the Streamlit interface, building the Plotly
+    # figure only when the chart is switched on
+    if st.toggle("Show Sales Chart", key="show_daily_chart"):
+        import report_generator
+        st.plotly_chart(report_generator.create_sales_figure(report_data))
+
+    def render_daily_report():
+        import report_generator
+        return report_generator.generate_pdf_report(report_data)
+
+    # The report may use unsaved form values, so it is keyed by its content
+    prepared_download(
+        'daily_report',
+        repr(report_data),
+        "Export Daily Report",
+        "Download Daily Report PDF",
+        f"{selected_driver}_daily_report_{utils.get_current_date()}.pdf",
+        render_daily_report
+    )
 else:
-    st.warning("Please add a driver to begin entering sales data.")
\ No newline at end of file
+    st.warning("Please add a driver to begin entering sales data.")
+
+perf.end_run()
+
+# Section timings across recent runs and queries made by this run
+if show_section_timings:
+    show_section_timings_panel()
+if profile_queries:
+    show_query_profile(profile_mark)
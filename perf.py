@@ -0,0 +1,200 @@
+"""
+Render timing of the sections of a Streamlit script run.
+
+main.py marks where each named section starts with section(); a section ends
+where the next one starts or the run ends. For every section this records the
+wall time, the database calls and cache hits made and the Streamlit elements
+emitted. Rolling percentiles are kept over the last WINDOW runs, and the
+metrics can be exported in the Prometheus text format, either on demand or to
+a file that is rewritten after every run.
+
+Each session runs the script in its own thread, so the state of the current
+run is thread-local while the collected samples are shared by the process.
+"""
+import os
+import tempfile
+import threading
+import time
+from collections import deque
+
+import database as db
+
+# Number of recent runs that percentiles are computed over
+WINDOW = 500
+
+# Rewrite this file with the Prometheus metrics after every run, e.g. for the
+# node_exporter textfile collector. Override with PERF_METRICS_FILE.
+METRICS_FILE = os.environ.get('PERF_METRICS_FILE') or None
+
+# Prefix of the exported metric names
+METRIC_PREFIX = 'driver_app'
+
+QUANTILES = (0.5, 0.9, 0.99)
+
+# Name of the pseudo-section covering the whole run
+RUN = 'total'
+
+_samples = {}
+_totals = {}
+_samples_lock = threading.Lock()
+_local = threading.local()
+
+def _element_count():
+    return getattr(_local, 'elements', 0)
+
+def _install_element_counter():
+    # Streamlit has no public element counter, so count the delta messages the
+    # script run sends to the browser. Without a script run context (e.g. in
+    # bare mode) or if Streamlit's internals change, elements are not counted.
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        ctx = get_script_run_ctx(suppress_warning=True)
+        enqueue = ctx._enqueue
+    except (ImportError, AttributeError):
+        return
+    if getattr(enqueue, 'counts_elements', False):
+        return
+
+    def counting_enqueue(msg):
+        if msg.WhichOneof('type') == 'delta':
+            _local.elements = _element_count() + 1
+        enqueue(msg)
+    counting_enqueue.counts_elements = True
+    ctx._enqueue = counting_enqueue
+
+def _snapshot():
+    db_calls, cache_hits = db.get_call_counts()
+    return time.perf_counter(), db_calls, cache_hits, _element_count()
+
+def begin_run():
+    """Start timing a script run; call before the first section()."""
+    _install_element_counter()
+    _local.run_start = _snapshot()
+    _local.section = None
+
+def section(name):
+    """
+    End the current section, if any, and start timing the named one.
+
+    Args:
+        name: Name of the section, e.g. 'history'
+    """
+    now = _snapshot()
+    current = getattr(_local, 'section', None)
+    if current is not None:
+        _record(current[0], current[1], now)
+    _local.section = (name, now)
+
+def end_run():
+    """
+    End the last section and the run, then rewrite METRICS_FILE if it is set.
+
+    Runs interrupted by st.rerun() or st.stop() never reach end_run() and are
+    not recorded.
+    """
+    if getattr(_local, 'run_start', None) is None:
+        return
+    section(None)
+    _record(RUN, _local.run_start, _snapshot())
+    _local.run_start = None
+    _local.section = None
+    if METRICS_FILE:
+        write_metrics(METRICS_FILE)
+
+def _record(name, start, end):
+    seconds, db_calls, cache_hits, elements = (b - a for a, b in zip(start, end))
+    with _samples_lock:
+        _samples.setdefault(name, deque(maxlen=WINDOW)).append(
+            (seconds, db_calls, cache_hits, elements)
+        )
+        totals = _totals.setdefault(name, [0, 0.0, 0, 0, 0])
+        totals[0] += 1
+        totals[1] += seconds
+        totals[2] += db_calls
+        totals[3] += cache_hits
+        totals[4] += elements
+
+def _percentile(sorted_values, q):
+    # Nearest-rank percentile
+    index = max(0, min(len(sorted_values) - 1, round(q * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+def stats():
+    """
+    Summarise the recorded sections in the order they were first seen.
+
+    Returns:
+        A list of dicts with section, runs, last_ms, p50_ms, p90_ms, p99_ms,
+        db_calls, cache_hits and elements (the last three from the latest run)
+    """
+    with _samples_lock:
+        samples = {name: list(values) for name, values in _samples.items()}
+    summary = []
+    for name, values in samples.items():
+        durations = sorted(seconds * 1000 for seconds, _, _, _ in values)
+        last_seconds, db_calls, cache_hits, elements = values[-1]
+        entry = {'section': name, 'runs': len(values), 'last_ms': last_seconds * 1000}
+        for q in QUANTILES:
+            entry[f"p{round(q * 100)}_ms"] = _percentile(durations, q)
+        entry.update(db_calls=db_calls, cache_hits=cache_hits, elements=elements)
+        summary.append(entry)
+    return summary
+
+def reset():
+    """Forget every recorded sample."""
+    with _samples_lock:
+        _samples.clear()
+        _totals.clear()
+
+def prometheus_text():
+    """
+    Return the section metrics in the Prometheus text exposition format.
+
+    Durations are a summary over the last WINDOW runs; database calls, cache
+    hits and elements are counters over the life of the process.
+    """
+    with _samples_lock:
+        samples = {name: sorted(seconds for seconds, _, _, _ in values)
+                   for name, values in _samples.items()}
+        totals = {name: list(values) for name, values in _totals.items()}
+
+    duration = f"{METRIC_PREFIX}_section_duration_seconds"
+    lines = [
+        f"# HELP {duration} Wall time of a section of a script run.",
+        f"# TYPE {duration} summary",
+    ]
+    for name, durations in samples.items():
+        for q in QUANTILES:
+            lines.append(f'{duration}{{section="{name}",quantile="{q}"}} {_percentile(durations, q):.6f}')
+        lines.append(f'{duration}_sum{{section="{name}"}} {totals[name][1]:.6f}')
+        lines.append(f'{duration}_count{{section="{name}"}} {totals[name][0]}')
+
+    counters = [
+        ('db_calls', 2, "Database calls made by a section."),
+        ('cache_hits', 3, "Database reads served from the read cache by a section."),
+        ('elements', 4, "Streamlit elements emitted by a section."),
+    ]
+    for metric, column, help_text in counters:
+        metric_name = f"{METRIC_PREFIX}_section_{metric}_total"
+        lines.append(f"# HELP {metric_name} {help_text}")
+        lines.append(f"# TYPE {metric_name} counter")
+        for name, values in totals.items():
+            lines.append(f'{metric_name}{{section="{name}"}} {values[column]}')
+    return '\n'.join(lines) + '\n'
+
+def write_metrics(path):
+    """
+    Write the Prometheus metrics to a file, replacing it atomically.
+
+    Args:
+        path: Path of the metrics file
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(prometheus_text())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
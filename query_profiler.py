@@ -0,0 +1,300 @@
+"""
+Query profiler for the SQLite database layer.
+
+While enabled, database.get_db_connection() hands out connections that
+record every statement they run: the SQL text, the shape of its parameters,
+the rows fetched, the wall time and the EXPLAIN QUERY PLAN result. Queries
+slower than SLOW_QUERY_MS are flagged, and so are plans that scan the whole
+sales table. Recent queries are kept in memory for the debug panel and can be
+appended to a JSON lines log.
+
+Profiling is switched on for the whole process, with the QUERY_PROFILE
+environment variable or enable() before the first connection is opened. It is
+off by default and costs nothing then: connections opened while it is
+disabled are plain sqlite3 connections. While it is on, each thread (e.g. a
+Streamlit session's script run) can stop or resume recording its own queries
+with record_thread(), without affecting other threads.
+"""
+import itertools
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+
+# Queries that take longer than this many milliseconds are flagged as slow.
+# Override with the QUERY_SLOW_MS environment variable or enable().
+SLOW_QUERY_MS = float(os.environ.get('QUERY_SLOW_MS', 50))
+
+# Append each profiled query as a JSON object to this file; None keeps the
+# queries in memory only. Override with QUERY_PROFILE_LOG or enable().
+LOG_FILE = os.environ.get('QUERY_PROFILE_LOG') or None
+
+# Number of recent queries kept in memory
+MAX_ENTRIES = 2000
+
+# Table whose full scans are highlighted
+SCAN_TABLE = 'sales'
+
+# Profile the connections of this process. Set QUERY_PROFILE=1 to enable.
+enabled = os.environ.get('QUERY_PROFILE', '') not in ('', '0')
+
+_entries = deque(maxlen=MAX_ENTRIES)
+_sequence = itertools.count(1)
+_log_lock = threading.Lock()
+
+# Recording switch and slow query threshold of each thread
+_local = threading.local()
+
+# Query plans by SQL text; the plan of a statement rarely depends on its
+# parameter values, and EXPLAIN would otherwise double the cost of each query
+_plans = {}
+
+_EXPLAINED_STATEMENTS = ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+_SCAN_RE = re.compile(r'^SCAN (?:TABLE )?(\w+)')
+_CLAUSE_KEYWORDS = {
+    'WHERE', 'JOIN', 'LEFT', 'RIGHT', 'INNER', 'OUTER', 'CROSS', 'ON', 'USING',
+    'GROUP', 'ORDER', 'LIMIT', 'HAVING', 'WINDOW', 'UNION', 'SET', 'INDEXED', 'NOT',
+}
+
+def enable(slow_ms=None, log_file=None):
+    """
+    Start profiling connections opened from now on.
+
+    Args:
+        slow_ms: Threshold in milliseconds above which queries are flagged
+        log_file: Path of a JSON lines file to append profiled queries to
+    """
+    global enabled, SLOW_QUERY_MS, LOG_FILE
+    if slow_ms is not None:
+        SLOW_QUERY_MS = slow_ms
+    if log_file is not None:
+        LOG_FILE = log_file
+    enabled = True
+
+def disable():
+    """Stop profiling; open profiling connections stop recording."""
+    global enabled
+    enabled = False
+
+def record_thread(recording, slow_ms=None):
+    """
+    Turn recording on or off for the queries of the current thread only.
+
+    Threads record by default while profiling is enabled.
+
+    Args:
+        recording: Whether to record this thread's queries
+        slow_ms: Slow query threshold for this thread (defaults to SLOW_QUERY_MS)
+    """
+    _local.recording = recording
+    _local.slow_ms = slow_ms
+
+def _recording():
+    return enabled and getattr(_local, 'recording', True)
+
+def _slow_ms():
+    slow_ms = getattr(_local, 'slow_ms', None)
+    return SLOW_QUERY_MS if slow_ms is None else slow_ms
+
+def mark():
+    """Return a sequence number; pass it to entries() to get later queries only."""
+    return _entries[-1]['seq'] if _entries else 0
+
+def entries(since=0, thread_id=None):
+    """
+    Return the profiled queries kept in memory, oldest first.
+
+    Args:
+        since: Only return queries recorded after this mark()
+        thread_id: Only return queries run by this thread
+
+    Returns:
+        A list of dicts with seq, thread_id, started_at, sql, params, rows,
+        ms, plan, slow and full_scan
+    """
+    return [entry for entry in list(_entries)
+            if entry['seq'] > since and (thread_id is None or entry['thread_id'] == thread_id)]
+
+def clear():
+    """Forget the profiled queries and cached query plans."""
+    _entries.clear()
+    _plans.clear()
+
+def summary(query_entries):
+    """
+    Group profiled queries by SQL text, most expensive first.
+
+    Args:
+        query_entries: Entries as returned by entries()
+
+    Returns:
+        A list of dicts with sql, calls, rows, total_ms, max_ms, slow and full_scan
+    """
+    groups = {}
+    for entry in query_entries:
+        group = groups.setdefault(entry['sql'], {
+            'sql': entry['sql'], 'calls': 0, 'rows': 0, 'total_ms': 0.0, 'max_ms': 0.0,
+            'slow': False, 'full_scan': entry['full_scan'],
+        })
+        group['calls'] += 1
+        group['rows'] += entry['rows']
+        group['total_ms'] += entry['ms']
+        group['max_ms'] = max(group['max_ms'], entry['ms'])
+        group['slow'] = group['slow'] or entry['slow']
+    return sorted(groups.values(), key=lambda group: -group['total_ms'])
+
+def to_json(query_entries):
+    """Return profiled queries as a JSON array."""
+    return json.dumps(query_entries, indent=2)
+
+def _normalize_sql(sql):
+    return ' '.join(sql.split())
+
+def _params_shape(params):
+    # Record the types of the parameters, never their values
+    if isinstance(params, dict):
+        return {name: type(value).__name__ for name, value in params.items()}
+    return [type(value).__name__ for value in params]
+
+def _table_names(sql, table):
+    # The table itself and any alias it is given in FROM and JOIN clauses
+    names = {table.lower()}
+    for alias in re.findall(rf'\b(?:FROM|JOIN)\s+{table}\s+(?:AS\s+)?(\w+)', sql, re.IGNORECASE):
+        if alias.upper() not in _CLAUSE_KEYWORDS:
+            names.add(alias.lower())
+    return names
+
+def _explain(conn, sql, params):
+    plan = _plans.get(sql)
+    if plan is None:
+        if not sql.lstrip().upper().startswith(_EXPLAINED_STATEMENTS):
+            return None
+        try:
+            rows = sqlite3.Connection.execute(conn, f'EXPLAIN QUERY PLAN {sql}', params).fetchall()
+        except sqlite3.Error:
+            return None
+        plan = [detail for _, _, _, detail in rows]
+        _plans[sql] = plan
+    return plan
+
+def _is_full_scan(sql, plan):
+    if not plan:
+        return False
+    names = _table_names(sql, SCAN_TABLE)
+    for detail in plan:
+        match = _SCAN_RE.match(detail)
+        if match and match.group(1).lower() in names:
+            return True
+    return False
+
+def _record(sql, params, ms, plan, rows):
+    return {
+        'seq': next(_sequence),
+        'thread_id': threading.get_ident(),
+        'started_at': round(time.time() - ms / 1000, 6),
+        'sql': _normalize_sql(sql),
+        'params': params,
+        'rows': rows,
+        'ms': ms,
+        'plan': plan,
+        'slow': ms > _slow_ms(),
+        'full_scan': _is_full_scan(sql, plan),
+    }
+
+def _log(entry):
+    line = json.dumps(entry)
+    with _log_lock:
+        with open(LOG_FILE, 'a') as f:
+            f.write(line + '\n')
+
+class ProfilingCursor(sqlite3.Cursor):
+    """Cursor that records the statements it runs and the rows it fetches."""
+
+    _entry = None
+
+    def _start(self, entry):
+        # The previous statement's rows have all been fetched by now, so its
+        # entry is complete and can be logged
+        if self._entry is not None and LOG_FILE:
+            _log(self._entry)
+        self._entry = entry
+        if entry is not None:
+            _entries.append(entry)
+
+    def execute(self, sql, parameters=()):
+        if not _recording():
+            self._start(None)
+            return super().execute(sql, parameters)
+        plan = _explain(self.connection, sql, parameters)
+        start = time.perf_counter()
+        super().execute(sql, parameters)
+        ms = (time.perf_counter() - start) * 1000
+        self._start(_record(sql, _params_shape(parameters), ms, plan, 0))
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        if not _recording():
+            self._start(None)
+            return super().executemany(sql, seq_of_parameters)
+        # Count the parameter sets as they are consumed; they may be a generator
+        counter = itertools.count()
+        counted = (params for params, _ in zip(seq_of_parameters, counter))
+        start = time.perf_counter()
+        super().executemany(sql, counted)
+        ms = (time.perf_counter() - start) * 1000
+        self._start(_record(sql, {'executemany': next(counter)}, ms, None, self.rowcount))
+        return self
+
+    def close(self):
+        self._start(None)
+        super().close()
+
+    def __del__(self):
+        self._start(None)
+
+    def _fetched(self, rows, start):
+        # Rows are produced as they are fetched, so fetch time counts too
+        if self._entry is not None:
+            self._entry['rows'] += rows
+            self._entry['ms'] += (time.perf_counter() - start) * 1000
+            self._entry['slow'] = self._entry['ms'] > _slow_ms()
+        return rows
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = super().fetchone()
+        self._fetched(int(row is not None), start)
+        return row
+
+    def fetchmany(self, size=None):
+        start = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._fetched(len(rows), start)
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = super().fetchall()
+        self._fetched(len(rows), start)
+        return rows
+
+    def __next__(self):
+        start = time.perf_counter()
+        row = super().__next__()
+        self._fetched(1, start)
+        return row
+
+class ProfilingConnection(sqlite3.Connection):
+    """Connection whose cursors, and execute shortcuts, are profiled."""
+
+    def cursor(self, factory=ProfilingCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
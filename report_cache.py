@@ -0,0 +1,175 @@
+"""
+Disk cache for rendered PDF reports.
+
+Reports are stored under a content address: the SHA-256 of the report type,
+the rendering code and the input payload. An unchanged week is therefore
+served from disk on every rerun and repeat download, while any change to the
+data produces a new key. The least recently used files are evicted once the
+cache grows beyond MAX_CACHE_BYTES.
+"""
+import functools
+import hashlib
+import io
+import os
+import sys
+import tempfile
+from datetime import date
+
+# Location of the cache. Override with the REPORT_CACHE_DIR environment
+# variable or at runtime with configure().
+CACHE_DIR = os.environ.get(
+    'REPORT_CACHE_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '.report_cache')
+)
+
+# Total size of cached PDFs kept on disk; 0 disables the cache
+MAX_CACHE_BYTES = 100 * 1024 * 1024
+
+def configure(cache_dir=None, max_bytes=None):
+    """
+    Change the cache location or size limit.
+
+    Args:
+        cache_dir: Directory to store rendered reports in
+        max_bytes: Total size of cached reports to keep; 0 disables the cache
+    """
+    global CACHE_DIR, MAX_CACHE_BYTES
+    if cache_dir is not None:
+        CACHE_DIR = cache_dir
+    if max_bytes is not None:
+        MAX_CACHE_BYTES = max_bytes
+
+def _update_hash(digest, value):
+    # pandas and numpy are not imported here: a payload can only hold their
+    # objects if the caller has already loaded them
+    pd = sys.modules.get('pandas')
+    np = sys.modules.get('numpy')
+    if pd is not None and isinstance(value, pd.DataFrame):
+        digest.update(b'DataFrame')
+        _update_hash(digest, [str(column) for column in value.columns])
+        digest.update(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+    elif isinstance(value, dict):
+        digest.update(b'{')
+        for key in sorted(value, key=str):
+            _update_hash(digest, key)
+            _update_hash(digest, value[key])
+        digest.update(b'}')
+    elif isinstance(value, (list, tuple)):
+        digest.update(b'[')
+        for item in value:
+            _update_hash(digest, item)
+        digest.update(b']')
+    else:
+        # numpy scalars hash like the equal Python values
+        if np is not None and isinstance(value, np.generic):
+            value = value.item()
+        digest.update(f"{type(value).__name__}:{value!r};".encode())
+
+def payload_fingerprint(payload):
+    """
+    Return a stable SHA-256 hex digest of a report payload.
+
+    Args:
+        payload: Nested dicts, lists and tuples of scalars and DataFrames
+
+    Returns:
+        A 64 character hex string
+    """
+    digest = hashlib.sha256()
+    _update_hash(digest, payload)
+    return digest.hexdigest()
+
+def _read(path):
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except FileNotFoundError:
+        return None
+    # Refresh the modification time, which orders the LRU eviction
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        pass
+    return data
+
+def _write(path, data):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    # Write to a temporary file first so readers never see a partial PDF
+    fd, tmp_path = tempfile.mkstemp(dir=CACHE_DIR, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    evict()
+
+def evict(max_bytes=None):
+    """
+    Delete the least recently used reports until the cache fits max_bytes.
+
+    Args:
+        max_bytes: Size limit (defaults to MAX_CACHE_BYTES)
+    """
+    if max_bytes is None:
+        max_bytes = MAX_CACHE_BYTES
+    try:
+        entries = [entry for entry in os.scandir(CACHE_DIR) if entry.name.endswith('.pdf')]
+    except FileNotFoundError:
+        return
+    files = []
+    for entry in entries:
+        try:
+            stat = entry.stat()
+        except FileNotFoundError:
+            continue
+        files.append((stat.st_mtime, stat.st_size, entry.path))
+
+    total = sum(size for _, size, _ in files)
+    for _, size, path in sorted(files):
+        if total <= max_bytes:
+            break
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+
+def clear():
+    """Delete every cached report."""
+    evict(0)
+
+def cached_report(report_type):
+    """
+    Serve a PDF generator's output from the disk cache.
+
+    The wrapped function takes one payload argument and returns a BytesIO.
+    The key covers the payload, the report type, the modification time of the
+    generator's source file (so code changes invalidate old PDFs) and today's
+    date, which reports print as their generation date.
+    """
+    def decorator(func):
+        source_mtime = os.path.getmtime(func.__code__.co_filename)
+
+        @functools.wraps(func)
+        def wrapper(payload):
+            if MAX_CACHE_BYTES <= 0:
+                return func(payload)
+
+            key = payload_fingerprint(
+                [report_type, source_mtime, date.today().isoformat(), payload]
+            )
+            path = os.path.join(CACHE_DIR, f"{report_type}-{key}.pdf")
+            data = _read(path)
+            if data is None:
+                data = func(payload).getvalue()
+                try:
+                    _write(path, data)
+                except OSError:
+                    # The cache is an optimisation; a full or read-only disk
+                    # must not stop the report from being downloaded
+                    pass
+            return io.BytesIO(data)
+        return wrapper
+    return decorator
@@ -1,5 +1,3 @@
-import streamlit as st
-import plotly.graph_objects as go
 import io
 from datetime import datetime
 from reportlab.lib import colors
@@ -8,9 +6,194 @@ from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph,
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.graphics.shapes import Drawing, String
 from reportlab.graphics.charts.barcharts import VerticalBarChart
+import report_cache
 import utils
 
+# Paragraph and table styles are built once at import and shared by every
+# report, so rendering a PDF only does work proportional to its data
+STYLES = getSampleStyleSheet()
+
+PARAGRAPH_STYLES = {
+    'weekly_title': ParagraphStyle(
+        'WeeklyTitle',
+        parent=STYLES['Title'],
+        fontSize=24,
+        spaceAfter=20,
+        textColor=colors.HexColor('#1f77b4')
+    ),
+    'weekly_header': ParagraphStyle(
+        'WeeklyHeader',
+        parent=STYLES['Normal'],
+        fontSize=12,
+        textColor=colors.HexColor('#2c3e50'),
+        spaceAfter=5
+    ),
+    'weekly_info': ParagraphStyle(
+        'WeeklyInfo',
+        parent=STYLES['Normal'],
+        fontSize=10,
+        textColor=colors.HexColor('#34495e'),
+        spaceAfter=2
+    ),
+    'target_achieved': ParagraphStyle(
+        'TargetAchieved',
+        parent=STYLES['Normal'],
+        fontSize=14,
+        textColor=colors.HexColor('#27ae60'),
+        alignment=1  # Center alignment
+    ),
+    'target_missed': ParagraphStyle(
+        'TargetMissed',
+        parent=STYLES['Normal'],
+        fontSize=14,
+        textColor=colors.HexColor('#c0392b'),
+        alignment=1  # Center alignment
+    ),
+    'comparison_title': ParagraphStyle(
+        'ComparisonTitle',
+        parent=STYLES['Title'],
+        spaceAfter=30,
+        fontSize=24
+    ),
+    'driver_info': ParagraphStyle(
+        'DriverInfo',
+        parent=STYLES['Normal'],
+        fontSize=10,
+        leading=12,
+        spaceAfter=6
+    ),
+    'summary_title': ParagraphStyle(
+        'SummaryTitle',
+        parent=STYLES['Title'],
+        fontSize=20,
+        spaceAfter=20
+    ),
+    'summary_header': ParagraphStyle(
+        'SummaryHeader',
+        parent=STYLES['Heading2'],
+        fontSize=14,
+        spaceAfter=12
+    ),
+    'summary_info': ParagraphStyle(
+        'SummaryInfo',
+        parent=STYLES['Normal'],
+        fontSize=8,
+        leading=10,
+        wordWrap='CJK'
+    ),
+}
+
+# Header and grid shared by the grey-headed tables
+_GREY_HEADER = [
+    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+]
+
+# Alternating data row colours, starting with the first row after the header
+_ALTERNATING_ROWS = [colors.lightgrey, colors.whitesmoke]
+
+def _target_table_style(row_color):
+    return TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2c3e50')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 12),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 1), (-1, 1), row_color),
+        ('GRID', (0, 0), (-1, -1), 1, colors.grey),
+    ])
+
+TABLE_STYLES = {
+    'target_achieved': _target_table_style(colors.HexColor('#e8f6f3')),
+    'target_missed': _target_table_style(colors.HexColor('#fdedec')),
+    'sales_breakdown': TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2c3e50')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+        ('ALIGN', (0, 0), (0, -1), 'LEFT'),
+        ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 10),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+        ('TOPPADDING', (0, 0), (-1, -1), 8),
+        ('GRID', (0, 0), (-1, -1), 1, colors.grey),
+        ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#f5f6fa')),
+    ]),
+    'historical_summary': TableStyle(_GREY_HEADER + [
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTSIZE', (0, 0), (-1, 0), 14),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
+        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 1), (-1, -1), 12),
+        # Highlight the Total Net Sales row with a different background
+        ('BACKGROUND', (0, 6), (-1, 6), colors.HexColor('#e8f4f8')),
+        ('FONTNAME', (0, 6), (-1, 6), 'Helvetica-Bold'),
+    ]),
+    'historical_weeks': TableStyle(_GREY_HEADER + [
+        ('ALIGN', (0, 0), (0, -1), 'CENTER'),  # Center align week number column
+        ('ALIGN', (1, 0), (1, -1), 'LEFT'),    # Left align date range column
+        ('ALIGN', (2, 0), (-1, -1), 'RIGHT'),  # Right align all numeric columns
+        ('FONTSIZE', (0, 0), (-1, 0), 10),     # Slightly smaller header font
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 10),
+        ('TOPPADDING', (0, 0), (-1, 0), 10),
+        ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
+        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 1), (-1, -1), 9),     # Smaller font for data
+        ('BOTTOMPADDING', (0, 1), (-1, -1), 6),
+        ('TOPPADDING', (0, 1), (-1, -1), 6),
+        # Highlight the Total Net Sales column
+        ('BACKGROUND', (-1, 0), (-1, 0), colors.HexColor('#2c3e50')),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -1), _ALTERNATING_ROWS),
+    ]),
+    'comparison': TableStyle(_GREY_HEADER + [
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTSIZE', (0, 0), (-1, 0), 14),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
+        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 1), (-1, -1), 12),
+        ('ALIGN', (1, 1), (-1, -1), 'RIGHT'),  # Right align numbers
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),  # Vertical alignment
+        ('ROWBACKGROUNDS', (0, 1), (-2, -1), _ALTERNATING_ROWS),
+    ]),
+    'highlights': TableStyle(_GREY_HEADER + [
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTSIZE', (0, 0), (-1, 0), 12),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.lightgreen),
+    ]),
+    'target_status': TableStyle(_GREY_HEADER + [
+        ('ALIGN', (0, 0), (1, -1), 'LEFT'),
+        ('ALIGN', (2, 0), (-1, -1), 'RIGHT'),
+        ('FONTSIZE', (0, 0), (-1, 0), 10),
+        ('FONTSIZE', (0, 1), (-1, -1), 9),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 5),
+        ('TOPPADDING', (0, 0), (-1, -1), 5),
+        ('ROWBACKGROUNDS', (0, 1), (-2, -1), _ALTERNATING_ROWS),
+    ]),
+    'summary_breakdown': TableStyle(_GREY_HEADER + [
+        ('ALIGN', (0, 0), (0, -1), 'LEFT'),
+        ('ALIGN', (1, 0), (-1, -1), 'RIGHT'),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('FONTSIZE', (0, 0), (-1, 0), 9),
+        ('FONTSIZE', (0, 1), (-1, -1), 8),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+        ('TOPPADDING', (0, 0), (-1, -1), 6),
+        ('LEFTPADDING', (0, 0), (-1, -1), 4),
+        ('RIGHTPADDING', (0, 0), (-1, -1), 4),
+        ('ROWBACKGROUNDS', (0, 1), (-2, -1), _ALTERNATING_ROWS),
+        # The total column is highlighted over the row colours
+        ('BACKGROUND', (-1, 1), (-1, -1), colors.lightyellow),
+    ]),
+}
+
 def create_sales_figure(report_data):
+    # Plotly is slow to import and only needed for on-screen charts
+    import plotly.graph_objects as go
+
     sales = report_data['sales_breakdown']
     net_zettel = sales['zettel_sales'] - sales['zettel_fee']
 
@@ -59,6 +242,7 @@ def create_sales_chart(report_data):
     drawing.add(bc)
     return drawing
 
+@report_cache.cached_report('weekly')
 def generate_pdf_report(report_data):
     buffer = io.BytesIO()
     # Use landscape orientation with adjusted margins
@@ -71,33 +255,11 @@ def generate_pdf_report(report_data):
         bottomMargin=40
     )
 
-    styles = getSampleStyleSheet()
     elements = []
 
-    # Custom styles
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Title'],
-        fontSize=24,
-        spaceAfter=20,
-        textColor=colors.HexColor('#1f77b4')
-    )
-
-    header_style = ParagraphStyle(
-        'Header',
-        parent=styles['Normal'],
-        fontSize=12,
-        textColor=colors.HexColor('#2c3e50'),
-        spaceAfter=5
-    )
-
-    info_style = ParagraphStyle(
-        'Info',
-        parent=styles['Normal'],
-        fontSize=10,
-        textColor=colors.HexColor('#34495e'),
-        spaceAfter=2
-    )
+    title_style = PARAGRAPH_STYLES['weekly_title']
+    header_style = PARAGRAPH_STYLES['weekly_header']
+    info_style = PARAGRAPH_STYLES['weekly_info']
 
     # Header Section
     # Check if this is a weekly report or daily report
@@ -131,13 +293,7 @@ def generate_pdf_report(report_data):
 
     # Target Achievement Section
     achieved = correct_total_sales >= report_data['target']
-    achievement_style = ParagraphStyle(
-        'Achievement',
-        parent=styles['Normal'],
-        fontSize=14,
-        textColor=colors.HexColor('#27ae60') if achieved else colors.HexColor('#c0392b'),
-        alignment=1  # Center alignment
-    )
+    achievement_style = PARAGRAPH_STYLES['target_achieved' if achieved else 'target_missed']
     elements.append(Paragraph(
         f"{'✓ Target Achieved!' if achieved else '✗ Target Not Achieved'}",
         achievement_style
@@ -154,17 +310,7 @@ def generate_pdf_report(report_data):
         ]
     ]
     target_table = Table(target_data, colWidths=[200] * 3)
-    target_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2c3e50')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 12),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, 1),
-         colors.HexColor('#e8f6f3') if achieved else colors.HexColor('#fdedec')),
-        ('GRID', (0, 0), (-1, -1), 1, colors.grey),
-    ]))
+    target_table.setStyle(TABLE_STYLES['target_achieved' if achieved else 'target_missed'])
     elements.append(target_table)
     elements.append(Spacer(1, 20))
 
@@ -192,18 +338,7 @@ def generate_pdf_report(report_data):
             sales_data[i] = ['Other', f"{utils.format_currency(sales['other_sales'])} ({sales['other_sales_type']})"]
 
     sales_table = Table(sales_data, colWidths=[300, 200])
-    sales_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2c3e50')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-        ('ALIGN', (0, 0), (0, -1), 'LEFT'),
-        ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-        ('TOPPADDING', (0, 0), (-1, -1), 8),
-        ('GRID', (0, 0), (-1, -1), 1, colors.grey),
-        ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#f5f6fa')),
-    ]))
+    sales_table.setStyle(TABLE_STYLES['sales_breakdown'])
     elements.append(sales_table)
     elements.append(Spacer(1, 20))
 
@@ -217,10 +352,11 @@ def generate_pdf_report(report_data):
     buffer.seek(0)
     return buffer
 
+@report_cache.cached_report('historical')
 def generate_historical_report(report_data):
     buffer = io.BytesIO()
     doc = SimpleDocTemplate(buffer, pagesize=letter)
-    styles = getSampleStyleSheet()
+    styles = STYLES
     elements = []
 
     # Title
@@ -241,21 +377,7 @@ def generate_historical_report(report_data):
     ]
 
     summary_table = Table(summary_data)
-    summary_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 14),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
-        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 1), (-1, -1), 12),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        # Highlight the Total Net Sales row with a different background
-        ('BACKGROUND', (0, 6), (-1, 6), colors.HexColor('#e8f4f8')),
-        ('FONTNAME', (0, 6), (-1, 6), 'Helvetica-Bold'),
-    ]))
+    summary_table.setStyle(TABLE_STYLES['historical_summary'])
 
     elements.append(Paragraph("Total Sales Summary", styles['Heading2']))
     elements.append(Spacer(1, 12))
@@ -285,35 +407,8 @@ def generate_historical_report(report_data):
     # Adjust column widths for the table with the date range column and Total Net Sales
     col_widths = [40, 120, 70, 70, 70, 70, 70, 90]  # Week, Date Range, Sales columns, and Total Net Sales
     weekly_table = Table(weekly_data, colWidths=col_widths)
-    # Create a list for the table style
-    table_style = [
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (0, -1), 'CENTER'),  # Center align week number column
-        ('ALIGN', (1, 0), (1, -1), 'LEFT'),    # Left align date range column
-        ('ALIGN', (2, 0), (-1, -1), 'RIGHT'),  # Right align all numeric columns
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 10),     # Slightly smaller header font
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 10),
-        ('TOPPADDING', (0, 0), (-1, 0), 10),
-        ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
-        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 1), (-1, -1), 9),     # Smaller font for data
-        ('BOTTOMPADDING', (0, 1), (-1, -1), 6),
-        ('TOPPADDING', (0, 1), (-1, -1), 6),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        # Highlight the Total Net Sales column
-        ('BACKGROUND', (-1, 0), (-1, 0), colors.HexColor('#2c3e50')),
-    ]
-
-    # Add alternating row colors for better readability
-    for i in range(1, len(weekly_data)):
-        if i % 2 == 0:  # Even rows
-            table_style.append(('BACKGROUND', (0, i), (-1, i), colors.whitesmoke))
-        else:  # Odd rows - slightly different color
-            table_style.append(('BACKGROUND', (0, i), (-1, i), colors.lightgrey))
-
-    weekly_table.setStyle(TableStyle(table_style))
+    # Alternating row colours come from the template's ROWBACKGROUNDS
+    weekly_table.setStyle(TABLE_STYLES['historical_weeks'])
 
     elements.append(weekly_table)
 
@@ -337,15 +432,15 @@ def create_comparison_chart(comparison_data):
         vertical_spacing=0.2
     )
 
-    # Add sales comparison bars
-    for i, driver in enumerate(comparison_data['drivers']):
+    # One stacked bar series per category across all drivers, so the number
+    # of traces stays fixed however many drivers are compared
+    for metric, values in zip(comparison_data['metrics'], zip(*comparison_data['values'])):
         fig.add_trace(
             go.Bar(
-                name=driver,
-                x=comparison_data['metrics'],
-                y=comparison_data['values'][i],
-                text=[f"SEK {val:,.2f}" for val in comparison_data['values'][i]],
-                textposition='auto',
+                name=metric,
+                x=comparison_data['drivers'],
+                y=values,
+                hovertemplate=f"%{{x}}<br>{metric}: SEK %{{y:,.2f}}<extra></extra>",
             ),
             row=1, col=1
         )
@@ -367,7 +462,7 @@ def create_comparison_chart(comparison_data):
     # Update layout
     fig.update_layout(
         title_text="Driver Performance Comparison",
-        barmode='group',
+        barmode='stack',
         height=800,
         showlegend=True,
         legend=dict(
@@ -384,35 +479,89 @@ def create_comparison_chart(comparison_data):
 
     return fig
 
+def create_trend_figure(trend_df, title):
+    """
+    Create a Plotly chart of one driver's or the fleet's weekly trend.
+
+    Args:
+        trend_df: Rows of one driver or of the fleet from trends.compute_trends
+        title: Chart title
+
+    Returns:
+        A Plotly figure with weekly totals against the target and the rolling
+        averages on top, and the platform shares of each week below
+    """
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
+
+    import trends
+
+    fig = make_subplots(
+        rows=2, cols=1,
+        shared_xaxes=True,
+        subplot_titles=('Weekly Net Sales (SEK)', 'Platform Share (%)'),
+        row_heights=[0.65, 0.35],
+        vertical_spacing=0.12
+    )
+    weeks = trend_df['Week Start']
+
+    fig.add_trace(
+        go.Bar(
+            name='Weekly Total',
+            x=weeks,
+            y=trend_df['Total'],
+            marker_color=['#2ecc71' if hit else '#e74c3c' for hit in trend_df['Target Hit']],
+            customdata=trend_df[['Year', 'Week']],
+            hovertemplate="%{customdata[0]} W%{customdata[1]}: SEK %{y:,.2f}<extra></extra>",
+        ),
+        row=1, col=1
+    )
+    for column, color in [(trends.SHORT_AVERAGE, '#1f77b4'), (trends.LONG_AVERAGE, '#9467bd')]:
+        fig.add_trace(
+            go.Scatter(name=column, x=weeks, y=trend_df[column], mode='lines',
+                       line=dict(color=color, width=2)),
+            row=1, col=1
+        )
+    fig.add_trace(
+        go.Scatter(name='Target', x=weeks, y=trend_df['Target'], mode='lines',
+                   line=dict(color='red', dash='dash', shape='hv')),
+        row=1, col=1
+    )
+
+    for platform, color in zip(trends.PLATFORMS, ['#1f77b4', '#ff7f0e', '#2ca02c', '#d62728']):
+        fig.add_trace(
+            go.Scatter(name=f"{platform} Share", x=weeks, y=trend_df[f"{platform} Share"],
+                       mode='lines', stackgroup='share', line=dict(width=0.5, color=color),
+                       hovertemplate=f"{platform}: %{{y:.1f}}%<extra></extra>"),
+            row=2, col=1
+        )
+
+    fig.update_layout(
+        title_text=title,
+        height=700,
+        legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1)
+    )
+    fig.update_yaxes(range=[0, 100], row=2, col=1)
+    return fig
+
+@report_cache.cached_report('comparison')
 def generate_comparison_report(comparison_data):
     """Generate a PDF report comparing driver performance."""
     buffer = io.BytesIO()
     doc = SimpleDocTemplate(buffer, pagesize=landscape(letter))
-    styles = getSampleStyleSheet()
+    styles = STYLES
     elements = []
 
-    # Create custom style for better spacing
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Title'],
-        spaceAfter=30,
-        fontSize=24
-    )
-
-    # Create custom style for driver info
-    driver_info_style = ParagraphStyle(
-        'DriverInfo',
-        parent=styles['Normal'],
-        fontSize=10,
-        leading=12,
-        spaceAfter=6
-    )
+    title_style = PARAGRAPH_STYLES['comparison_title']
+    driver_info_style = PARAGRAPH_STYLES['driver_info']
 
     # Title
     # Check if week data exists
     has_week_data = 'week_number' in comparison_data
 
-    if has_week_data:
+    if 'period' in comparison_data:
+        report_title = f"Driver Performance Comparison Report - {comparison_data['period']}"
+    elif has_week_data:
         report_title = f"Driver Performance Comparison Report - Week {comparison_data['week_number']}"
     else:
         report_title = "Driver Performance Comparison Report"
@@ -442,11 +591,6 @@ def generate_comparison_report(comparison_data):
     # Prepare table data
     table_data = [['Driver'] + comparison_data['metrics'] + ['Target', 'Achievement']]
 
-    # Pre-calculate background colors for achievement rates
-    achievement_colors = []
-    for rate in comparison_data['achievement_rates']:
-        achievement_colors.append(colors.lightgreen if rate >= 100 else colors.lightpink)
-
     for i, driver in enumerate(comparison_data['drivers']):
         # Create driver info paragraph
         driver_info = comparison_data['driver_info'][i]
@@ -469,37 +613,13 @@ def generate_comparison_report(comparison_data):
     # Create and style the table
     table = Table(table_data, colWidths=col_widths)
 
-    # Basic table style
-    table_style = [
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 14),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
-        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 1), (-1, -1), 12),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        ('ALIGN', (1, 1), (-1, -1), 'RIGHT'),  # Right align numbers
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),  # Vertical alignment
-    ]
-
-    # Add alternating row background colors for better readability
-    for i in range(1, len(table_data)):
-        if i % 2 == 0:  # Even rows
-            table_style.append(('BACKGROUND', (0, i), (-2, i), colors.whitesmoke))
-        else:  # Odd rows - slightly different color
-            table_style.append(('BACKGROUND', (0, i), (-2, i), colors.lightgrey))
-
-    # Add background colors for achievement rates - explicitly add each one to avoid lambda issues
-    for i, color in enumerate(achievement_colors, start=1):
-        if color == colors.lightgreen:
-            table_style.append(('BACKGROUND', (-1, i), (-1, i), colors.lightgreen))
-        else:
-            table_style.append(('BACKGROUND', (-1, i), (-1, i), colors.lightpink))
-
-    table.setStyle(TableStyle(table_style))
+    # Alternating row colours come from the template; only the achievement
+    # column depends on the data
+    table.setStyle(TABLE_STYLES['comparison'])
+    table.setStyle([
+        ('BACKGROUND', (-1, i), (-1, i), colors.lightgreen if rate >= 100 else colors.lightpink)
+        for i, rate in enumerate(comparison_data['achievement_rates'], start=1)
+    ])
 
     elements.append(table)
     elements.append(Spacer(1, 30))
@@ -508,54 +628,25 @@ def generate_comparison_report(comparison_data):
     elements.append(Paragraph("Performance Highlights", styles['Heading2']))
     elements.append(Spacer(1, 12))
 
-    # Find top performers using safer method
-    # Find driver with highest Uber sales
-    top_uber_value = -1
-    top_uber = 0
-    for i in range(len(comparison_data['drivers'])):
-        uber_value = comparison_data['values'][i][0]
-        if uber_value > top_uber_value:
-            top_uber_value = uber_value
-            top_uber = i
-
-    # Find driver with best achievement rate
-    top_achievement_value = -1
-    top_achievement = 0
-    for i in range(len(comparison_data['drivers'])):
-        achievement_value = comparison_data['achievement_rates'][i]
-        if achievement_value > top_achievement_value:
-            top_achievement_value = achievement_value
-            top_achievement = i
+    # The leaders are ranked in SQL by the caller (database.get_leaderboard);
+    # without them, fall back to the leaders among the compared drivers
+    highlights = comparison_data.get('highlights')
+    if highlights is None:
+        drivers = range(len(comparison_data['drivers']))
+        top_uber = max(drivers, key=lambda i: comparison_data['values'][i][0])
+        top_achievement = max(drivers, key=lambda i: comparison_data['achievement_rates'][i])
+        highlights = [
+            ['Highest Uber Sales', comparison_data['drivers'][top_uber],
+             f"SEK {comparison_data['values'][top_uber][0]:,.2f}"],
+            ['Best Target Achievement', comparison_data['drivers'][top_achievement],
+             f"{comparison_data['achievement_rates'][top_achievement]:.1f}%"],
+        ]
 
     # Create a highlight table
-    highlight_data = [
-        ['Category', 'Top Performer', 'Achievement'],
-        ['Highest Uber Sales', 
-         comparison_data['drivers'][top_uber],
-         f"SEK {comparison_data['values'][top_uber][0]:,.2f}"],
-        ['Best Target Achievement',
-         comparison_data['drivers'][top_achievement],
-         f"{comparison_data['achievement_rates'][top_achievement]:.1f}%"]
-    ]
+    highlight_data = [['Category', 'Top Performer', 'Achievement']] + highlights
 
     highlight_table = Table(highlight_data, colWidths=[200, 200, 200])
-    # Create highlight table style as a list first
-    highlight_style = [
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 12),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-    ]
-
-    # Add row colors separately to avoid lambda issues
-    highlight_style.append(('BACKGROUND', (0, 1), (-1, 1), colors.lightgreen))
-    highlight_style.append(('BACKGROUND', (0, 2), (-1, 2), colors.lightgreen))
-
-    # Apply style to table
-    highlight_table.setStyle(TableStyle(highlight_style))
+    highlight_table.setStyle(TABLE_STYLES['highlights'])
 
     elements.append(highlight_table)
 
@@ -566,6 +657,7 @@ def generate_comparison_report(comparison_data):
 def format_currency(amount):
     return f"SEK {amount:,.2f}"
 
+@report_cache.cached_report('summary')
 def generate_summary_report(summary_data):
     """Generate a PDF report for all drivers' weekly summary."""
     buffer = io.BytesIO()
@@ -574,31 +666,12 @@ def generate_summary_report(summary_data):
                           rightMargin=40,
                           topMargin=40,
                           bottomMargin=40)
-    styles = getSampleStyleSheet()
     elements = []
 
-    # Custom styles with smaller fonts
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Title'],
-        fontSize=20,
-        spaceAfter=20
-    )
-
-    header_style = ParagraphStyle(
-        'Header',
-        parent=styles['Heading2'],
-        fontSize=14,
-        spaceAfter=12
-    )
-
-    info_style = ParagraphStyle(
-        'Info',
-        parent=styles['Normal'],
-        fontSize=8,
-        leading=10,
-        wordWrap='CJK'
-    )
+    # Styles with smaller fonts
+    title_style = PARAGRAPH_STYLES['summary_title']
+    header_style = PARAGRAPH_STYLES['summary_header']
+    info_style = PARAGRAPH_STYLES['summary_info']
 
     elements.append(Paragraph(f"Week {summary_data['week_number']} - All Drivers Summary", title_style))
     elements.append(Paragraph(f"Period: {summary_data['week_start_date']} to {summary_data['week_end_date']}", info_style))
@@ -642,37 +715,59 @@ def generate_summary_report(summary_data):
     col_widths = [160] + [80] * (len(breakdown_headers) - 1)
     breakdown_table = Table(breakdown_data, colWidths=col_widths)
 
-    # Table styling with smaller fonts
-    breakdown_style = [
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (0, -1), 'LEFT'),
-        ('ALIGN', (1, 0), (-1, -1), 'RIGHT'),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 9),
-        ('FONTSIZE', (0, 1), (-1, -1), 8),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-        ('TOPPADDING', (0, 0), (-1, -1), 6),
-        ('LEFTPADDING', (0, 0), (-1, -1), 4),
-        ('RIGHTPADDING', (0, 0), (-1, -1), 4),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-    ]
+    # Alternating row colours and the total column come from the template
+    breakdown_table.setStyle(TABLE_STYLES['summary_breakdown'])
+
+    elements.append(breakdown_table)
+    doc.build(elements)
+    buffer.seek(0)
+    return buffer
 
-    # Add alternating row background colors for better readability
-    for i in range(1, len(breakdown_data)):
-        if i % 2 == 0:  # Even rows
-            breakdown_style.append(('BACKGROUND', (0, i), (-2, i), colors.whitesmoke))
-        else:  # Odd rows - slightly different color
-            breakdown_style.append(('BACKGROUND', (0, i), (-2, i), colors.lightgrey))
+@report_cache.cached_report('target_status')
+def generate_target_status_report(target_data):
+    """Generate a PDF report of every driver's progress towards the weekly target."""
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=landscape(letter),
+                            leftMargin=40, rightMargin=40, topMargin=40, bottomMargin=40)
+    elements = []
 
-    # Apply the background color for total column separately (overrides row coloring)
-    for i in range(1, len(breakdown_data)):
-        breakdown_style.append(('BACKGROUND', (-1, i), (-1, i), colors.lightyellow))
+    info_style = PARAGRAPH_STYLES['summary_info']
+    target_df = target_data['targets']
 
-    breakdown_table.setStyle(TableStyle(breakdown_style))
+    elements.append(Paragraph(f"Week {target_data['week_number']} - Fleet Target Status",
+                              PARAGRAPH_STYLES['summary_title']))
+    elements.append(Paragraph(f"Period: {target_data['week_start_date']} to {target_data['week_end_date']}", info_style))
+    elements.append(Paragraph(f"Report Generated on: {target_data['date']}", info_style))
+    if target_data.get('min_shortfall'):
+        elements.append(Paragraph(
+            f"Drivers missing more than {format_currency(target_data['min_shortfall'])}", info_style
+        ))
+    elements.append(Spacer(1, 20))
+
+    hit = int((target_df['Shortfall'] <= 0).sum())
+    elements.append(Paragraph(
+        f"{hit} of {len(target_df)} drivers hit their target; "
+        f"total shortfall {format_currency(target_df['Shortfall'].sum())}",
+        PARAGRAPH_STYLES['summary_header']
+    ))
+
+    table_data = [['Driver', 'Card', 'Target', 'Net Sales', 'Progress', 'Missing']]
+    for driver, card, target, net_sales, progress, shortfall in target_df[
+        ['Driver', 'Card', 'Target', 'Net Sales', 'Progress', 'Shortfall']
+    ].itertuples(index=False):
+        table_data.append([
+            driver, card or "", format_currency(target), format_currency(net_sales),
+            f"{progress:.1f}%", format_currency(shortfall),
+        ])
+
+    table = Table(table_data, colWidths=[200, 140, 100, 100, 70, 100], repeatRows=1)
+    table.setStyle(TABLE_STYLES['target_status'])
+    table.setStyle([
+        ('BACKGROUND', (-1, i), (-1, i), colors.lightgreen if shortfall <= 0 else colors.lightpink)
+        for i, shortfall in enumerate(target_df['Shortfall'], start=1)
+    ])
+    elements.append(table)
 
-    elements.append(breakdown_table)
     doc.build(elements)
     buffer.seek(0)
-    return buffer
\ No newline at end of file
+    return buffer
@@ -0,0 +1,108 @@
+"""
+Streaming export of sales records to CSV or Parquet.
+
+Records are written batch by batch as they are read from the database, so
+memory use stays flat however many rows are exported.
+"""
+import csv
+import io
+import os
+
+import database as db
+
+FORMATS = ['csv', 'parquet']
+
+def write_csv(batches, file):
+    """
+    Write sales record batches to a binary file as UTF-8 CSV.
+
+    Returns:
+        The number of rows written
+    """
+    text = io.TextIOWrapper(file, encoding='utf-8', newline='', write_through=True)
+    try:
+        writer = csv.writer(text)
+        writer.writerow(db.SALES_EXPORT_COLUMNS)
+        rows = 0
+        for batch in batches:
+            writer.writerows(batch)
+            rows += len(batch)
+        text.flush()
+    finally:
+        # Leave the caller's file open
+        text.detach()
+    return rows
+
+def _parquet_schema():
+    import pyarrow as pa
+
+    types = {
+        'id': pa.int64(),
+        'driver_id': pa.int64(),
+        'driver_name': pa.string(),
+        'date': pa.string(),
+        'year': pa.int32(),
+        'week_number': pa.int32(),
+        'other_sales_type': pa.string(),
+    }
+    return pa.schema([(name, types.get(name, pa.float64())) for name in db.SALES_EXPORT_COLUMNS])
+
+def write_parquet(batches, file):
+    """
+    Write sales record batches to a binary file as Parquet, one row group per batch.
+
+    Returns:
+        The number of rows written
+    """
+    # pyarrow is optional and only needed for Parquet output
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("Exporting Parquet files requires pyarrow (pip install pyarrow)")
+
+    schema = _parquet_schema()
+    rows = 0
+    with pq.ParquetWriter(file, schema) as writer:
+        for batch in batches:
+            columns = list(zip(*batch))
+            writer.write_batch(pa.record_batch(
+                [pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+                schema=schema
+            ))
+            rows += len(batch)
+    return rows
+
+def _report_progress(batches, progress):
+    rows = 0
+    for batch in batches:
+        yield batch
+        rows += len(batch)
+        progress(rows)
+
+def export_sales(file, file_format='csv', batch_size=10000, progress=None, **filters):
+    """
+    Export sales records to a binary file.
+
+    Args:
+        file: A path or a binary file object
+        file_format: 'csv' or 'parquet'
+        batch_size: Number of rows read and written at a time
+        progress: Optional callable called with the number of rows read so
+            far after each batch
+        **filters: Filters passed to database.iter_sales_batches
+
+    Returns:
+        The number of rows written
+    """
+    if file_format not in FORMATS:
+        raise ValueError(f"Unknown export format: {file_format}")
+
+    writer = write_csv if file_format == 'csv' else write_parquet
+    batches = db.iter_sales_batches(batch_size=batch_size, **filters)
+    if progress is not None:
+        batches = _report_progress(batches, progress)
+    if isinstance(file, (str, os.PathLike)):
+        with open(file, 'wb') as f:
+            return writer(batches, f)
+    return writer(batches, file)
@@ -0,0 +1,253 @@
+"""
+Bulk import of daily sales records from CSV or Excel files.
+
+Each row is one daily record. Column headers are matched case-insensitively:
+
+    driver / name          Driver name (used when no unique oil card matches)
+    oil_card_number        Oil card number of the driver
+    date                   Record date as YYYY-MM-DD
+    week / week_number     Week the record is booked to (defaults to the date's ISO week)
+    uber, bolt, zettel, zettel_fee, other, oil
+                           Amounts in SEK (blank means 0)
+    other_type             Type of other sales (defaults to "Other")
+
+Rows that fail validation are reported with their line number and skipped;
+all valid rows are written in a single transaction.
+"""
+import csv
+import functools
+import io
+import os
+from datetime import date as date_type, datetime
+
+import database as db
+
+# Number of validated rows handed to the database per executemany call
+CHUNK_SIZE = 5000
+
+# Maximum number of row errors kept in the result; the rest are only counted
+MAX_REPORTED_ERRORS = 1000
+
+COLUMN_ALIASES = {
+    'driver': ['driver', 'driver_name', 'name'],
+    'oil_card_number': ['oil_card_number', 'oil_card', 'card'],
+    'date': ['date'],
+    'week_number': ['week_number', 'week'],
+    'uber_sales': ['uber_sales', 'uber'],
+    'bolt_sales': ['bolt_sales', 'bolt'],
+    'zettel_sales': ['zettel_sales', 'zettel'],
+    'zettel_fee': ['zettel_fee'],
+    'other_sales': ['other_sales', 'other'],
+    'other_sales_type': ['other_sales_type', 'other_type'],
+    'oil_expense': ['oil_expense', 'oil'],
+}
+
+AMOUNTS = ['uber_sales', 'bolt_sales', 'zettel_sales', 'zettel_fee', 'other_sales', 'oil_expense']
+
+# Amounts that can never be negative; other sales may be a correction
+NON_NEGATIVE_AMOUNTS = ['uber_sales', 'bolt_sales', 'zettel_sales', 'zettel_fee', 'oil_expense']
+
+class RowError(ValueError):
+    pass
+
+def _normalise_header(header):
+    lookup = {}
+    for field, aliases in COLUMN_ALIASES.items():
+        for alias in aliases:
+            lookup[alias] = field
+    return [lookup.get(str(name or '').strip().lower().replace(' ', '_')) for name in header]
+
+def _read_csv_rows(file):
+    reader = csv.reader(file)
+    header = _normalise_header(next(reader, []))
+    for line_number, values in enumerate(reader, start=2):
+        if any(values):
+            yield line_number, dict(zip(header, values))
+
+def _read_excel_rows(file):
+    # openpyxl is an optional dependency that is only needed for Excel files
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ImportError("Importing Excel files requires openpyxl (pip install openpyxl)")
+
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = _normalise_header(next(rows, []))
+        for line_number, values in enumerate(rows, start=2):
+            if any(value is not None for value in values):
+                yield line_number, dict(zip(header, values))
+    finally:
+        workbook.close()
+
+def read_rows(file, file_name):
+    """
+    Stream (line_number, row) pairs from a CSV or Excel file.
+
+    Args:
+        file: A path or a binary file object
+        file_name: Name used to detect the file type
+
+    Returns:
+        An iterator of (line_number, dict) pairs keyed by canonical column name
+    """
+    if file_name.lower().endswith(('.xlsx', '.xlsm')):
+        yield from _read_excel_rows(file)
+        return
+
+    if isinstance(file, (str, os.PathLike)):
+        with open(file, newline='', encoding='utf-8-sig') as text:
+            yield from _read_csv_rows(text)
+    else:
+        yield from _read_csv_rows(io.TextIOWrapper(file, encoding='utf-8-sig', newline=''))
+
+def _parse_amount(row, field):
+    """Parse an amount like utils.validate_numeric_input, but reject garbage."""
+    value = row.get(field)
+    if isinstance(value, (int, float)):
+        amount = float(value)
+    elif value is None or not str(value).strip():
+        return 0.0
+    else:
+        try:
+            amount = float(str(value).strip().replace(' ', ''))
+        except ValueError:
+            raise RowError(f"{field}: '{value}' is not a number")
+    if field in NON_NEGATIVE_AMOUNTS and amount < 0:
+        raise RowError(f"{field}: must not be negative")
+    return amount
+
+# A fleet export repeats the same few dates on every driver's rows, so the
+# date parsing is memoised
+@functools.lru_cache(maxsize=4096)
+def _parse_date_text(text):
+    return datetime.strptime(text.strip(), '%Y-%m-%d').strftime('%Y-%m-%d')
+
+_get_year_week = functools.lru_cache(maxsize=4096)(db.get_year_week)
+
+def _parse_date(value):
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d')
+    if isinstance(value, date_type):
+        return value.isoformat()
+    try:
+        return _parse_date_text(str(value or ''))
+    except ValueError:
+        raise RowError(f"date: '{value}' is not a YYYY-MM-DD date")
+
+class DriverLookup:
+    """Resolve import rows to driver IDs by oil card number or name."""
+
+    def __init__(self, drivers):
+        self.by_card = {}
+        self.by_name = {}
+        for driver_id, name, oil_card, _ in drivers:
+            # Several drivers may share a placeholder card or a name, so keep
+            # every match and only accept unique ones
+            self.by_card.setdefault(str(oil_card).strip().lower(), []).append(driver_id)
+            self.by_name.setdefault(str(name).strip().lower(), []).append(driver_id)
+
+    def resolve(self, row):
+        card = str(row.get('oil_card_number') or '').strip().lower()
+        name = str(row.get('driver') or '').strip().lower()
+        if not card and not name:
+            raise RowError("no driver name or oil card number")
+
+        card_matches = self.by_card.get(card, []) if card else []
+        if len(card_matches) == 1:
+            return card_matches[0]
+        name_matches = self.by_name.get(name, []) if name else []
+        if len(name_matches) == 1:
+            return name_matches[0]
+        if card_matches or name_matches:
+            raise RowError("driver is ambiguous, several drivers match")
+        raise RowError("no matching driver")
+
+def parse_row(row, drivers):
+    """
+    Validate one import row and convert it to a sales record tuple.
+
+    Args:
+        row: A dict keyed by canonical column name
+        drivers: A DriverLookup
+
+    Returns:
+        A tuple in the column order of database.add_sales_records
+    """
+    driver_id = drivers.resolve(row)
+    date = _parse_date(row.get('date'))
+    amounts = {field: _parse_amount(row, field) for field in AMOUNTS}
+
+    week_number = row.get('week_number')
+    if week_number in (None, ''):
+        week_number = _get_year_week(date) % 100
+    else:
+        try:
+            week_number = int(float(week_number))
+        except ValueError:
+            raise RowError(f"week_number: '{week_number}' is not a number")
+        if week_number < 1 or week_number > 53:
+            raise RowError("week_number: must be between 1 and 53")
+
+    return (
+        driver_id,
+        date,
+        amounts['uber_sales'],
+        amounts['bolt_sales'],
+        amounts['zettel_sales'],
+        amounts['zettel_fee'],
+        amounts['other_sales'],
+        str(row.get('other_sales_type') or 'Other').strip(),
+        amounts['oil_expense'],
+        week_number,
+        _get_year_week(date, week_number),
+    )
+
+def import_sales(file, file_name=None, chunk_size=CHUNK_SIZE, progress=None):
+    """
+    Import every valid row of a CSV or Excel file as a sales record.
+
+    The file is streamed in chunks of chunk_size rows, so memory use does not
+    grow with the file size.
+
+    Args:
+        file: A path or a binary file object
+        file_name: Name used to detect the file type (defaults to the path)
+        chunk_size: Number of rows written per executemany call
+        progress: Optional callable called with the number of rows read so
+            far after each chunk; an exception it raises aborts the import
+            and rolls it back
+
+    Returns:
+        A dict with the number of 'imported' and 'failed' rows and a list of
+        (line_number, message) 'errors' (at most MAX_REPORTED_ERRORS)
+    """
+    if file_name is None:
+        file_name = os.fspath(file)
+
+    drivers = DriverLookup(db.get_all_drivers())
+    result = {'imported': 0, 'failed': 0, 'errors': []}
+
+    def batches():
+        batch = []
+        rows_read = 0
+        for line_number, row in read_rows(file, file_name):
+            rows_read += 1
+            try:
+                batch.append(parse_row(row, drivers))
+            except RowError as e:
+                result['failed'] += 1
+                if len(result['errors']) < MAX_REPORTED_ERRORS:
+                    result['errors'].append((line_number, str(e)))
+                continue
+            if len(batch) >= chunk_size:
+                yield batch
+                batch = []
+                if progress is not None:
+                    progress(rows_read)
+        if batch:
+            yield batch
+
+    result['imported'] = db.add_sales_records(batches())
+    return result
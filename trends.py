@@ -0,0 +1,176 @@
+"""
+Multi-week sales trends for every driver and for the fleet.
+
+All drivers' weekly totals are fetched with one query and laid out as a
+week-by-driver table, so rolling averages, week-over-week changes, platform
+shares and target-hit streaks are computed for the whole fleet at once with
+pandas instead of per driver. Weeks without sales count as zero from a
+driver's first week with sales onwards.
+
+Results are cached with database.cached_read, next to the queries they are
+computed from.
+"""
+import database as db
+import utils
+
+PLATFORMS = ['Uber', 'Bolt', 'Zettel', 'Other']
+
+# Lengths of the short and long rolling averages, in weeks
+SHORT_WINDOW = 4
+LONG_WINDOW = 12
+
+SHORT_AVERAGE = f'{SHORT_WINDOW}-Week Average'
+LONG_AVERAGE = f'{LONG_WINDOW}-Week Average'
+
+# Name of the fleet in the driver column of fleet trends
+FLEET = 'Whole fleet'
+
+_WEEKLY_COLUMNS = ['Driver ID', 'Driver', 'Target', 'Year Week'] + PLATFORMS + ['Oil', 'Zettel Fee']
+
+def _trend_columns(totals, targets):
+    # totals and targets are week-by-series tables with NaN before a series
+    # starts; returns the trend columns as tables of the same shape
+    hit = totals.ge(targets) & totals.notna()
+    hits_so_far = hit.cumsum()
+    streak = hits_so_far - hits_so_far.where(~hit).ffill().fillna(0)
+    previous = totals.shift()
+    return {
+        'Total': totals,
+        SHORT_AVERAGE: totals.rolling(SHORT_WINDOW, min_periods=1).mean(),
+        LONG_AVERAGE: totals.rolling(LONG_WINDOW, min_periods=1).mean(),
+        'WoW Change': totals - previous,
+        'WoW Change %': ((totals - previous) / previous.where(previous > 0)) * 100,
+        'Target': targets,
+        'Target Hit': hit,
+        'Hit Streak': streak.where(totals.notna()),
+    }
+
+def _stack(columns, series_name):
+    # One row per week and series, in week order, leaving out the weeks before
+    # each series starts; built from the raw arrays, as DataFrame.stack() is
+    # slow on wide tables
+    import numpy as np
+    import pandas as pd
+
+    totals = columns['Total']
+    num_weeks, num_series = totals.shape
+    long_df = pd.DataFrame({
+        totals.index.name: np.repeat(totals.index.to_numpy(), num_series),
+        series_name: np.tile(totals.columns.to_numpy(), num_weeks),
+        **{name: frame.to_numpy().ravel() for name, frame in columns.items()},
+    })
+    return long_df[long_df['Total'].notna()].reset_index(drop=True)
+
+def compute_trends(weekly_totals, first_year_week=None):
+    """
+    Compute trends from database.get_fleet_weekly_totals rows.
+
+    Args:
+        weekly_totals: List of (driver_id, name, weekly_target, year_week,
+            uber, bolt, zettel, other, oil, zettel_fee) tuples
+        first_year_week: Leave out weeks before this year-week key. Earlier
+            rows still count towards the rolling averages and streaks.
+
+    Returns:
+        A dict with
+        'weekly': one row per driver and week with Week Start, Year, Week,
+            Driver ID, Driver, the platform amounts and shares, Total, the
+            rolling averages, WoW Change, WoW Change %, Target, Target Hit
+            and Hit Streak (consecutive weeks with the target hit)
+        'drivers': one row per driver with the latest week's figures,
+            Current Streak, Longest Streak, Weeks Hit and platform shares
+            over the period
+        'fleet': the weekly trend of the summed fleet, whose target is the
+            sum of the targets of the drivers active in each week
+    """
+    import pandas as pd
+
+    if not weekly_totals:
+        empty = pd.DataFrame(columns=['Week Start', 'Driver ID', 'Driver', 'Total'])
+        return {'weekly': empty, 'drivers': empty.copy(), 'fleet': empty.copy()}
+
+    weekly_df = pd.DataFrame(weekly_totals, columns=_WEEKLY_COLUMNS)
+    amount_columns = ['Target'] + _WEEKLY_COLUMNS[4:]
+    weekly_df[amount_columns] = weekly_df[amount_columns].astype(float).fillna(0.0)
+    weekly_df['Total'] = weekly_df[PLATFORMS].sum(axis=1)
+    year, week = divmod(weekly_df['Year Week'].to_numpy(), 100)
+    weekly_df['Week Start'] = pd.to_datetime(utils.iso_week_starts(year, week))
+
+    # Week-by-driver table over every week in the range, so that weeks
+    # without sales are rows too
+    weeks = pd.date_range(weekly_df['Week Start'].min(), weekly_df['Week Start'].max(), freq='7D')
+    drivers = weekly_df.drop_duplicates('Driver ID').set_index('Driver ID')[['Driver', 'Target']]
+    totals = weekly_df.pivot(index='Week Start', columns='Driver ID', values='Total').reindex(weeks)
+    totals.index.name = 'Week Start'
+    active = totals.notna().cummax()
+    totals = totals.fillna(0.0).where(active)
+    targets = active.mul(drivers['Target'], axis=1).where(active)
+
+    driver_trends = _stack(_trend_columns(totals, targets), 'Driver ID')
+    platforms = weekly_df[['Week Start', 'Driver ID'] + PLATFORMS]
+    driver_trends = driver_trends.merge(platforms, on=['Week Start', 'Driver ID'], how='left')
+    driver_trends[PLATFORMS] = driver_trends[PLATFORMS].fillna(0.0)
+    driver_trends.insert(2, 'Driver', driver_trends['Driver ID'].map(drivers['Driver']))
+
+    fleet_totals = totals.sum(axis=1, min_count=1).to_frame(FLEET)
+    fleet_targets = targets.sum(axis=1, min_count=1).to_frame(FLEET)
+    fleet_trends = _stack(_trend_columns(fleet_totals, fleet_targets), 'Driver')
+    fleet_platforms = weekly_df.groupby('Week Start')[PLATFORMS].sum()
+    fleet_trends = fleet_trends.join(fleet_platforms, on='Week Start')
+    fleet_trends[PLATFORMS] = fleet_trends[PLATFORMS].fillna(0.0)
+
+    for trend_df in (driver_trends, fleet_trends):
+        iso = trend_df['Week Start'].dt.isocalendar()
+        trend_df.insert(1, 'Year', iso['year'].astype(int))
+        trend_df.insert(2, 'Week', iso['week'].astype(int))
+        trend_df['Target Hit'] = trend_df['Target Hit'].astype(bool)
+        trend_df['Hit Streak'] = trend_df['Hit Streak'].astype(int)
+        sold = trend_df['Total'].where(trend_df['Total'] > 0)
+        for platform in PLATFORMS:
+            trend_df[f'{platform} Share'] = trend_df[platform] / sold * 100
+
+    if first_year_week is not None:
+        first_week_start = pd.Timestamp(utils.iso_week_starts(*divmod(first_year_week, 100)))
+        driver_trends = driver_trends[driver_trends['Week Start'] >= first_week_start]
+        fleet_trends = fleet_trends[fleet_trends['Week Start'] >= first_week_start]
+    driver_trends = driver_trends.sort_values(['Driver ID', 'Week Start']).reset_index(drop=True)
+    fleet_trends = fleet_trends.reset_index(drop=True)
+
+    by_driver = driver_trends.groupby('Driver ID', sort=False)
+    summary = by_driver[['Driver', 'Week Start', 'Total', SHORT_AVERAGE, LONG_AVERAGE,
+                         'WoW Change', 'WoW Change %', 'Target']].last()
+    summary = summary.rename(columns={'Week Start': 'Latest Week', 'Total': 'Latest Total'})
+    summary['Current Streak'] = by_driver['Hit Streak'].last().astype(int)
+    summary['Longest Streak'] = by_driver['Hit Streak'].max().astype(int)
+    summary['Weeks Hit'] = by_driver['Target Hit'].sum().astype(int)
+    summary['Weeks'] = by_driver.size()
+    period_totals = by_driver[PLATFORMS + ['Total']].sum()
+    sold = period_totals['Total'].where(period_totals['Total'] > 0)
+    for platform in PLATFORMS:
+        summary[f'{platform} Share'] = period_totals[platform] / sold * 100
+
+    return {'weekly': driver_trends, 'drivers': summary.reset_index(), 'fleet': fleet_trends}
+
+@db.cached_read
+def get_trends(year, week_number, num_weeks):
+    """
+    Get the trends of every driver over the weeks ending with a given week.
+
+    The weeks before the range that the long rolling average needs are
+    fetched as well.
+
+    Args:
+        year: The ISO year of the last week
+        week_number: The last week number
+        num_weeks: Number of weeks to show
+
+    Returns:
+        The dict of DataFrames described in compute_trends
+    """
+    (first_year, first_week), _ = utils.get_week_range(year, week_number, num_weeks)
+    (fetch_year, fetch_week), _ = utils.get_week_range(year, week_number, num_weeks + LONG_WINDOW - 1)
+    return compute_trends(
+        db.get_fleet_weekly_totals(db.make_year_week(fetch_year, fetch_week),
+                                   db.make_year_week(year, week_number)),
+        db.make_year_week(first_year, first_week)
+    )
@@ -1,5 +1,4 @@
 from datetime import datetime, timedelta
-import pandas as pd
 
 def calculate_total_sales(uber_sales, bolt_sales, zettel_sales, other_sales):
     return sum(filter(None, [uber_sales, bolt_sales, zettel_sales, other_sales]))
@@ -56,6 +55,77 @@ def get_week_dates(year, week_number):
         requested_week_end.strftime('%Y-%m-%d')
     )
 
+def get_week_range(year, week_number, num_weeks):
+    """
+    Return the first and last week of a run of weeks ending with a given week.
+
+    Args:
+        year: The ISO year of the last week
+        week_number: The ISO week number of the last week
+        num_weeks: Number of weeks in the range
+
+    Returns:
+        tuple: ((first_year, first_week), (year, week_number))
+    """
+    last_start = datetime.strptime(get_week_dates(year, week_number)[0], '%Y-%m-%d')
+    first_year, first_week, _ = (last_start - timedelta(weeks=num_weeks - 1)).isocalendar()
+    return (first_year, first_week), (year, week_number)
+
+def iso_week_starts(years, weeks):
+    """
+    Return the Monday of each ISO week, computed column-wise.
+
+    Args:
+        years: Array-like of ISO years
+        weeks: Array-like of ISO week numbers
+
+    Returns:
+        A numpy datetime64[D] array of week start dates
+    """
+    import numpy as np
+
+    # Monday of ISO week 1 is the Monday of the week containing 4 January.
+    # Day arithmetic on datetime64[D]; 1970-01-01 was a Thursday (weekday 3).
+    jan_4 = (np.asarray(years, dtype='int64') - 1970).astype('datetime64[Y]') \
+        .astype('datetime64[D]') + np.timedelta64(3, 'D')
+    jan_4_weekday = (jan_4.astype('int64') + 3) % 7
+    return jan_4 - jan_4_weekday + (np.asarray(weeks, dtype='int64') - 1) * 7
+
+HISTORICAL_COLUMNS = ['Year', 'Week', 'Uber', 'Bolt', 'Zettel', 'Other', 'Oil', 'Zettel Fee']
+
+def build_historical_frame(historical_sales):
+    """
+    Build the historical sales table from database.get_historical_sales rows.
+
+    Week date ranges and totals are computed column-wise rather than row by
+    row, so the cost stays low for drivers with many years of history.
+
+    Args:
+        historical_sales: List of (year, week, uber, bolt, zettel, other, oil, zettel_fee) tuples
+
+    Returns:
+        DataFrame with Year, Week, Date Range, Uber, Bolt, Zettel, Other, Oil,
+        Zettel Fee and Total Net Sales columns
+    """
+    # Imported here so that loading utils does not pull in pandas
+    import numpy as np
+    import pandas as pd
+
+    historical_df = pd.DataFrame(historical_sales, columns=HISTORICAL_COLUMNS)
+    amount_columns = HISTORICAL_COLUMNS[2:]
+    historical_df[amount_columns] = historical_df[amount_columns].astype(float).fillna(0.0)
+
+    week_start = iso_week_starts(historical_df['Year'], historical_df['Week'])
+    week_end = week_start + np.timedelta64(6, 'D')
+    historical_df.insert(2, 'Date Range', np.char.add(
+        np.char.add(np.datetime_as_string(week_start), ' to '),
+        np.datetime_as_string(week_end)
+    ))
+
+    # Zettel is already net of the fee, so the components simply add up
+    historical_df['Total Net Sales'] = historical_df[['Uber', 'Bolt', 'Zettel', 'Other']].sum(axis=1)
+    return historical_df
+
 def prepare_report_data(driver_name, sales_data, target):
     net_zettel = sales_data.get('zettel_sales', 0) - sales_data.get('zettel_fee', 0)
     total_sales = calculate_total_sales(
@@ -95,46 +165,219 @@ def prepare_historical_report_data(driver_name, historical_df):
         'total_sales': total_sales
     }
 
-def prepare_comparison_data(drivers_data):
+# Columns of the week editor, in the order of database.get_weekly_sales_records
+WEEK_EDITOR_COLUMNS = ['ID', 'Date', 'Uber', 'Bolt', 'Zettel', 'Zettel Fee', 'Other', 'Other Type', 'Oil']
+
+_WEEK_EDITOR_AMOUNTS = ['Uber', 'Bolt', 'Zettel', 'Zettel Fee', 'Other', 'Oil']
+
+def build_week_editor_frame(weekly_records):
+    """
+    Build the week editor table from database.get_weekly_sales_records rows.
+
+    Args:
+        weekly_records: List of (id, date, uber_sales, bolt_sales,
+            zettel_sales, zettel_fee, other_sales, other_sales_type,
+            oil_expense) tuples
+
+    Returns:
+        DataFrame with the WEEK_EDITOR_COLUMNS, dates as datetime.date
+    """
+    import pandas as pd
+
+    editor_df = pd.DataFrame(weekly_records, columns=WEEK_EDITOR_COLUMNS)
+    editor_df['Date'] = pd.to_datetime(editor_df['Date']).dt.date
+    editor_df[_WEEK_EDITOR_AMOUNTS] = editor_df[_WEEK_EDITOR_AMOUNTS].astype(float).fillna(0.0)
+    editor_df['Other Type'] = editor_df['Other Type'].fillna("")
+    return editor_df
+
+def _week_editor_values(row, week_dates=None):
+    # The editor reports dates as date objects or ISO strings, and cleared
+    # amounts as None. The date is only checked against week_dates if given.
+    if not row.get('Date'):
+        raise ValueError("Every sales record needs a date")
+    record_date = str(row['Date'])[:10]
+    if week_dates is not None:
+        start_date, end_date = week_dates
+        if not start_date <= record_date <= end_date:
+            raise ValueError(f"{record_date} is not in the edited week ({start_date} to {end_date})")
+    amounts = [float(row.get(column) or 0.0) for column in _WEEK_EDITOR_AMOUNTS]
+    uber, bolt, zettel, zettel_fee, other, oil = amounts
+    return (record_date, uber, bolt, zettel, zettel_fee, other,
+            row.get('Other Type') or "", oil)
+
+def build_week_edits(editor_df, changes, week_dates):
+    """
+    Turn the changes made in the week editor into database writes.
+
+    Args:
+        editor_df: DataFrame from build_week_editor_frame shown in the editor
+        changes: The editor's edited_rows, added_rows and deleted_rows, as
+            kept in st.session_state under the st.data_editor key
+        week_dates: The (start_date, end_date) of the edited week, as
+            returned by get_week_dates
+
+    Returns:
+        An (inserts, updates, deletes) tuple for database.apply_week_edits
+
+    Raises:
+        ValueError: If a record has no date, or a new record or a changed
+            date is outside the week. Records booked to the week with a date
+            outside it (e.g. entered later) keep that date when it is not edited.
+    """
+    deleted_rows = set(changes.get('deleted_rows', []))
+    deletes = [int(editor_df['ID'].iloc[row]) for row in sorted(deleted_rows)]
+
+    updates = []
+    for row, edited in changes.get('edited_rows', {}).items():
+        row = int(row)
+        if row in deleted_rows:
+            continue
+        values = editor_df.iloc[row].to_dict()
+        stored_date = str(values['Date'])[:10]
+        values.update(edited)
+        date_changed = str(values.get('Date'))[:10] != stored_date
+        updates.append((int(values['ID']),
+                        *_week_editor_values(values, week_dates if date_changed else None)))
+
+    inserts = [_week_editor_values(added, week_dates) for added in changes.get('added_rows', [])]
+    return inserts, updates, deletes
+
+COMPARISON_COLUMNS = ['Driver ID', 'Driver', 'Card', 'Target', 'Weeks',
+                      'Uber', 'Bolt', 'Zettel', 'Other', 'Oil', 'Zettel Fee']
+
+COMPARISON_METRICS = ['Uber', 'Bolt', 'Zettel', 'Other']
+
+def build_comparison_frame(comparison_totals, num_weeks=1):
+    """
+    Build the comparison table from database.get_comparison_totals rows.
+
+    Args:
+        comparison_totals: List of (driver_id, name, oil_card_number,
+            weekly_target, weeks, uber, bolt, zettel, other, oil, zettel_fee) tuples
+        num_weeks: Number of weeks the totals cover, which the weekly targets
+            are scaled by
+
+    Returns:
+        DataFrame with one row per driver and the COMPARISON_COLUMNS plus
+        Total, Period Target and Achievement Rate (in per cent)
+    """
+    # Imported here so that loading utils does not pull in pandas
+    import numpy as np
+    import pandas as pd
+
+    comparison_df = pd.DataFrame(comparison_totals, columns=COMPARISON_COLUMNS)
+    amount_columns = ['Target'] + COMPARISON_COLUMNS[5:]
+    comparison_df[amount_columns] = comparison_df[amount_columns].astype(float).fillna(0.0)
+
+    # Zettel is already net of the fee
+    comparison_df['Total'] = comparison_df[COMPARISON_METRICS].sum(axis=1)
+    comparison_df['Period Target'] = comparison_df['Target'] * num_weeks
+    period_target = comparison_df['Period Target'].to_numpy()
+    comparison_df['Achievement Rate'] = np.divide(
+        comparison_df['Total'].to_numpy() * 100, period_target,
+        out=np.zeros(len(comparison_df)), where=period_target > 0
+    )
+    return comparison_df
+
+def prepare_comparison_data(comparison_df):
     """
     Prepare data for driver comparison visualization.
 
     Args:
-        drivers_data: List of tuples containing (driver_name, weekly_sales, target, oil_card)
+        comparison_df: DataFrame from build_comparison_frame
     Returns:
         Dict with processed data for visualization
     """
-    metrics = ['Uber', 'Bolt', 'Zettel', 'Other']
-    comparison_data = {
-        'drivers': [],
-        'metrics': metrics,
-        'values': [],
-        'targets': [],
-        'achievement_rates': [],
-        'driver_info': []  # Add driver info storage
+    return {
+        'drivers': comparison_df['Driver'].tolist(),
+        'metrics': COMPARISON_METRICS,
+        'values': comparison_df[COMPARISON_METRICS].to_numpy().tolist(),
+        'targets': comparison_df['Period Target'].tolist(),
+        'achievement_rates': comparison_df['Achievement Rate'].tolist(),
+        'driver_info': [
+            {'card': card, 'target': target}
+            for card, target in zip(comparison_df['Card'].tolist(), comparison_df['Target'].tolist())
+        ]
     }
 
-    for driver_name, sales, target, oil_card in drivers_data:
-        if sales and any(s is not None for s in sales):
-            comparison_data['drivers'].append(driver_name)
-            # Unpack sales data (uber, bolt, zettel, other, oil, zettel_fee)
-            uber, bolt, zettel, other, _, _ = sales
-
-            # Calculate total sales
-            total_sales = sum(filter(None, [uber, bolt, zettel, other]))
-            achievement_rate = (total_sales / target * 100) if target > 0 else 0
-
-            comparison_data['values'].append([
-                uber or 0,
-                bolt or 0,
-                zettel or 0,  # This is already net (after fee)
-                other or 0
-            ])
-            comparison_data['targets'].append(target)
-            comparison_data['achievement_rates'].append(achievement_rate)
-            comparison_data['driver_info'].append({
-                'card': oil_card,
-                'target': target
-            })
-
-    return comparison_data
\ No newline at end of file
+TARGET_STATUS_COLUMNS = ['Driver ID', 'Driver', 'Card', 'Target', 'Net Sales', 'Shortfall']
+
+def build_target_status_frame(target_status_rows):
+    """
+    Build the fleet target table from database.get_fleet_target_status rows.
+
+    Args:
+        target_status_rows: List of (driver_id, name, oil_card_number,
+            weekly_target, net_sales, shortfall) tuples
+
+    Returns:
+        DataFrame with the TARGET_STATUS_COLUMNS plus Progress (net sales in
+        per cent of the target), largest shortfall first
+    """
+    import numpy as np
+    import pandas as pd
+
+    target_df = pd.DataFrame(target_status_rows, columns=TARGET_STATUS_COLUMNS)
+    target_df[['Target', 'Net Sales', 'Shortfall']] = \
+        target_df[['Target', 'Net Sales', 'Shortfall']].astype(float)
+    target = target_df['Target'].to_numpy()
+    target_df['Progress'] = np.divide(
+        target_df['Net Sales'].to_numpy() * 100, target,
+        out=np.zeros(len(target_df)), where=target > 0
+    )
+    return target_df
+
+LEADERBOARD_COLUMNS = ['Rank', 'Driver ID', 'Driver', 'Card', 'Target', 'Weeks', 'Net Sales', 'Value']
+
+# Leaderboard metrics that are percentages rather than amounts
+LEADERBOARD_RATE_METRICS = ('achievement_rate', 'oil_ratio')
+
+# Categories of the comparison report highlights and the leaderboard metric
+# whose leader each one shows
+COMPARISON_HIGHLIGHTS = [
+    ('Highest Net Sales', 'net_sales'),
+    ('Highest Uber Sales', 'uber'),
+    ('Best Target Achievement', 'achievement_rate'),
+    ('Lowest Oil Cost Ratio', 'oil_ratio'),
+]
+
+def format_leaderboard_value(metric, value):
+    """Format a leaderboard metric value as a percentage or an amount."""
+    if value is None:
+        return "-"
+    if metric in LEADERBOARD_RATE_METRICS:
+        return f"{value:.1f}%"
+    return format_currency(value)
+
+def build_leaderboard_frame(leaderboard_rows):
+    """
+    Build the leaderboard table from database.get_leaderboard rows.
+
+    Args:
+        leaderboard_rows: List of (rank, driver_id, name, oil_card_number,
+            weekly_target, weeks, net_sales, value) tuples
+
+    Returns:
+        DataFrame with the LEADERBOARD_COLUMNS, best driver first
+    """
+    import pandas as pd
+
+    return pd.DataFrame(leaderboard_rows, columns=LEADERBOARD_COLUMNS)
+
+def prepare_comparison_highlights(leaders):
+    """
+    Prepare the highlights table of the comparison report.
+
+    Args:
+        leaders: Dict mapping the metrics of COMPARISON_HIGHLIGHTS to the
+            first database.get_leaderboard row, or None without data
+
+    Returns:
+        List of [category, driver name, formatted value] rows
+    """
+    highlights = []
+    for category, metric in COMPARISON_HIGHLIGHTS:
+        leader = leaders.get(metric)
+        if leader is not None:
+            highlights.append([category, leader[2], format_leaderboard_value(metric, leader[-1])])
+    return highlights